@@ -1,12 +1,47 @@
 # add_category.py
+import argparse
 import re
-from openpyxl import load_workbook
-from openpyxl.utils import get_column_letter
+from contextlib import closing
+
+import bom_columnar
+import bom_db
+import bom_io
+import category_cache
+import memory_budget
+import parallel_names
+import profiling
+import rule_stats
+import run_metrics
+from rule_index import RuleIndex
+from sort_bom_after_category import CAT_FASTENERS, FASTENER_COLUMNS, fastener_attrs
 
 INPUT_XLSX = "BOMs_parsed.xlsx"                 # или BOM_all_sorted.xlsx
 SHEET_NAME = "BOM"                          # если лист иначе — поменяй
 OUTPUT_XLSX = "BOM_with_category.xlsx"  # выход
 
+# Движок классификации:
+#   "index"      — индекс якорей по всем RULES (rule_index.py): regex запускаются только у правил,
+#                  чьи ключевые слова есть в Name; результат тот же, что у "sequential";
+#   "sequential" — перебор RULES по порядку (эталон).
+CLASSIFIER_ENGINE = "index"
+ENGINES = ("index", "sequential")
+
+# Справочник уже классифицированных имён (category_cache.py): regex — только для новых Name.
+# Ручные исправления из category_overrides.json действуют и без справочника.
+USE_CATEGORY_CACHE = True
+
+# Колонки признаков крепежа после Category (sort_bom_after_category.FASTENER_COLUMNS: Std, Std_No,
+# Thread, Length) — разбираются из Name один раз на Name; по ним сортирует sort_bom_after_category.py,
+# их могут использовать и следующие шаги. Заполнены у Category = "Крепежные изделия".
+FASTENER_ATTRS = True
+
+# Ширины колонок выхода (как в BOMs_parsed.xlsx + Category)
+COLUMN_WIDTHS = {
+    "Module": 16, "Section": 14, "PosText": 8, "Name": 60, "Manufacturer": 28,
+    "PartNumber": 28, "Qty": 6, "Comment": 60, "Category": 45,
+    "Std": 7, "Std_No": 8, "Thread": 8, "Length": 8,
+}
+
 # --------------------------
 # Категории (порядок важен)
 # --------------------------
@@ -118,7 +153,7 @@ def clean(s: str) -> str:
     return re.sub(r"\s+", " ", (s or "").strip())
 
 
-def classify(name: str) -> str:
+def classify_sequential(name: str) -> str:
     s = name or ""
     for cat, rx in RULES:
         if rx.search(s):
@@ -126,32 +161,229 @@ def classify(name: str) -> str:
     return DEFAULT_CATEGORY
 
 
-def main():
-    wb = load_workbook(INPUT_XLSX)
-    ws = wb[SHEET_NAME] if SHEET_NAME in wb.sheetnames else wb.active
+_rule_index = None
+
+
+def get_rule_index() -> RuleIndex:
+    global _rule_index
+    if _rule_index is None:
+        # индекс строится при первом вызове (~0.1 с) — по текущему содержимому RULES
+        _rule_index = RuleIndex(RULES, DEFAULT_CATEGORY)
+    return _rule_index
+
+
+def classify(name: str) -> str:
+    return get_rule_index().classify(name or "")
+
+
+def classifier(engine=CLASSIFIER_ENGINE):
+    if engine == "index":
+        return classify
+    if engine == "sequential":
+        return classify_sequential
+    raise ValueError(f"Неизвестный движок классификации '{engine}'. Доступны: {', '.join(ENGINES)}")
+
+
+def _name_classifier(engine, use_cache, stats):
+    """(функция name → категория, справочник) — с исправлениями и справочником или через замеры stats."""
+    if stats is not None:
+        use_cache = False
+    cache = category_cache.CategoryCache(category_cache.rules_digest(RULES, DEFAULT_CATEGORY), persist=use_cache)
+    if stats is not None:
+        return cache.wrap(stats.classify, memo=False), cache
+    return cache.wrap(classifier(engine)), cache
+
+
+def _prefill(cache, names, engine, workers, chunk_size):
+    """Новые для справочника Name — классифицировать заранее в нескольких процессах (parallel_names.py)."""
+    if engine == "index":
+        get_rule_index()  # строится до запуска процессов: при fork они получают его готовым
+    classify_fn = classifier(engine)
+    cache.prefill(names, lambda todo: parallel_names.map_names(classify_fn, todo, workers, chunk_size))
+
+
+def output_headers(headers, with_attrs=FASTENER_ATTRS) -> list:
+    """Заголовки выхода: headers + Category (и FASTENER_COLUMNS), если их ещё нет."""
+    extra = ("Category",) + (FASTENER_COLUMNS if with_attrs else ())
+    return list(headers) + [h for h in extra if h not in headers]
 
-    headers = [clean(str(c.value)) if c.value is not None else "" for c in ws[1]]
+
+def attrs_for(category, name) -> tuple:
+    """Значения FASTENER_COLUMNS для строки: у крепежа — из Name, у остальных пусто."""
+    if category == CAT_FASTENERS:
+        return fastener_attrs(name)
+    return (None,) * len(FASTENER_COLUMNS)
+
+
+def categorize_rows(headers, rows, engine=CLASSIFIER_ENGINE, use_cache=USE_CATEGORY_CACHE, stats=None,
+                    with_attrs=FASTENER_ATTRS, workers=parallel_names.WORKERS, chunk_size=parallel_names.CHUNK_SIZE):
+    """
+    Заполняет Category по Name для строк (последовательности значений в порядке headers).
+    Возвращает (headers, rows): новые заголовки (если колонки Category нет, она добавляется в конец,
+    с with_attrs — и колонки FASTENER_COLUMNS) и ленивый итератор строк-списков — строки
+    обрабатываются по одной.
+    Новые имена попадают в справочник, когда итератор дочитан до конца.
+    stats — rule_stats.RuleStats: классифицировать через него (с замерами, без справочника).
+    workers, chunk_size — новые Name классифицируются заранее в workers процессах кусками по chunk_size
+    (parallel_names.py); при workers != 1 строки читаются целиком. С stats — всегда в этом процессе.
+    """
     if "Name" not in headers:
         raise RuntimeError(f"Нет колонки 'Name'. Заголовки: {headers}")
 
-    name_col = headers.index("Name") + 1
+    name_i = headers.index("Name")
+
+    out_headers = output_headers(headers, with_attrs)
+    cat_i = out_headers.index("Category")
+    attr_i = [out_headers.index(h) for h in FASTENER_COLUMNS] if with_attrs else []
+    width = len(out_headers)
+
+    classify_name, cache = _name_classifier(engine, use_cache, stats)
+    if stats is None and parallel_names.resolve_workers(workers) > 1:
+        rows = [list(r) for r in rows]
+        names = (clean(str(r[name_i])) if len(r) > name_i and r[name_i] is not None else "" for r in rows)
+        _prefill(cache, names, engine, workers, chunk_size)
+
+    def gen():
+        for row in rows:
+            row = list(row)
+            if len(row) < width:
+                row.extend([None] * (width - len(row)))
+            name = row[name_i]
+            name = clean(str(name)) if name is not None else ""
+            row[cat_i] = cat = classify_name(name)
+            if attr_i:
+                for i, v in zip(attr_i, attrs_for(cat, name)):
+                    row[i] = v
+            yield row
+        cache.save()
+
+    return out_headers, gen()
+
+
+def categorize_columnar(src, dst, engine=CLASSIFIER_ENGINE, use_cache=USE_CATEGORY_CACHE, stats=None,
+                        with_attrs=FASTENER_ATTRS, workers=parallel_names.WORKERS,
+                        chunk_size=parallel_names.CHUNK_SIZE):
+    """
+    То же для .bomc → .bomc: читается только колонка Name, остальные колонки копируются как есть.
+    Возвращает число строк.
+    """
+    with bom_columnar.ColumnarFile(src) as cf:
+        if "Name" not in cf.headers:
+            raise RuntimeError(f"Нет колонки 'Name'. Заголовки: {cf.headers}")
+        names = cf.column("Name")
+
+    classify_name, cache = _name_classifier(engine, use_cache, stats)
+    names = [clean(str(n)) if n is not None else "" for n in names]
+    if stats is None and parallel_names.resolve_workers(workers) > 1:
+        _prefill(cache, names, engine, workers, chunk_size)
+    cats = [classify_name(n) for n in names]
+    cache.save()
+
+    new_columns = {"Category": cats}
+    if with_attrs:
+        attrs = [attrs_for(cat, n) for cat, n in zip(cats, names)]
+        for k, h in enumerate(FASTENER_COLUMNS):
+            new_columns[h] = [a[k] for a in attrs]
+    bom_columnar.append_columns(src, dst, new_columns, widths={h: COLUMN_WIDTHS[h] for h in new_columns})
+    return len(cats)
+
+
+def categorize_db(conn, src="parsed", dst="categorized", engine=CLASSIFIER_ENGINE,
+                  use_cache=USE_CATEGORY_CACHE, stats=None, with_attrs=FASTENER_ATTRS,
+                  workers=parallel_names.WORKERS, chunk_size=parallel_names.CHUNK_SIZE):
+    """
+    То же в SQLite (bom_db.py): категория (и признаки крепежа) считается по уникальным Name таблицы src,
+    таблица dst = src + Category (+ FASTENER_COLUMNS). Возвращает число строк.
+    """
+    classify_name, cache = _name_classifier(engine, use_cache, stats)
+    distinct = bom_db.distinct_values(conn, src, "Name")
+    if stats is None and parallel_names.resolve_workers(workers) > 1:
+        _prefill(cache, (clean(str(name)) for name in distinct), engine, workers, chunk_size)
+    values = {}
+    for name in distinct:
+        n = clean(str(name))
+        cat = classify_name(n)
+        values[name] = ((cat,) + attrs_for(cat, n)) if with_attrs else (cat,)
+    cache.save()
+    new_cols = ["Category"] + (list(FASTENER_COLUMNS) if with_attrs else [])
+    return bom_db.derive_stage(conn, src, dst, "Name", new_cols, values)
+
+
+def verify_engines(names):
+    """Имена, на которых индекс и последовательный перебор дают разные категории: [(name, index, sequential)]."""
+    diff = []
+    for name in names:
+        a, b = classify(name), classify_sequential(name)
+        if a != b:
+            diff.append((name, a, b))
+    return diff
+
+
+@memory_budget.exit_on_budget
+def main():
+    ap = argparse.ArgumentParser(description="Заполнение колонки Category по Name")
+    ap.add_argument("--engine", choices=ENGINES, default=CLASSIFIER_ENGINE, help="движок классификации")
+    ap.add_argument("--no-cache", action="store_true", help="не использовать справочник категорий")
+    ap.add_argument("--rule-stats", nargs="?", const=rule_stats.REPORT_JSON, metavar="JSON",
+                    help=f"замерить каждое правило RULES и записать отчёт (по умолчанию {rule_stats.REPORT_JSON})")
+    ap.add_argument("--verify", action="store_true",
+                    help="только сверить движки на Name из входного файла (без записи выхода)")
+    ap.add_argument("--db", nargs="?", const=bom_db.DB_PATH, metavar="SQLITE",
+                    help=f"читать таблицу parsed и писать categorized в базе (по умолчанию {bom_db.DB_PATH})")
+    parallel_names.add_argument(ap)
+    profiling.add_argument(ap)
+    memory_budget.add_argument(ap)
+    args = ap.parse_args()
+    if args.profile and args.name_workers != 1:
+        print("Профиль: новые Name классифицируются в дочерних процессах и в профиль не попадут "
+              "(для профиля --name-workers 1)")
+
+    in_path = bom_io.stage_path(INPUT_XLSX)
+    out_path = bom_io.stage_path(OUTPUT_XLSX)
+
+    if args.verify:
+        _, headers, rows = bom_io.read_sheet(in_path, SHEET_NAME)
+        headers = [clean(str(h)) if h is not None else "" for h in headers]
+        name_i = headers.index("Name")
+        names = {clean(str(r[name_i])) for r in rows if r[name_i] is not None}
+        diff = verify_engines(sorted(names))
+        for name, a, b in diff:
+            print(f"  {name!r}: index={a!r} sequential={b!r}")
+        print(f"Сверено имён: {len(names)}, расхождений: {len(diff)}")
+        return
 
-    # Добавляем/находим колонку Category
-    if "Category" in headers:
-        cat_col = headers.index("Category") + 1
-    else:
-        cat_col = ws.max_column + 1
-        ws.cell(1, cat_col).value = "Category"
-        ws.column_dimensions[get_column_letter(cat_col)].width = 45
+    stats = None
+    if args.rule_stats:
+        index = get_rule_index() if args.engine == "index" else None
+        stats = rule_stats.RuleStats(RULES, DEFAULT_CATEGORY, index=index)
 
-    # Заполняем
-    for r in range(2, ws.max_row + 1):
-        name = ws.cell(r, name_col).value
-        name = clean(str(name)) if name is not None else ""
-        ws.cell(r, cat_col).value = classify(name)
+    files = ([], [args.db]) if args.db else ([in_path], [out_path])
+    with run_metrics.stage("category", *files, profile_dir=args.profile,
+                           memory=args.memory) as m:
+        if args.db:
+            with closing(bom_db.connect(args.db)) as conn:
+                m.rows_in = m.rows_out = categorize_db(conn, engine=args.engine, use_cache=not args.no_cache,
+                                                       stats=stats, workers=args.name_workers,
+                                                       chunk_size=args.chunk_size)
+            out_path = f"{args.db}:categorized"
+        elif bom_columnar.is_columnar(in_path) and bom_columnar.is_columnar(out_path):
+            m.rows_in = m.rows_out = categorize_columnar(in_path, out_path, engine=args.engine,
+                                                         use_cache=not args.no_cache, stats=stats,
+                                                         workers=args.name_workers, chunk_size=args.chunk_size)
+        else:
+            title, headers, rows = bom_io.read_sheet(in_path, SHEET_NAME)
+            headers = [clean(str(h)) if h is not None else "" for h in headers]
+            out_headers, out_rows = categorize_rows(headers, m.count_in(rows), engine=args.engine,
+                                                    use_cache=not args.no_cache, stats=stats,
+                                                    workers=args.name_workers, chunk_size=args.chunk_size)
+            m.rows_out = bom_io.write_sheet(out_path, title, out_headers, out_rows, widths=COLUMN_WIDTHS)
 
-    wb.save(OUTPUT_XLSX)
-    print(f"OK: {OUTPUT_XLSX}")
+    if stats is not None:
+        report = stats.report()
+        rule_stats.save_json(report, args.rule_stats)
+        print(rule_stats.format_table(report))
+        print(f"Отчёт по правилам: {args.rule_stats}")
+    print(f"OK: {out_path}")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,150 @@
+# batch_build.py
+# ВП сразу для нескольких изделий (DVS-21, DTA-030, WPS-04 ...), у которых модули пересекаются.
+#
+# Манифест изделия — файл как specs_list.py: SPECS (и, если нужно, STRUCTURE), например
+# products/DVS-21.py. Имя изделия — имя файла без .py.
+#
+# - Одно общее состояние incremental.PipelineState на все изделия: каждая спецификация
+#   (module_code) разбирается, классифицируется и получает ключи сортировки один раз, сколько бы
+#   изделий её ни включали. SupplyDoc по Name (split_name) — тоже общий словарь.
+# - По каждому изделию — выборка его модулей из общего состояния, его порядок SPECS и его STRUCTURE;
+#   дальше тот же run_pipeline: сортировка, сжатие, ВП, перенос строк. Результат тот же, что у
+#   отдельного прогона run_pipeline.py с этим манифестом в specs_list.py.
+#   ВП — <out-dir>/<изделие>/Vedomost_pokupnyh_wrapped.xlsx (там же --keep и отчёт о прогоне).
+# - Общее состояние хранится между запусками (.bom_cache/incremental/batch.state): в следующий раз
+#   разбираются только изменившиеся DOCX. --no-cache — всё заново.
+# - Один module_code в двух манифестах с разными DOCX — ошибка (строки модуля должны быть одни).
+#
+# Запуск:
+#   python batch_build.py                                  # все манифесты из products/
+#   python batch_build.py products/DVS-21.py products/WPS-04.py --out-dir out -j 0 --keep split
+
+import argparse
+import runpy
+import time
+from pathlib import Path
+
+import compress_by_name
+import incremental
+import memory_budget
+import name_dedup
+import parallel_names
+import parse_specs_to_bom_many as parse_stage
+import run_metrics
+import run_pipeline
+from docx_tables import ENGINES
+
+BASE_DIR = Path(__file__).resolve().parent
+
+# ===== НАСТРОЙКИ =====
+PRODUCTS_DIR = BASE_DIR / "products"   # манифесты по умолчанию: все *.py отсюда
+OUT_DIR = "out_batch"                  # ВП изделий — в подкаталогах по имени изделия
+STATE_NAME = "batch"                   # общее состояние: .bom_cache/incremental/batch.state
+# =====================
+
+
+def load_manifest(path):
+    """(имя изделия, SPECS, STRUCTURE) из файла-манифеста."""
+    path = Path(path)
+    data = runpy.run_path(str(path))
+    if "SPECS" not in data:
+        raise ValueError(f"В манифесте {path} нет SPECS")
+    return path.stem, list(data["SPECS"]), data.get("STRUCTURE") or {}
+
+
+def union_specs(products) -> list:
+    """Все (docx, module_code) изделий без повторов, в порядке первого появления."""
+    docx_of = {}
+    for name, specs, _ in products:
+        for input_docx, module_code in specs:
+            known = docx_of.setdefault(module_code, input_docx)
+            if known != input_docx:
+                raise ValueError(f"{name}: модуль {module_code} — {input_docx!r}, "
+                                 f"в другом изделии — {known!r}")
+    return [(input_docx, module_code) for module_code, input_docx in docx_of.items()]
+
+
+def build_products(products, out_dir=OUT_DIR, keep=(), workers=parse_stage.WORKERS,
+                   timeout=parse_stage.FILE_TIMEOUT, engine=parse_stage.PARSER_ENGINE,
+                   use_cache=parse_stage.USE_PARSE_CACHE, merge_similar=compress_by_name.MERGE_SIMILAR,
+                   name_workers=parallel_names.WORKERS, chunk_size=parallel_names.CHUNK_SIZE,
+                   state_path=None, memory=None):
+    """
+    products — [(имя, SPECS, STRUCTURE)]. Общие модули разбираются один раз, ВП — по каждому изделию.
+    memory — пик памяти (0) и бюджет в МБ (> 0) по шагам, как у run_pipeline; отчёты о прогоне —
+    <out_dir>/run_report.json (общий разбор) и <out_dir>/<изделие>/run_report.json.
+    Возвращает dict: specs (разных модулей), changed (разобрано заново), products — {имя: счётчики run_pipeline}.
+    """
+    names = [name for name, _, _ in products]
+    if len(set(names)) != len(names):
+        raise ValueError(f"Повторяющиеся имена изделий: {sorted({n for n in names if names.count(n) > 1})}")
+    all_specs = union_specs(products)
+    state_path = incremental.state_path(STATE_NAME) if state_path is None else state_path
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    # 1–3) Все модули всех изделий — разбор, Category и ключи сортировки по одному разу
+    with run_metrics.stage("batch", path=out_dir / run_metrics.RUN_REPORT, memory=memory) as m:
+        state = incremental.PipelineState.load(state_path, fresh=not use_cache)
+        info = state.update(all_specs, workers=workers, timeout=timeout, engine=engine, use_cache=use_cache,
+                            memory=m.memory, name_workers=name_workers, chunk_size=chunk_size)
+        m.rows_out = state.parsed_count()
+        m.extra.update(files=len(all_specs), changed=info["changed"], products=len(products))
+
+    # 4–7) По изделию: выборка модулей из общего состояния, остальное — run_pipeline
+    counts = {}
+    for name, specs, structure in products:
+        product_dir = out_dir / name
+        counts[name] = run_pipeline.run_pipeline(
+            specs, product_dir / run_pipeline.OUTPUT_XLSX, keep=keep, out_dir=product_dir,
+            use_cache=use_cache, merge_similar=merge_similar, name_workers=name_workers,
+            chunk_size=chunk_size, state=state.select(specs), touched=set(), structure=structure,
+            memory=memory,
+        )
+
+    state.save(state_path)
+    return {"specs": len(all_specs), "changed": len(info["changed"]), "products": counts}
+
+
+@memory_budget.exit_on_budget
+def main():
+    ap = argparse.ArgumentParser(description="ВП для нескольких изделий с общими модулями за один прогон")
+    ap.add_argument("manifests", nargs="*",
+                    help=f"манифесты изделий (как specs_list.py); по умолчанию все *.py из {PRODUCTS_DIR.name}/")
+    ap.add_argument("--out-dir", default=OUT_DIR, help="каталог для ВП (подкаталог на изделие)")
+    ap.add_argument("--keep", default="", help="какие промежуточные результаты сохранять (как у run_pipeline.py)")
+    ap.add_argument("-j", "--workers", type=int, default=parse_stage.WORKERS,
+                    help="число процессов парсинга (1 = последовательно, 0 = по числу ядер)")
+    ap.add_argument("--timeout", type=float, default=parse_stage.FILE_TIMEOUT,
+                    help="лимит времени на один DOCX в параллельном режиме, сек (0 = без лимита)")
+    ap.add_argument("--engine", choices=ENGINES, default=parse_stage.PARSER_ENGINE, help="движок чтения DOCX")
+    ap.add_argument("--no-cache", action="store_true",
+                    help="не использовать кэши и общее состояние: всё разобрать заново")
+    ap.add_argument("--merge-similar", nargs="?", type=float, const=name_dedup.APPLY_THRESHOLD,
+                    default=compress_by_name.MERGE_SIMILAR, metavar="THRESHOLD",
+                    help="слить почти одинаковые Name перед сжатием (name_dedup.py)")
+    parallel_names.add_argument(ap)
+    memory_budget.add_argument(ap)
+    args = ap.parse_args()
+
+    paths = args.manifests or sorted(str(p) for p in PRODUCTS_DIR.glob("*.py"))
+    if not paths:
+        ap.error(f"нет манифестов: передайте файлы или положите их в {PRODUCTS_DIR}")
+    keep = list(run_pipeline.STAGE_FILES) if args.keep == "all" else [k.strip() for k in args.keep.split(",") if k.strip()]
+
+    t0 = time.perf_counter()
+    products = [load_manifest(p) for p in paths]
+    result = build_products(products, args.out_dir, keep=keep, workers=args.workers,
+                            timeout=args.timeout or None, engine=args.engine, use_cache=not args.no_cache,
+                            merge_similar=args.merge_similar, name_workers=args.name_workers,
+                            chunk_size=args.chunk_size, memory=args.memory)
+    for name, specs, _ in products:
+        c = result["products"][name]
+        print(f"{name}: {len(specs)} модулей, {c['parsed']} строк BOM → "
+              f"{Path(args.out_dir) / name / run_pipeline.OUTPUT_XLSX}")
+    print(f"Готово: изделий {len(products)}, разных модулей {result['specs']} "
+          f"(разобрано заново {result['changed']}) за {time.perf_counter() - t0:.1f} с")
+
+
+if __name__ == "__main__":
+    main()
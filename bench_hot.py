@@ -0,0 +1,212 @@
+# bench_hot.py
+# Микро-замеры функций, которые вызываются на каждую строку BOM (миллионы раз на большом изделии):
+#   clean, extract_manufacturer, is_pos_numeric / is_qty_numeric / is_pos_dash  (parse_specs_to_bom_many)
+#   classify (и эталон classify_sequential)                                     (add_category)
+#   split_name (без запоминания по Name) и эталон split_name_regex              (split_name_to_supplydoc)
+#   fastener_attrs (без запоминания по Name), fastener_key, natural_key         (sort_bom_after_category)
+#   words_wrap                                                                  (wrap_to_rows_set_widths)
+#
+# Наборы строк (корпусы) — детерминированные, из пулов synth_specs.py и дополнительных шаблонов:
+#   fasteners      крепёж с DIN/ISO/ГОСТ и резьбой M..x..
+#   smd_passives   SMD резисторы и конденсаторы, ТУ-шные Р1-12 / К10-17
+#   long_pn        длинные артикулы (15–40 символов с - . _ /)
+#   mixed_script   кириллица вперемешку с латиницей (в т.ч. подменённые буквы: "C" латинская в "Cтойка")
+#   pos_cells / qty_cells — содержимое ячеек "Поз." и "Кол.".
+#
+# Каждая функция прогоняется по корпусу целиком, повторы — пока не наберётся MIN_SECONDS;
+# в отчёт идёт лучшее и медианное время на вызов (нс). Отчёт — JSON, его можно сравнить с прошлым:
+#   python bench_hot.py                          # → bench_hot.json
+#   python bench_hot.py -o after.json --compare before.json
+#   python bench_hot.py --only split_name,classify
+
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import time
+
+import add_category
+import parse_specs_to_bom_many as parse_stage
+import sort_bom_after_category
+import split_name_to_supplydoc
+import synth_specs
+import wrap_to_rows_set_widths
+
+# ===== НАСТРОЙКИ =====
+REPORT_JSON = "bench_hot.json"
+CORPUS_SIZE = 2000   # строк в каждом корпусе наименований
+MIN_SECONDS = 0.2    # минимальное время замера одной пары (функция, корпус)
+REPEATS = 5          # число замеров, из них берётся лучший и медиана
+SEED = 1
+# =====================
+
+# латинские буквы, похожие на кириллические, и наоборот
+_HOMOGLYPHS = {"а": "a", "е": "e", "о": "o", "р": "p", "с": "c", "х": "x", "С": "C", "М": "M",
+               "Т": "T", "Н": "H", "К": "K", "А": "A", "В": "B", "Е": "E"}
+_HOMOGLYPHS.update({v: k for k, v in list(_HOMOGLYPHS.items())})
+
+
+def _long_pn(r):
+    n = r.randint(15, 40)
+    body = "".join(r.choice("ABCDEFGHJKLMNPRSTUVWXYZ0123456789-._/") for _ in range(n))
+    return body.strip("-._/") or "X" * n
+
+
+def corpora(size=CORPUS_SIZE, seed=SEED) -> dict:
+    """{имя корпуса: [строки]}."""
+    r = random.Random(f"bench_hot:{seed}")
+    fast, other = synth_specs.name_pool(size * 3, seed)
+    passives = [n for n in other if n.startswith(("Резистор", "Конденсатор"))]
+
+    long_pn = []
+    for _ in range(size):
+        kind = r.choice(["Микросхема", "Разъем", "Модуль", "Кабель", "Реле", "Транзистор"])
+        vendor = r.choice(synth_specs.VENDORS)
+        long_pn.append(f"{kind} {_long_pn(r)}" + (f" \"{vendor}\"" if r.random() < 0.6 else ""))
+
+    mixed = []
+    base = fast + other
+    for _ in range(size):
+        name = r.choice(base)
+        chars = [(_HOMOGLYPHS.get(c, c) if r.random() < 0.15 else c) for c in name]
+        mixed.append("".join(chars))
+
+    pos_cells = [r.choice([str(r.randint(1, 999)), "-", "–", "—", "", "1a", "12.1", "—-"]) for _ in range(size)]
+    qty_cells = [r.choice([str(r.randint(1, 9999)), "", "0,1 кг", "2 шт", "10000", "-"]) for _ in range(size)]
+
+    def take(items):
+        return [items[i % len(items)] for i in range(size)] if items else []
+
+    return {
+        "fasteners": take(fast),
+        "smd_passives": take(passives),
+        "long_pn": long_pn,
+        "mixed_script": mixed,
+        "pos_cells": pos_cells,
+        "qty_cells": qty_cells,
+    }
+
+
+NAME_CORPORA = ("fasteners", "smd_passives", "long_pn", "mixed_script")
+WRAP_WIDTH = wrap_to_rows_set_widths.MAX_CHARS[wrap_to_rows_set_widths.NAME_COL]
+
+# (имя, функция одного аргумента, корпусы)
+FUNCTIONS = [
+    ("clean", parse_stage.clean, NAME_CORPORA),
+    ("extract_manufacturer", parse_stage.extract_manufacturer, NAME_CORPORA),
+    ("is_pos_numeric", parse_stage.is_pos_numeric, ("pos_cells",)),
+    ("is_pos_dash", parse_stage.is_pos_dash, ("pos_cells",)),
+    ("is_qty_numeric", parse_stage.is_qty_numeric, ("qty_cells",)),
+    ("classify", add_category.classify, NAME_CORPORA),
+    ("classify_sequential", add_category.classify_sequential, NAME_CORPORA),
+    # split_name запоминает результат по Name — замеряется сам разбор
+    ("split_name", split_name_to_supplydoc.split_name.__wrapped__, NAME_CORPORA),
+    ("split_name_regex", split_name_to_supplydoc.split_name_regex, NAME_CORPORA),
+    # fastener_attrs запоминает результат по Name (fastener_key — уже с запомненными признаками)
+    ("fastener_attrs", sort_bom_after_category.fastener_attrs.__wrapped__, NAME_CORPORA),
+    ("fastener_key", sort_bom_after_category.fastener_key, NAME_CORPORA),
+    ("natural_key", sort_bom_after_category.natural_key, NAME_CORPORA),
+    ("words_wrap", lambda s: wrap_to_rows_set_widths.words_wrap(s, WRAP_WIDTH), NAME_CORPORA),
+]
+
+
+def time_call(fn, items, min_seconds=MIN_SECONDS, repeats=REPEATS):
+    """Замер fn на каждом элементе items. Возвращает (вызовов за замер, [нс на вызов по замерам])."""
+    for x in items:  # прогрев: кэши re, ленивые индексы
+        fn(x)
+    loops = 1
+    while True:
+        t0 = time.perf_counter_ns()
+        for _ in range(loops):
+            for x in items:
+                fn(x)
+        dt = time.perf_counter_ns() - t0
+        if dt >= min_seconds * 1e9 / repeats or loops >= 1 << 20:
+            break
+        loops *= 2
+    per_call = [dt / (loops * len(items))]
+    for _ in range(repeats - 1):
+        t0 = time.perf_counter_ns()
+        for _ in range(loops):
+            for x in items:
+                fn(x)
+        per_call.append((time.perf_counter_ns() - t0) / (loops * len(items)))
+    return loops * len(items), per_call
+
+
+def run(only=None, size=CORPUS_SIZE, seed=SEED, min_seconds=MIN_SECONDS, repeats=REPEATS) -> dict:
+    data = corpora(size, seed)
+    add_category.get_rule_index()  # построение индекса — не часть замера classify
+    results = []
+    for name, fn, names in FUNCTIONS:
+        if only and name not in only:
+            continue
+        for corpus in names:
+            items = data[corpus]
+            if not items:
+                continue
+            calls, per_call = time_call(fn, items, min_seconds, repeats)
+            results.append({
+                "function": name,
+                "corpus": corpus,
+                "items": len(items),
+                "calls": calls,
+                "best_ns": round(min(per_call), 1),
+                "median_ns": round(statistics.median(per_call), 1),
+            })
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "corpus_size": size,
+        "seed": seed,
+        "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "results": results,
+    }
+
+
+def format_report(report, baseline=None) -> str:
+    base = {}
+    if baseline is not None:
+        base = {(r["function"], r["corpus"]): r for r in baseline["results"]}
+    head = f"{'функция':<22} {'корпус':<14} {'лучшее, нс':>11} {'медиана, нс':>12}"
+    if base:
+        head += f" {'было, нс':>10} {'ускорение':>10}"
+    lines = [head]
+    for r in report["results"]:
+        line = f"{r['function']:<22} {r['corpus']:<14} {r['best_ns']:>11.0f} {r['median_ns']:>12.0f}"
+        old = base.get((r["function"], r["corpus"]))
+        if old is not None:
+            line += f" {old['best_ns']:>10.0f} {old['best_ns'] / r['best_ns']:>9.2f}x"
+        lines.append(line)
+    return "\n".join(lines)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Микро-замеры построчных функций конвейера")
+    ap.add_argument("-o", "--output", default=REPORT_JSON, help="куда записать отчёт (JSON)")
+    ap.add_argument("--compare", metavar="JSON", help="прошлый отчёт: показать ускорение относительно него")
+    ap.add_argument("--only", help="только эти функции, через запятую")
+    ap.add_argument("--size", type=int, default=CORPUS_SIZE, help="строк в корпусе")
+    ap.add_argument("--seed", type=int, default=SEED)
+    ap.add_argument("--min-seconds", type=float, default=MIN_SECONDS, help="время замера одной пары, с")
+    args = ap.parse_args()
+
+    only = {x.strip() for x in args.only.split(",")} if args.only else None
+    report = run(only, args.size, args.seed, args.min_seconds)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+    print(format_report(report, baseline))
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"OK: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+# bench_pipeline.py
+# Замер конвейера на синтетических спецификациях (synth_specs.py) разного объёма.
+#
+# Для каждого объёма (по умолчанию 10, 100 и 1000 спецификаций):
+#   1) в bench_work/<N>/ генерируются specs/ и specs_list.py, туда же копируются скрипты конвейера
+#      (SPECS и каталог specs/ скрипты берут рядом с собой);
+#   2) шаги 1–7 запускаются по очереди отдельными процессами, как их запускают руками;
+#      затем — run_pipeline.py (всё в одном процессе). Кэши (.bom_cache) перед этим очищаются —
+#      замеряется холодный прогон;
+#   3) по каждому шагу: время, число строк результата, строк в секунду, пик памяти процесса (RSS).
+# Пик RSS берётся из os.wait4 (Linux/macOS); на Windows колонка пустая.
+#
+# Запуск:
+#   python bench_pipeline.py
+#   python bench_pipeline.py --sizes 10,100 --positions 20-80 --names 3000 --engine lxml -j 0
+#   python bench_pipeline.py --json bench.json
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import bom_io
+import synth_specs
+from docx_tables import ENGINES
+
+BASE_DIR = Path(__file__).resolve().parent
+
+# ===== НАСТРОЙКИ =====
+SIZES = (10, 100, 1000)
+WORK_DIR = BASE_DIR / "bench_work"
+REPORT_JSON = "bench_results.json"
+# =====================
+
+# Шаги: имя → (скрипт, выходной файл). Выход промежуточных шагов — в формате bom_io.INTERMEDIATE_FORMAT.
+STAGES = [
+    ("parse", "parse_specs_to_bom_many.py", bom_io.stage_path("BOMs_parsed.xlsx")),
+    ("category", "add_category.py", bom_io.stage_path("BOM_with_category.xlsx")),
+    ("sort", "sort_bom_after_category.py", bom_io.stage_path("BOM_with_category_sorted.xlsx")),
+    ("compress", "compress_by_name.py", bom_io.stage_path("BOM_compressed_by_name.xlsx")),
+    ("split", "split_name_to_supplydoc.py", bom_io.stage_path("BOM_split.xlsx")),
+    ("vp", "format_vedomost_pokupnyh.py", Path("Vedomost_pokupnyh.xlsx")),
+    ("wrap", "wrap_to_rows_set_widths.py", Path("Vedomost_pokupnyh_wrapped.xlsx")),
+]
+PIPELINE = ("run_pipeline", "run_pipeline.py", Path("Vedomost_pokupnyh_wrapped.xlsx"))
+
+
+def run_measured(cmd, cwd):
+    """Запускает процесс и ждёт его. Возвращает (секунды, пик RSS в байтах или None)."""
+    t0 = time.perf_counter()
+    proc = subprocess.Popen(cmd, cwd=cwd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    if hasattr(os, "wait4"):
+        # wait4 отдаёт rusage именно этого процесса (RUSAGE_CHILDREN — максимум по всем детям)
+        stderr = proc.stderr.read()
+        _, status, usage = os.wait4(proc.pid, 0)
+        proc.returncode = os.waitstatus_to_exitcode(status)
+        rss = usage.ru_maxrss * (1 if platform.system() == "Darwin" else 1024)
+    else:
+        _, stderr = proc.communicate()
+        rss = None
+    seconds = time.perf_counter() - t0
+    if proc.returncode != 0:
+        raise RuntimeError(f"{' '.join(map(str, cmd))} завершился с кодом {proc.returncode}:\n"
+                           f"{stderr.decode('utf-8', 'replace')}")
+    return seconds, rss
+
+
+def count_rows(path) -> int:
+    _, _, rows = bom_io.read_sheet(path)
+    return sum(1 for _ in rows)
+
+
+def prepare(work, n, positions, names, seed):
+    """Каталог прогона: скрипты конвейера + синтетические спецификации. Возвращает время генерации."""
+    if work.exists():
+        shutil.rmtree(work)
+    work.mkdir(parents=True)
+    for p in BASE_DIR.glob("*.py"):
+        if p.name != "specs_list.py":
+            shutil.copy2(p, work / p.name)
+    overrides = BASE_DIR / "category_overrides.json"
+    if overrides.exists():
+        shutil.copy2(overrides, work / overrides.name)
+    t0 = time.perf_counter()
+    synth_specs.generate(work, n, positions, names, seed)
+    return time.perf_counter() - t0
+
+
+def bench_size(n, work_root=WORK_DIR, positions=synth_specs.POSITIONS, names=synth_specs.NAME_POOL,
+               seed=synth_specs.SEED, engine=None, workers=None, keep_work=False):
+    """Замер всех шагов на n спецификациях. Возвращает dict отчёта."""
+    work = Path(work_root) / str(n)
+    gen_seconds = prepare(work, n, positions, names, seed)
+
+    parse_args = []
+    if engine:
+        parse_args += ["--engine", engine]
+    if workers is not None:
+        parse_args += ["-j", str(workers)]
+
+    def measure(name, script, output, args=()):
+        if name in ("parse", "run_pipeline"):
+            shutil.rmtree(work / ".bom_cache", ignore_errors=True)  # холодный кэш разбора и категорий
+        seconds, rss = run_measured([sys.executable, script, *args], work)
+        rows = count_rows(work / output)
+        return {
+            "stage": name,
+            "seconds": round(seconds, 3),
+            "rows": rows,
+            "rows_per_sec": round(rows / seconds, 1) if seconds > 0 else None,
+            "peak_rss_mb": round(rss / 2**20, 1) if rss is not None else None,
+        }
+
+    stages = []
+    for name, script, output in STAGES:
+        stages.append(measure(name, script, output, parse_args if name == "parse" else ()))
+    total = sum(s["seconds"] for s in stages)
+    stages.append(measure(*PIPELINE, parse_args))
+
+    report = {
+        "specs": n,
+        "bom_rows": stages[0]["rows"],
+        "generate_seconds": round(gen_seconds, 3),
+        "stages_total_seconds": round(total, 3),
+        "stages": stages,
+    }
+    if not keep_work:
+        shutil.rmtree(work, ignore_errors=True)
+    return report
+
+
+def format_report(report) -> str:
+    lines = [
+        f"Спецификаций: {report['specs']}, строк BOM: {report['bom_rows']} "
+        f"(генерация {report['generate_seconds']:.1f} с, шаги 1–7: {report['stages_total_seconds']:.1f} с)",
+        f"  {'шаг':<13} {'сек':>8} {'строк':>8} {'строк/с':>10} {'пик RSS, МБ':>12}",
+    ]
+    for s in report["stages"]:
+        rss = "-" if s["peak_rss_mb"] is None else f"{s['peak_rss_mb']:.1f}"
+        lines.append(f"  {s['stage']:<13} {s['seconds']:>8.2f} {s['rows']:>8} "
+                     f"{s['rows_per_sec'] or 0:>10.0f} {rss:>12}")
+    return "\n".join(lines)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Замер шагов конвейера на синтетических спецификациях")
+    ap.add_argument("--sizes", default=",".join(map(str, SIZES)), help="числа спецификаций через запятую")
+    ap.add_argument("--positions", type=synth_specs.parse_range, default=synth_specs.POSITIONS,
+                    help="позиций на спецификацию: МИН-МАКС")
+    ap.add_argument("--names", type=int, default=synth_specs.NAME_POOL, help="число различных наименований")
+    ap.add_argument("--seed", type=int, default=synth_specs.SEED)
+    ap.add_argument("--engine", choices=ENGINES, default=None, help="движок чтения DOCX для шагов parse и run_pipeline")
+    ap.add_argument("-j", "--workers", type=int, default=None, help="процессов парсинга для шагов parse и run_pipeline")
+    ap.add_argument("--work", default=str(WORK_DIR), help="каталог для прогонов")
+    ap.add_argument("--keep-work", action="store_true", help="не удалять каталоги прогонов")
+    ap.add_argument("--json", default=REPORT_JSON, help="куда записать отчёт")
+    args = ap.parse_args()
+
+    sizes = [int(x) for x in args.sizes.split(",") if x.strip()]
+    reports = []
+    for n in sizes:
+        report = bench_size(n, args.work, args.positions, args.names, args.seed,
+                            engine=args.engine, workers=args.workers, keep_work=args.keep_work)
+        reports.append(report)
+        print(format_report(report))
+        print()
+
+    result = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "intermediate_format": bom_io.INTERMEDIATE_FORMAT,
+        "positions": list(args.positions),
+        "names": args.names,
+        "seed": args.seed,
+        "runs": reports,
+    }
+    with open(args.json, "w", encoding="utf-8") as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+    print(f"OK: {args.json}")
+
+
+if __name__ == "__main__":
+    main()
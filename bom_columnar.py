@@ -0,0 +1,461 @@
+# bom_columnar.py
+# Колоночный бинарный формат промежуточных файлов конвейера (.bomc) — замена XLSX между шагами.
+#
+# Файл:
+#   MAGIC (8 байт) | длина заголовка (uint32 LE) | заголовок JSON (utf-8) | секции, выровненные по 8 байт
+# Заголовок: версия, имя листа, число строк, схема (имена колонок в порядке листа), ширины колонок
+# (для обратной конвертации в XLSX) и смещения секций.
+# Секции:
+#   - таблица значений: типы (uint8 на значение), смещения (uint64 LE, count+1) и блоб данных —
+#     строки utf-8, int как int64 LE, float как float64 LE; значение №0 — пустая ячейка (None).
+#     Одинаковые значения хранятся один раз (имена, категории, модули повторяются сотни раз);
+#   - по колонке на каждое поле: массив int32 LE — номер значения в таблице для каждой строки.
+#
+# Файл открывается через mmap: колонки — это memoryview прямо на страницы файла, и шаг,
+# которому нужна одна колонка (add_category — только Name), читает с диска только её
+# и те значения таблицы, на которые она ссылается. Колонки, которые шаг не трогает, при записи
+# результата копируются как есть (append_columns / take_rows), без разбора значений.
+#
+# Конвертация для просмотра людьми:
+#   python bom_columnar.py to-xlsx BOM_split.bomc            → BOM_split.xlsx
+#   python bom_columnar.py from-xlsx BOM_with_category.xlsx  → BOM_with_category.bomc
+#   python bom_columnar.py info BOM_split.bomc
+
+import argparse
+import json
+import mmap
+import os
+import struct
+import sys
+from array import array
+from pathlib import Path
+
+SUFFIX = ".bomc"
+MAGIC = b"BOMCOL1\n"
+FORMAT_VERSION = 1
+
+T_NONE, T_STR, T_INT, T_FLOAT, T_BOOL, T_BIGINT = range(6)
+
+_ALIGN = 8
+_LE = sys.byteorder == "little"
+
+
+def is_columnar(path) -> bool:
+    return Path(path).suffix.lower() == SUFFIX
+
+
+def _pad(n):
+    return (-n) % _ALIGN
+
+
+def _le(arr):
+    """array в little-endian (на big-endian машинах — копия с переставленными байтами)."""
+    if not _LE:
+        arr = array(arr.typecode, arr)
+        arr.byteswap()
+    return arr
+
+
+# ==========================
+# ТАБЛИЦА ЗНАЧЕНИЙ
+# ==========================
+
+class _ValueTable:
+    """Интернирование значений при записи: значение → номер."""
+
+    def __init__(self):
+        self.types = array("B", [T_NONE])
+        self.offsets = array("Q", [0, 0])
+        self.blob = bytearray()
+        self._index = {}
+
+    def add(self, v) -> int:
+        if v is None:
+            return 0
+        # bool — подкласс int, а 1 и 1.0 равны как ключи словаря: ключ включает тип
+        key = (type(v), v)
+        idx = self._index.get(key)
+        if idx is not None:
+            return idx
+
+        if isinstance(v, bool):
+            t, data = T_BOOL, b"\x01" if v else b"\x00"
+        elif isinstance(v, int):
+            if -(1 << 63) <= v < (1 << 63):
+                t, data = T_INT, struct.pack("<q", v)
+            else:
+                t, data = T_BIGINT, str(v).encode("ascii")
+        elif isinstance(v, float):
+            t, data = T_FLOAT, struct.pack("<d", v)
+        elif isinstance(v, str):
+            t, data = T_STR, v.encode("utf-8", "surrogatepass")
+        else:
+            raise TypeError(f"Значение {v!r} ({type(v).__name__}) нельзя записать в {SUFFIX}")
+
+        idx = len(self.types)
+        self.types.append(t)
+        self.blob += data
+        self.offsets.append(len(self.blob))
+        self._index[key] = idx
+        return idx
+
+
+def _decode(t, data):
+    if t == T_STR:
+        return bytes(data).decode("utf-8", "surrogatepass")
+    if t == T_INT:
+        return struct.unpack("<q", data)[0]
+    if t == T_FLOAT:
+        return struct.unpack("<d", data)[0]
+    if t == T_BOOL:
+        return data[0] != 0
+    if t == T_BIGINT:
+        return int(bytes(data).decode("ascii"))
+    return None
+
+
+# ==========================
+# ЗАПИСЬ
+# ==========================
+
+def _write(path, title, headers, columns, table, widths):
+    """columns — список array('i') в порядке headers; table — _ValueTable."""
+    n_rows = len(columns[0]) if columns else 0
+    sections = [("types", table.types), ("offsets", _le(table.offsets)), ("blob", table.blob)]
+    sections += [(f"col{i}", _le(col)) for i, col in enumerate(columns)]
+
+    # смещения считаются от начала файла; заголовок пишется первым, поэтому его длина
+    # должна быть известна заранее — считаем смещения после заголовка в два захода
+    def layout(header_len):
+        pos = len(MAGIC) + 4 + header_len
+        pos += _pad(pos)
+        offs = {}
+        for name, data in sections:
+            offs[name] = pos
+            pos += len(data) * (data.itemsize if isinstance(data, array) else 1)
+            pos += _pad(pos)
+        return offs
+
+    def header_bytes(offs):
+        header = {
+            "version": FORMAT_VERSION,
+            "title": title,
+            "rows": n_rows,
+            "columns": [{"name": h, "offset": offs[f"col{i}"]} for i, h in enumerate(headers)],
+            "values": {
+                "count": len(table.types),
+                "types": offs["types"],
+                "offsets": offs["offsets"],
+                "blob": offs["blob"],
+            },
+            "widths": widths or {},
+        }
+        return json.dumps(header, ensure_ascii=False).encode("utf-8")
+
+    hb = header_bytes(layout(0))
+    while True:
+        offs = layout(len(hb))
+        new_hb = header_bytes(offs)
+        if len(new_hb) == len(hb):
+            hb = new_hb
+            break
+        hb = new_hb
+
+    path = Path(path)
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    with open(tmp, "wb") as f:
+        f.write(MAGIC)
+        f.write(struct.pack("<I", len(hb)))
+        f.write(hb)
+        for name, data in sections:
+            f.write(b"\0" * (offs[name] - f.tell()))
+            f.write(data.tobytes() if isinstance(data, array) else data)
+    os.replace(tmp, path)
+
+
+def write_columns(path, title, headers, rows, widths=None) -> int:
+    """Пишет строки (последовательности значений в порядке headers). Возвращает число строк."""
+    headers = list(headers)
+    table = _ValueTable()
+    add = table.add
+    columns = [array("i") for _ in headers]
+    width = len(headers)
+    n = 0
+    for row in rows:
+        for j in range(width):
+            columns[j].append(add(row[j]) if j < len(row) else 0)
+        n += 1
+    _write(path, title, headers, columns, table, widths)
+    return n
+
+
+# ==========================
+# ЧТЕНИЕ
+# ==========================
+
+class ColumnarFile:
+    """
+    Открытый .bomc. Колонки читаются лениво через mmap; значения таблицы декодируются
+    по требованию и кэшируются. Использовать как контекстный менеджер или вызвать close().
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self._f = open(self.path, "rb")
+        try:
+            self._mm = mmap.mmap(self._f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._f.close()
+            raise RuntimeError(f"{self.path}: пустой файл")
+        if self._mm[:len(MAGIC)] != MAGIC:
+            self.close()
+            raise RuntimeError(f"{self.path}: не файл {SUFFIX}")
+
+        (hlen,) = struct.unpack_from("<I", self._mm, len(MAGIC))
+        start = len(MAGIC) + 4
+        header = json.loads(self._mm[start:start + hlen].decode("utf-8"))
+        if header.get("version") != FORMAT_VERSION:
+            self.close()
+            raise RuntimeError(f"{self.path}: версия формата {header.get('version')}, ожидалась {FORMAT_VERSION}")
+
+        self._views = []   # все memoryview на mmap — освобождаются в close()
+        self.header = header
+        self.title = header["title"]
+        self.rows = header["rows"]
+        self.headers = [c["name"] for c in header["columns"]]
+        self.widths = header.get("widths") or {}
+        self._col_offset = {c["name"]: c["offset"] for c in header["columns"]}
+        self._col_order = [c["offset"] for c in header["columns"]]
+
+        vals = header["values"]
+        self.value_count = vals["count"]
+        self._buf = memoryview(self._mm)
+        self._types = self._buf[vals["types"]:vals["types"] + self.value_count]
+        self._views.append(self._types)
+        self._offsets = self._array_view(vals["offsets"], self.value_count + 1, "Q")
+        self._blob = vals["blob"]
+        self._cache = {0: None}
+
+    def _array_view(self, offset, count, typecode):
+        size = array(typecode).itemsize
+        view = self._buf[offset:offset + count * size]
+        if _LE:
+            cast = view.cast(typecode)
+            self._views += [view, cast]
+            return cast
+        arr = array(typecode, view.tobytes())
+        view.release()
+        arr.byteswap()
+        return arr
+
+    # ---- значения ----
+    def value(self, idx):
+        cache = self._cache
+        if idx in cache:
+            return cache[idx]
+        a, b = self._offsets[idx], self._offsets[idx + 1]
+        v = _decode(self._types[idx], self._buf[self._blob + a:self._blob + b])
+        cache[idx] = v
+        return v
+
+    # ---- колонки ----
+    def indices(self, name):
+        """
+        Номера значений колонки name (memoryview int32 прямо на файл, без копирования).
+        Действителен до close().
+        """
+        if name not in self._col_offset:
+            raise KeyError(f"Нет колонки '{name}'. Есть: {self.headers}")
+        return self._array_view(self._col_offset[name], self.rows, "i")
+
+    def column(self, name):
+        """Значения колонки name списком."""
+        value = self.value
+        return [value(i) for i in self.indices(name)]
+
+    def iter_rows(self, columns=None):
+        """Строки-кортежи: все колонки или только columns (в указанном порядке)."""
+        names = self.headers if columns is None else list(columns)
+        cols = [self.indices(h) for h in names]
+        value = self.value
+        for r in range(self.rows):
+            yield tuple(value(c[r]) for c in cols)
+
+    def close(self):
+        for v in reversed(getattr(self, "_views", [])):
+            v.release()
+        self._views = []
+        if getattr(self, "_buf", None) is not None:
+            self._buf.release()
+            self._buf = None
+        if getattr(self, "_mm", None) is not None:
+            self._mm.close()
+            self._mm = None
+        self._f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def read_columns(path):
+    """(title, headers, rows) — как bom_io.read_sheet: rows — ленивый итератор кортежей."""
+    cf = ColumnarFile(path)
+
+    def rows():
+        try:
+            yield from cf.iter_rows()
+        finally:
+            cf.close()
+
+    return cf.title, list(cf.headers), rows()
+
+
+# ==========================
+# ПРЕОБРАЗОВАНИЯ БЕЗ РАЗБОРА НЕТРОНУТЫХ КОЛОНОК
+# ==========================
+
+class _AppendTable(_ValueTable):
+    """
+    Таблица значений исходного файла + новые значения в конце (исходная копируется байтами).
+    Значение, которое уже есть в исходной таблице, получает её номер: индекс исходных значений
+    строится при первом add() (take_rows значений не добавляет и таблицу не декодирует).
+    src должен быть открыт, пока идут add().
+    """
+
+    def __init__(self, src: ColumnarFile):
+        super().__init__()
+        n = src.value_count
+        self.types = array("B", bytes(src._types))
+        self.offsets = array("Q", src._offsets)
+        a = src._blob
+        self.blob = bytearray(src._buf[a:a + self.offsets[n]])
+        self._src = src
+
+    def add(self, v) -> int:
+        if self._src is not None:
+            src, self._src = self._src, None
+            index = self._index
+            for i in range(1, src.value_count):
+                old = src.value(i)
+                index.setdefault((type(old), old), i)
+        return super().add(v)
+
+
+def _ints(view):
+    """Копия колонки (memoryview/array int32) в array('i')."""
+    arr = array("i")
+    if isinstance(view, memoryview):
+        with view.cast("B") as raw:
+            arr.frombytes(raw)
+    else:
+        arr.extend(view)
+    return arr
+
+
+def append_columns(src, dst, new_columns, title=None, widths=None):
+    """
+    Копия src с добавленными/заменёнными колонками: new_columns — {имя: список значений по строкам}.
+    Остальные колонки и таблица значений копируются без декодирования.
+    """
+    with ColumnarFile(src) as cf:
+        table = _AppendTable(cf)
+        headers = list(cf.headers)
+        columns = [_ints(cf.indices(h)) for h in headers]
+        for name, values in new_columns.items():
+            if len(values) != cf.rows:
+                raise ValueError(f"Колонка '{name}': {len(values)} значений на {cf.rows} строк")
+            col = array("i", map(table.add, values))
+            if name in headers:
+                columns[headers.index(name)] = col
+            else:
+                headers.append(name)
+                columns.append(col)
+        all_widths = {**cf.widths, **(widths or {})}
+        title = cf.title if title is None else title
+    _write(dst, title, headers, columns, table, all_widths)
+
+
+def take_rows(src, dst, order, headers=None):
+    """
+    Копия src со строками в порядке order (список номеров строк) — например, после сортировки.
+    headers — новые имена колонок в том же порядке (по умолчанию прежние).
+    """
+    with ColumnarFile(src) as cf:
+        table = _AppendTable(cf)
+        columns = []
+        for h in cf.headers:
+            idx = cf.indices(h)
+            columns.append(array("i", (idx[r] for r in order)))
+        if headers is None:
+            headers, widths = list(cf.headers), cf.widths
+        else:
+            headers = list(headers)
+            widths = {new: cf.widths[old] for old, new in zip(cf.headers, headers) if old in cf.widths}
+        _write(dst, cf.title, headers, columns, table, widths)
+
+
+# ==========================
+# КОНВЕРТАЦИЯ XLSX <-> BOMC
+# ==========================
+
+def to_xlsx(src, dst):
+    """В XLSX для просмотра: ширины из заголовка, перенос строк в ячейках-формулах (итоги сжатия)."""
+    import bom_io
+
+    with ColumnarFile(src) as cf:
+        headers = list(cf.headers)
+        wrap_cols = [i for i, h in enumerate(headers) if h == "Qty"]
+        decorate = bom_io.wrap_formula_cells(wrap_cols[0]) if wrap_cols else None
+        return bom_io.write_sheet(dst, cf.title, headers, cf.iter_rows(), widths=cf.widths, decorate=decorate)
+
+
+def from_xlsx(src, dst, sheet_name=None):
+    """Из XLSX: значения первого (или указанного) листа, ширины колонок — из листа."""
+    from openpyxl import load_workbook
+    from openpyxl.utils import get_column_letter
+
+    # не read_only: ширины колонок есть только у обычного листа
+    wb = load_workbook(src)
+    ws = wb[sheet_name] if sheet_name in wb.sheetnames else wb.active
+    it = ws.iter_rows(values_only=True)
+    headers = [("" if h is None else str(h)) for h in next(it, ())]
+    widths = {}
+    for i, h in enumerate(headers, 1):
+        dim = ws.column_dimensions.get(get_column_letter(i))
+        if dim is not None and dim.width:
+            widths[h] = dim.width
+    return write_columns(dst, ws.title, headers, it, widths=widths)
+
+
+def main():
+    ap = argparse.ArgumentParser(description=f"Промежуточные файлы {SUFFIX}: конвертация и просмотр")
+    ap.add_argument("command", choices=("to-xlsx", "from-xlsx", "info"))
+    ap.add_argument("input")
+    ap.add_argument("-o", "--output", help="выходной файл (по умолчанию — то же имя с другим расширением)")
+    ap.add_argument("--sheet", help="лист XLSX для from-xlsx (по умолчанию активный)")
+    args = ap.parse_args()
+
+    src = Path(args.input)
+    if args.command == "info":
+        with ColumnarFile(src) as cf:
+            print(f"Лист:     {cf.title}")
+            print(f"Строк:    {cf.rows}")
+            print(f"Значений: {cf.value_count} (уникальных)")
+            print(f"Размер:   {src.stat().st_size / 1024:.1f} КБ")
+            print("Колонки:  " + ", ".join(cf.headers))
+        return
+
+    if args.command == "to-xlsx":
+        dst = Path(args.output) if args.output else src.with_suffix(".xlsx")
+        n = to_xlsx(src, dst)
+    else:
+        dst = Path(args.output) if args.output else src.with_suffix(SUFFIX)
+        n = from_xlsx(src, dst, args.sheet)
+    print(f"OK: {n} строк → {dst}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,326 @@
+# bom_db.py
+# BOM в SQLite: по таблице на результат шага конвейера и индексы по основным полям.
+#
+# Таблица шага — те же колонки, что в промежуточном XLSX, плюс seq (порядок строк, PRIMARY KEY).
+# Колонки без объявленного типа: числа остаются числами, строки — строками, как в XLSX.
+# Индексы по Name, Module, Category, PartNumber, SupplyDoc (те из них, что есть в таблице)
+# строятся после загрузки — вставка в таблицу без индексов идёт пачками по BATCH_ROWS строк,
+# каждая пачка — одна транзакция.
+# Для поиска без учёта регистра у Name и PartNumber есть ещё колонки Name_fold и PartNumber_fold
+# (значение через str.casefold, с индексом): заполняются вместе с индексами, в колонки шага
+# (stage_headers, read_stage, export) не входят.
+#
+# Шаги с --db читают вход из таблицы предыдущего шага и пишут выход в свою таблицу:
+#   python parse_specs_to_bom_many.py --db          # → parsed
+#   python add_category.py --db                     # parsed → categorized
+#   python sort_bom_after_category.py --db          # categorized → sorted
+#   python compress_by_name.py --db                 # sorted → compressed
+#   python split_name_to_supplydoc.py --db          # compressed → split
+#   python format_vedomost_pokupnyh.py --db         # split → Vedomost_pokupnyh.xlsx
+# Category и SupplyDoc считаются по уникальным Name (SELECT DISTINCT) и приклеиваются к строкам
+# одним INSERT ... SELECT ... JOIN; сортировка читает только колонки ключа.
+#
+# Запросы:
+#   python bom_db.py tables
+#   python bom_db.py where-used "DIN 41612"          # в каких модулях встречается (Name/PartNumber)
+#   python bom_db.py where-used "Винт М3" --match prefix   # по началу Name/PartNumber — по индексу
+#   python bom_db.py sql "SELECT Category, COUNT(*) FROM categorized GROUP BY Category"
+#   python bom_db.py load BOM_with_category.xlsx --stage categorized
+#   python bom_db.py export split -o BOM_split.xlsx
+
+import argparse
+import sqlite3
+from itertools import islice
+
+import bom_io
+
+# ===== НАСТРОЙКИ =====
+DB_PATH = "bom.sqlite"
+BATCH_ROWS = 10000   # строк в одной транзакции при загрузке
+# =====================
+
+# Таблицы шагов (имена — как у --keep в run_pipeline.py)
+STAGES = ("parsed", "categorized", "sorted", "compressed", "split")
+INDEXED_COLUMNS = ("Name", "Module", "Category", "PartNumber", "SupplyDoc")
+FOLD_COLUMNS = ("Name", "PartNumber")   # + колонка <имя>_fold с индексом (поиск без учёта регистра)
+FOLD_SUFFIX = "_fold"
+MATCHES = ("contains", "prefix", "exact")
+
+SEQ = "seq"
+
+
+def _q(name) -> str:
+    """Имя колонки/таблицы в кавычках SQL."""
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+def _check_stage(stage):
+    if stage not in STAGES:
+        raise ValueError(f"Неизвестная таблица '{stage}'. Доступны: {', '.join(STAGES)}")
+
+
+def _fold(v):
+    return v.casefold() if isinstance(v, str) else v
+
+
+def connect(path=DB_PATH) -> sqlite3.Connection:
+    conn = sqlite3.connect(str(path))
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    # lower() в SQLite — только латиница; fold() — как str.casefold (кириллица тоже)
+    conn.create_function("fold", 1, _fold, deterministic=True)
+    return conn
+
+
+def tables(conn) -> dict:
+    """{таблица шага: число строк} для имеющихся в базе таблиц."""
+    names = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type='table'")}
+    return {s: conn.execute(f"SELECT COUNT(*) FROM {_q(s)}").fetchone()[0] for s in STAGES if s in names}
+
+
+def stage_headers(conn, stage) -> list:
+    """Колонки таблицы шага в исходном порядке (без seq)."""
+    _check_stage(stage)
+    cols = [r[1] for r in conn.execute(f"PRAGMA table_info({_q(stage)})")]
+    if not cols:
+        raise RuntimeError(f"В базе нет таблицы '{stage}' — сначала выполните предыдущий шаг с --db")
+    hidden = {SEQ} | {h + FOLD_SUFFIX for h in FOLD_COLUMNS}
+    return [c for c in cols if c not in hidden]
+
+
+def _create_stage(conn, stage, headers):
+    _check_stage(stage)
+    if SEQ in headers or len(set(headers)) != len(headers):
+        raise RuntimeError(f"Недопустимые заголовки для таблицы '{stage}': {headers}")
+    cols = ", ".join(_q(h) for h in headers)
+    with conn:
+        conn.execute(f"DROP TABLE IF EXISTS {_q(stage)}")
+        conn.execute(f"CREATE TABLE {_q(stage)} ({SEQ} INTEGER PRIMARY KEY, {cols})")
+
+
+def _add_fold_columns(conn, stage, headers):
+    """Колонки <h>_fold = fold(h) с индексом для FOLD_COLUMNS из headers (которых ещё нет в таблице)."""
+    cols = {r[1] for r in conn.execute(f"PRAGMA table_info({_q(stage)})")}
+    for h in FOLD_COLUMNS:
+        f = h + FOLD_SUFFIX
+        if h not in headers or f in cols:
+            continue
+        conn.execute(f"ALTER TABLE {_q(stage)} ADD COLUMN {_q(f)} TEXT")
+        conn.execute(f"UPDATE {_q(stage)} SET {_q(f)} = fold({_q(h)})")
+        conn.execute(f"CREATE INDEX {_q(f'ix_{stage}_{f}')} ON {_q(stage)} ({_q(f)})")
+
+
+def _create_indexes(conn, stage, headers):
+    with conn:
+        for h in INDEXED_COLUMNS:
+            if h in headers:
+                conn.execute(f"CREATE INDEX {_q(f'ix_{stage}_{h}')} ON {_q(stage)} ({_q(h)})")
+        _add_fold_columns(conn, stage, headers)
+        conn.execute(f"ANALYZE {_q(stage)}")
+
+
+def write_stage(conn, stage, headers, rows, batch=BATCH_ROWS) -> int:
+    """
+    Заменяет таблицу шага строками rows (последовательности значений в порядке headers).
+    Вставка — пачками по batch строк в отдельных транзакциях, индексы — после загрузки.
+    Возвращает число строк.
+    """
+    headers = list(headers)
+    _create_stage(conn, stage, headers)
+
+    width = len(headers)
+    marks = ", ".join("?" * (width + 1))
+    sql = f"INSERT INTO {_q(stage)} VALUES ({marks})"
+
+    def numbered():
+        for seq, row in enumerate(rows, 1):
+            row = tuple(row)
+            if len(row) < width:
+                row += (None,) * (width - len(row))
+            yield (seq,) + row[:width]
+
+    it = numbered()
+    n = 0
+    while True:
+        chunk = list(islice(it, batch))
+        if not chunk:
+            break
+        with conn:
+            conn.executemany(sql, chunk)
+        n += len(chunk)
+
+    _create_indexes(conn, stage, headers)
+    return n
+
+
+def read_stage(conn, stage, columns=None):
+    """
+    (headers, rows): rows — ленивый итератор кортежей в порядке строк шага.
+    columns — только эти колонки (по умолчанию все; SEQ — номер строки).
+    """
+    headers = stage_headers(conn, stage)
+    if columns is not None:
+        missing = [c for c in columns if c not in headers and c != SEQ]
+        if missing:
+            raise RuntimeError(f"Нет колонок {missing} в таблице '{stage}'. Есть: {headers}")
+        headers = list(columns)
+    cols = ", ".join(_q(h) for h in headers)
+    cur = conn.execute(f"SELECT {cols} FROM {_q(stage)} ORDER BY {SEQ}")
+    return headers, iter(cur)
+
+
+def count_rows(conn, stage) -> int:
+    _check_stage(stage)
+    return conn.execute(f"SELECT COUNT(*) FROM {_q(stage)}").fetchone()[0]
+
+
+def distinct_values(conn, stage, column) -> list:
+    """Уникальные значения колонки (NULL → "")."""
+    return [r[0] for r in conn.execute(
+        f"SELECT DISTINCT IFNULL({_q(column)}, '') FROM {_q(stage)}"
+    )]
+
+
+def derive_stage(conn, src, dst, key, new_cols, values) -> int:
+    """
+    dst = строки src + колонки new_cols, вычисленные по значению колонки key.
+    values — {значение key (NULL как ""): кортеж значений new_cols}.
+    Уже существующие в src колонки с теми же именами заменяются. Одним INSERT ... SELECT ... JOIN.
+    Возвращает число строк.
+    """
+    headers = stage_headers(conn, src)
+    if key not in headers:
+        raise RuntimeError(f"Нет колонки '{key}' в таблице '{src}'. Есть: {headers}")
+    new_cols = list(new_cols)
+    out_headers = headers + [h for h in new_cols if h not in headers]
+
+    with conn:
+        conn.execute("DROP TABLE IF EXISTS temp.derived")
+        conn.execute(f"CREATE TEMP TABLE derived (k PRIMARY KEY, {', '.join(_q(h) for h in new_cols)})")
+        marks = ", ".join("?" * (len(new_cols) + 1))
+        conn.executemany(
+            f"INSERT INTO temp.derived VALUES ({marks})",
+            ((k,) + tuple(v) for k, v in values.items()),
+        )
+
+    _create_stage(conn, dst, out_headers)
+    select = ", ".join(
+        (f"d.{_q(h)}" if h in new_cols else f"s.{_q(h)}") for h in out_headers
+    )
+    with conn:
+        conn.execute(
+            f"INSERT INTO {_q(dst)} ({SEQ}, {', '.join(_q(h) for h in out_headers)}) "
+            f"SELECT s.{SEQ}, {select} FROM {_q(src)} s "
+            f"LEFT JOIN temp.derived d ON d.k = IFNULL(s.{_q(key)}, '') ORDER BY s.{SEQ}"
+        )
+        conn.execute("DROP TABLE temp.derived")
+    _create_indexes(conn, dst, out_headers)
+    return conn.execute(f"SELECT COUNT(*) FROM {_q(dst)}").fetchone()[0]
+
+
+def permute_stage(conn, src, dst, order) -> int:
+    """dst = строки src в порядке order (список seq строк src). Возвращает число строк."""
+    headers = stage_headers(conn, src)
+    with conn:
+        conn.execute("DROP TABLE IF EXISTS temp.ord")
+        conn.execute("CREATE TEMP TABLE ord (pos INTEGER PRIMARY KEY, src INTEGER)")
+        conn.executemany("INSERT INTO temp.ord VALUES (?, ?)", enumerate(order, 1))
+
+    _create_stage(conn, dst, headers)
+    cols = ", ".join(_q(h) for h in headers)
+    with conn:
+        conn.execute(
+            f"INSERT INTO {_q(dst)} ({SEQ}, {cols}) "
+            f"SELECT o.pos, {', '.join('s.' + _q(h) for h in headers)} "
+            f"FROM temp.ord o JOIN {_q(src)} s ON s.{SEQ} = o.src ORDER BY o.pos"
+        )
+        conn.execute("DROP TABLE temp.ord")
+    _create_indexes(conn, dst, headers)
+    return len(order)
+
+
+def where_used(conn, text, stage="parsed", match="contains") -> list:
+    """
+    Где встречается изделие: [(Module, строк, сумма Qty)] по строкам, где Name или PartNumber
+    (без учёта регистра) совпадает с text (match="exact"), начинается с него ("prefix")
+    или содержит его ("contains").
+    exact и prefix идут по индексу колонок *_fold; contains — просмотр всей таблицы.
+    """
+    if match not in MATCHES:
+        raise ValueError(f"match: одно из {', '.join(MATCHES)}")
+    headers = stage_headers(conn, stage)
+    with conn:
+        _add_fold_columns(conn, stage, headers)  # база, записанная до появления *_fold
+    fields = [_q(h + FOLD_SUFFIX) for h in FOLD_COLUMNS if h in headers]
+    key = _fold(text)
+    if match == "exact":
+        cond, params = [f"{f} = ?" for f in fields], [key]
+    elif match == "prefix":
+        # диапазон [key, key + максимальный символ) — строки, начинающиеся с key (сравнение по байтам UTF-8)
+        cond, params = [f"({f} >= ? AND {f} < ?)" for f in fields], [key, key + "\U0010ffff"]
+    else:
+        cond, params = [f"instr({f}, ?) > 0" for f in fields], [key]
+    if match == "contains":
+        where = " OR ".join(cond)
+    else:
+        # по подзапросу на колонку: с OR планировщик может предпочесть индекс Module (под GROUP BY)
+        # и пройти всю таблицу
+        where = f"{SEQ} IN (" + " UNION ".join(f"SELECT {SEQ} FROM {_q(stage)} WHERE {c}" for c in cond) + ")"
+    return conn.execute(
+        f"SELECT Module, COUNT(*), SUM(Qty) FROM {_q(stage)} WHERE {where} "
+        f"GROUP BY Module ORDER BY Module",
+        params * len(fields),
+    ).fetchall()
+
+
+def main():
+    ap = argparse.ArgumentParser(description="BOM в SQLite: таблицы шагов конвейера и запросы")
+    ap.add_argument("--db", default=DB_PATH, help="файл базы")
+    sub = ap.add_subparsers(dest="command", required=True)
+    sub.add_parser("tables", help="таблицы шагов и число строк")
+    p = sub.add_parser("where-used", help="в каких модулях встречается изделие (по Name/PartNumber)")
+    p.add_argument("text")
+    p.add_argument("--stage", choices=STAGES, default="parsed")
+    p.add_argument("--match", choices=MATCHES, default="contains",
+                   help="exact/prefix — по индексу; contains (по умолчанию) — просмотр всей таблицы")
+    p = sub.add_parser("sql", help="выполнить запрос и напечатать строки")
+    p.add_argument("query")
+    p = sub.add_parser("load", help="загрузить промежуточный файл (.xlsx/.bomc) в таблицу шага")
+    p.add_argument("file")
+    p.add_argument("--stage", choices=STAGES, required=True)
+    p = sub.add_parser("export", help="выгрузить таблицу шага в .xlsx/.bomc")
+    p.add_argument("stage", choices=STAGES)
+    p.add_argument("-o", "--output", required=True)
+    args = ap.parse_args()
+
+    conn = connect(args.db)
+    try:
+        if args.command == "tables":
+            for name, n in tables(conn).items():
+                print(f"{name:<12} {n:>8}")
+        elif args.command == "where-used":
+            rows = where_used(conn, args.text, args.stage, args.match)
+            for module, n, qty in rows:
+                print(f"{module or '':<24} строк: {n:>4}  Qty: {qty}")
+            print(f"Модулей: {len(rows)}")
+        elif args.command == "sql":
+            cur = conn.execute(args.query)
+            if cur.description:
+                print("\t".join(d[0] for d in cur.description))
+            for row in cur:
+                print("\t".join("" if v is None else str(v) for v in row))
+        elif args.command == "load":
+            _, headers, rows = bom_io.read_sheet(args.file)
+            n = write_stage(conn, args.stage, [str(h).strip() if h is not None else "" for h in headers], rows)
+            print(f"OK: {args.file} → {args.stage} ({n} строк)")
+        elif args.command == "export":
+            headers, rows = read_stage(conn, args.stage)
+            bom_io.write_sheet(args.output, "BOM", headers, rows)
+            print(f"OK: {args.output}")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
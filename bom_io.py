@@ -0,0 +1,116 @@
+# bom_io.py
+# Общий слой чтения/записи промежуточных XLSX для шагов конвейера.
+#
+# Чтение — load_workbook(read_only=True): строки идут кортежами через iter_rows(values_only=True),
+# объекты ячеек всего листа не строятся, и память зависит от ширины строки, а не от размера листа.
+# Запись — в write_only книгу: строки уходят в файл по мере поступления.
+# Файлы .bomc (колоночный формат, bom_columnar.py) читаются и пишутся теми же функциями.
+
+from pathlib import Path
+
+from openpyxl import Workbook, load_workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Alignment
+from openpyxl.utils import get_column_letter
+
+import bom_columnar
+
+# ===== НАСТРОЙКИ =====
+# Формат промежуточных файлов между шагами: "xlsx" (смотреть глазами) или "bomc" (быстрый колоночный,
+# в XLSX для просмотра — python bom_columnar.py to-xlsx файл.bomc). Финальная ВП всегда XLSX.
+INTERMEDIATE_FORMAT = "xlsx"
+# =====================
+
+
+def stage_path(path, fmt=None):
+    """Имя промежуточного файла в выбранном формате: BOM_split.xlsx → BOM_split.bomc для "bomc"."""
+    fmt = INTERMEDIATE_FORMAT if fmt is None else fmt
+    if fmt == "bomc":
+        return Path(path).with_suffix(bom_columnar.SUFFIX)
+    if fmt == "xlsx":
+        return Path(path)
+    raise ValueError(f"Неизвестный формат промежуточных файлов '{fmt}'. Доступны: xlsx, bomc")
+
+
+def read_sheet(path, sheet_name=None):
+    """
+    Открывает лист на чтение потоком.
+    Возвращает (title, headers, rows): headers — значения первой строки (как есть),
+    rows — ленивый итератор кортежей значений остальных строк, дополненных None до числа
+    заголовков (write_only файлы не хранят размеры листа, и короткие строки приходят как есть).
+    Файл закрывается, когда rows дочитан до конца (или итератор удалён).
+    """
+    if bom_columnar.is_columnar(path):
+        return bom_columnar.read_columns(path)
+
+    wb = load_workbook(path, read_only=True)
+    ws = wb[sheet_name] if sheet_name in wb.sheetnames else wb.active
+    it = ws.iter_rows(values_only=True)
+    headers = list(next(it, ()))
+
+    width = len(headers)
+
+    def rows():
+        try:
+            for r in it:
+                if len(r) < width:
+                    r = r + (None,) * (width - len(r))
+                yield r
+        finally:
+            wb.close()
+
+    return ws.title, headers, rows()
+
+
+def write_sheet(path, title, headers, rows, widths=None, decorate=None):
+    """
+    Записывает лист потоком (write_only). widths — {заголовок: ширина}.
+    decorate(ws, row) -> row — если задан, может заменить значения на WriteOnlyCell со стилем.
+    Возвращает число записанных строк (без заголовка).
+    В .bomc стили не хранятся: decorate не применяется (bom_columnar.to_xlsx ставит перенос сам).
+    """
+    if bom_columnar.is_columnar(path):
+        return bom_columnar.write_columns(path, title, headers, rows, widths=widths)
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(title)
+
+    # ширины задаются до первой строки — в write_only они пишутся в начало листа
+    col = {h: i + 1 for i, h in enumerate(headers)}
+    for h, w in (widths or {}).items():
+        if h in col:
+            ws.column_dimensions[get_column_letter(col[h])].width = w
+
+    ws.append(list(headers))
+    n = 0
+    for row in rows:
+        ws.append(decorate(ws, row) if decorate is not None else row)
+        n += 1
+
+    wb.save(path)
+    return n
+
+
+def styled(ws, value, **style):
+    """Ячейка для write_only листа с заданным стилем (font=..., alignment=...)."""
+    cell = WriteOnlyCell(ws, value=value)
+    for k, v in style.items():
+        setattr(cell, k, v)
+    return cell
+
+
+def wrap_formula_cells(col_idx):
+    """
+    decorate для write_sheet: ячейке с формулой в колонке col_idx (0-based) ставится перенос строк
+    (итоги сжатия вида =REPT("_",4)&CHAR(10)&SUM(...) иначе не показывают черту над числом).
+    """
+    wrap = Alignment(wrap_text=True)
+
+    def decorate(ws, row):
+        v = row[col_idx] if col_idx < len(row) else None
+        if isinstance(v, str) and v.startswith("="):
+            row = list(row)
+            row[col_idx] = styled(ws, v, alignment=wrap)
+        return row
+
+    return decorate
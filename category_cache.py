@@ -0,0 +1,193 @@
+# category_cache.py
+# Постоянный справочник Name → Category для add_category.py и ручные исправления категорий.
+#
+# - Справочник: всё, что уже классифицировано по RULES, лежит в .bom_cache/categories/<ключ>.json.
+#   Ключ — хэш RULES (категории, тексты и флаги regex) и DEFAULT_CATEGORY: любая правка правил
+#   даёт новый ключ, и старый справочник просто перестаёт использоваться (и удаляется при записи).
+#   regex запускаются только для имён, которых в справочнике ещё нет.
+# - Ручные исправления: category_overrides.json рядом со скриптами, {"Name": "Категория", ...}.
+#   Исправление всегда важнее RULES и справочника. Имена сравниваются без учёта регистра
+#   и лишних пробелов. Файл правится руками и хранится в репозитории, в отличие от .bom_cache.
+#
+# Команды:
+#   python category_cache.py stats   — сколько имён в справочнике и исправлений
+#   python category_cache.py purge   — очистить справочник
+
+import argparse
+import hashlib
+import json
+import os
+import re
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent
+
+# ===== НАСТРОЙКИ =====
+CACHE_DIR = BASE_DIR / ".bom_cache" / "categories"
+OVERRIDES_JSON = BASE_DIR / "category_overrides.json"
+# =====================
+
+# Версия формата/логики: увеличить, если меняется нормализация Name перед classify
+CACHE_VERSION = 1
+
+
+def rules_digest(rules, default) -> str:
+    """Хэш набора правил: порядок, категории, тексты и флаги regex, категория по умолчанию."""
+    h = hashlib.sha256()
+    h.update(f"v{CACHE_VERSION}\0{default}\0".encode("utf-8"))
+    for cat, rx in rules:
+        h.update(f"{cat}\0{rx.pattern}\0{rx.flags}\0".encode("utf-8"))
+    return h.hexdigest()
+
+
+def override_key(name) -> str:
+    return re.sub(r"\s+", " ", (name or "").strip()).casefold()
+
+
+def load_overrides(path=OVERRIDES_JSON) -> dict:
+    """{нормализованное Name: категория} из файла исправлений (пустой dict, если файла нет)."""
+    path = Path(path)
+    if not path.exists():
+        return {}
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    if not isinstance(data, dict):
+        raise RuntimeError(f"{path}: ожидается объект {{\"Name\": \"Категория\"}}")
+    return {override_key(k): v for k, v in data.items()}
+
+
+def _store_path(digest, cache_dir=CACHE_DIR) -> Path:
+    return Path(cache_dir) / f"{digest[:32]}.json"
+
+
+class CategoryCache:
+    """
+    Обёртка над функцией классификации: исправления → справочник → classify_fn.
+    persist=False — справочник не читается и не пишется (исправления действуют всё равно).
+    """
+
+    def __init__(self, digest, persist=True, cache_dir=CACHE_DIR, overrides_path=OVERRIDES_JSON):
+        self.digest = digest
+        self.persist = persist
+        self.cache_dir = Path(cache_dir)
+        self.overrides = load_overrides(overrides_path)
+        self.known = {}
+        if persist:
+            p = _store_path(digest, cache_dir)
+            try:
+                with open(p, encoding="utf-8") as f:
+                    self.known = json.load(f)
+            except FileNotFoundError:
+                pass
+            except ValueError:
+                # битый файл (например, оборванная запись) — начинаем заново
+                self.known = {}
+        self.hits = 0
+        self.overridden = 0
+        self.new = {}
+
+    def wrap(self, classify_fn, memo=True):
+        """
+        Функция name → категория с учётом исправлений и справочника.
+        memo=False — справочник не используется, classify_fn вызывается на каждое имя.
+        """
+        overrides = self.overrides
+        known = self.known
+        new = self.new
+
+        def classify_cached(name):
+            if overrides:
+                cat = overrides.get(override_key(name))
+                if cat is not None:
+                    self.overridden += 1
+                    return cat
+            if not memo:
+                return classify_fn(name)
+            cat = known.get(name)
+            if cat is not None:
+                self.hits += 1
+                return cat
+            cat = classify_fn(name)
+            known[name] = cat
+            new[name] = cat
+            return cat
+
+        return classify_cached
+
+    def prefill(self, names, classify_many):
+        """
+        Классифицирует разом имена, которых нет ни в исправлениях, ни в справочнике:
+        classify_many — список имён → {имя: категория} (например, в нескольких процессах).
+        Потом wrap() находит их в справочнике.
+        """
+        overrides = self.overrides
+        todo = [n for n in dict.fromkeys(names)
+                if n not in self.known and not (overrides and override_key(n) in overrides)]
+        if todo:
+            cats = classify_many(todo)
+            self.known.update(cats)
+            self.new.update(cats)
+        return len(todo)
+
+    def save(self):
+        """Дописывает новые имена в справочник (атомарно); справочники от старых RULES удаляет."""
+        if not self.persist or not self.new:
+            return
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        p = _store_path(self.digest, self.cache_dir)
+        tmp = p.with_name(f"{p.name}.{os.getpid()}.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.known, f, ensure_ascii=False, indent=0, sort_keys=True)
+        os.replace(tmp, p)
+        self.new = {}
+        for old in self.cache_dir.glob("*.json"):
+            if old != p:
+                old.unlink(missing_ok=True)
+
+
+def stats(cache_dir=CACHE_DIR, overrides_path=OVERRIDES_JSON) -> dict:
+    files = sorted(Path(cache_dir).glob("*.json")) if Path(cache_dir).exists() else []
+    names = 0
+    for p in files:
+        try:
+            with open(p, encoding="utf-8") as f:
+                names += len(json.load(f))
+        except ValueError:
+            pass
+    return {
+        "dir": str(cache_dir),
+        "files": len(files),
+        "names": names,
+        "bytes": sum(p.stat().st_size for p in files),
+        "overrides": len(load_overrides(overrides_path)),
+    }
+
+
+def purge(cache_dir=CACHE_DIR) -> int:
+    n = 0
+    if Path(cache_dir).exists():
+        for p in Path(cache_dir).glob("*.json"):
+            p.unlink(missing_ok=True)
+            n += 1
+    return n
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Справочник Name → Category")
+    ap.add_argument("command", choices=("stats", "purge"))
+    ap.add_argument("--dir", default=str(CACHE_DIR), help="каталог справочника")
+    args = ap.parse_args()
+
+    if args.command == "purge":
+        n = purge(args.dir)
+        print(f"Удалено файлов: {n}")
+        return
+
+    st = stats(args.dir)
+    print(f"Каталог:      {st['dir']}")
+    print(f"Имён:         {st['names']} (файлов: {st['files']}, {st['bytes'] / 1024:.1f} КБ)")
+    print(f"Исправлений:  {st['overrides']} ({OVERRIDES_JSON.name})")
+
+
+if __name__ == "__main__":
+    main()
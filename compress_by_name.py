@@ -1,8 +1,16 @@
-import openpyxl
-from openpyxl import Workbook
-from openpyxl.styles import Alignment
+import argparse
+from contextlib import closing
+
 from openpyxl.utils import get_column_letter
 
+import bom_db
+import bom_io
+import memory_budget
+import name_dedup
+import profiling
+import run_metrics
+from sort_bom_after_category import norm_space, sort_key_fn
+
 # ========= НАСТРОЙКИ =========
 INPUT_XLSX = "BOM_with_category_sorted.xlsx"
 INPUT_SHEET = "BOM"
@@ -14,8 +22,38 @@ NAME_COL_HEADER = "Name"
 KEEP_HEADERS = {"Module", "PosText", "Qty"}  # эти поля не чистим в строках-повторах
 QTY_HEADER = "Qty"
 
+# Группировка строк по Name:
+#   "hash"     — один проход со словарём: нормализованный Name (пробелы схлопнуты) → строки группы
+#                в порядке входа; группы выводятся в порядке сортировки (row_sort_key по первой
+#                строке группы). Вход может быть не отсортирован: одинаковые Name, разнесённые
+#                по файлу, всё равно попадут в одну группу. Все строки держатся в памяти;
+#   "adjacent" — только подряд идущие строки с точно равным Name (прежнее поведение, поток).
+#                Нужна предварительная сортировка (sort_bom_after_category.py).
+# На отсортированном входе результат одинаковый (если Name различаются не только пробелами).
+GROUPING = "hash"
+GROUPINGS = ("hash", "adjacent")
+
+# Слияние почти одинаковых Name перед группировкой (name_dedup.py): порог похожести 0..1
+# (варианты получают Name и Category образца). None — сливать только одинаковые Name.
+MERGE_SIMILAR = None
+
 # "черта" над числом в ячейке итога (REPT("_", N))
 LINE_LEN = 4
+
+# Чуть удобочитаемые ширины (если такие колонки есть)
+COLUMN_WIDTHS = {
+    "Module": 16,
+    "Section": 14,
+    "PosText": 8,
+    "Category": 22,
+    "Name": 60,
+    "Manufacturer": 28,
+    "PartNumber": 28,
+    "Qty": 8,
+    "Comment": 60,
+    "SupplyDoc": 55,
+    "Name_Clean": 60,
+}
 # ============================
 
 
@@ -23,116 +61,200 @@ def normalize_header(v):
     return (str(v).strip() if v is not None else "")
 
 
-def main():
-    wb = openpyxl.load_workbook(INPUT_XLSX)
-    ws = wb[INPUT_SHEET] if INPUT_SHEET in wb.sheetnames else wb.active
+def name_key(name) -> str:
+    """Ключ группы: Name без лишних пробелов; "" — строка без Name."""
+    return norm_space(name)
 
-    headers = [normalize_header(c.value) for c in ws[1]]
+
+def compress_rows(headers, rows, grouping=GROUPING, merge_similar=MERGE_SIMILAR, merged=None):
+    """
+    Сжатие по Name: rows — строки без заголовка (последовательности значений в порядке headers).
+    Возвращает итератор строк выходного листа (без заголовка). Номера строк в формулах итогов
+    считаются так, как будто заголовок — строка 1.
+    grouping — см. GROUPINGS: "adjacent" ленивый, в памяти только текущая группа;
+    "hash" читает rows целиком.
+    merge_similar — порог слияния почти одинаковых Name (только с "hash"); в merged (dict),
+    если передан, пишется {вариант: образец}.
+    """
+    if grouping not in GROUPINGS:
+        raise ValueError(f"Неизвестная группировка '{grouping}'. Доступны: {', '.join(GROUPINGS)}")
     if NAME_COL_HEADER not in headers:
         raise RuntimeError(f"Нет колонки {NAME_COL_HEADER}. Заголовки: {headers}")
     if QTY_HEADER not in headers:
         raise RuntimeError(f"Нет колонки {QTY_HEADER}. Заголовки: {headers}")
+    if merge_similar:
+        if grouping != "hash":
+            raise ValueError("Слияние похожих Name — только с группировкой \"hash\": варианты стоят не рядом")
+        rows, mapping = name_dedup.merge_rows(headers, rows, merge_similar, NAME_COL_HEADER)
+        if merged is not None:
+            merged.update(mapping)
 
     col = {h: i + 1 for i, h in enumerate(headers)}  # 1-based
     name_col = col[NAME_COL_HEADER]
     qty_col = col[QTY_HEADER]
 
-    # Считываем данные (без заголовка). Пустые строки сохраняем как есть.
-    data = []
-    for r in range(2, ws.max_row + 1):
-        row_vals = [ws.cell(r, c).value for c in range(1, len(headers) + 1)]
-        data.append(row_vals)
-
-    out_wb = Workbook()
-    out_ws = out_wb.active
-    out_ws.title = OUTPUT_SHEET
-
-    # Заголовок
-    out_ws.append(headers)
-
-    wrap = Alignment(wrap_text=True)
-
-    out_row_idx = 1  # текущая последняя заполненная строка в out_ws (заголовок = 1)
-    i = 0
-    while i < len(data):
-        row = data[i]
-        name = row[name_col - 1]
-
-        # Если строка без Name — копируем как есть и идём дальше
-        if name is None or str(name).strip() == "":
-            out_ws.append(row)
-            out_row_idx += 1
-            i += 1
-            continue
-
-        # Граница блока по одинаковому Name (строгое совпадение)
-        j = i
-        while j < len(data):
-            n2 = data[j][name_col - 1]
-            if n2 is None or str(n2).strip() == "":
-                break
-            if str(n2) != str(name):
-                break
-            j += 1
-
-        group_size = j - i
+    def emit_group(group, out_row_idx):
+        """Строки вывода для группы одинаковых Name; out_row_idx — последняя занятая строка листа."""
+        out = []
 
         # Запоминаем диапазон строк по Qty в выходном листе для суммы
         first_group_out = out_row_idx + 1  # первая строка группы будет следующей вставкой
 
         # Пишем строки группы
-        for k in range(i, j):
-            rvals = list(data[k])
+        for k, row in enumerate(group):
+            rvals = list(row)
 
             # Для повторов (кроме первой строки блока) чистим всё, кроме KEEP_HEADERS
-            if k != i:
+            if k != 0:
                 for h, ci in col.items():
                     if h in KEEP_HEADERS:
                         continue
                     rvals[ci - 1] = None
 
-            out_ws.append(rvals)
-            out_row_idx += 1
+            out.append(rvals)
 
-        last_group_out = out_row_idx
+        last_group_out = out_row_idx + len(group)
 
         # Итоговую строку добавляем только если строк в блоке больше 1
-        if group_size > 1:
+        if len(group) > 1:
             sum_row = [None] * len(headers)
             qty_letter = get_column_letter(qty_col)
             # черта + перенос строки + SUM по диапазону Qty внутри группы
             formula = f'=REPT("_",{LINE_LEN})&CHAR(10)&SUM({qty_letter}{first_group_out}:{qty_letter}{last_group_out})'
             sum_row[qty_col - 1] = formula
-            out_ws.append(sum_row)
-            out_row_idx += 1
-            out_ws.cell(out_row_idx, qty_col).alignment = wrap
+            out.append(sum_row)
 
         # Пустая строка после каждого блока — ВСЕГДА
-        out_ws.append([None] * len(headers))
-        out_row_idx += 1
-
-        i = j
-
-    # Чуть удобочитаемые ширины (если такие колонки есть)
-    widths = {
-        "Module": 16,
-        "Section": 14,
-        "PosText": 8,
-        "Category": 22,
-        "Name": 60,
-        "Manufacturer": 28,
-        "PartNumber": 28,
-        "Qty": 8,
-        "Comment": 60,
-        "SupplyDoc": 55,
-        "Name_Clean": 60,
-    }
-    for h, w in widths.items():
-        if h in col:
-            out_ws.column_dimensions[get_column_letter(col[h])].width = w
-
-    out_wb.save(OUTPUT_XLSX)
-    print(f"OK: {OUTPUT_XLSX}")
+        out.append([None] * len(headers))
+        return out
+
+    def gen_adjacent():
+        out_row_idx = 1  # текущая последняя заполненная строка выходного листа (заголовок = 1)
+        group = []       # текущий блок одинаковых Name (строгое совпадение)
+
+        for row in rows:
+            name = row[name_col - 1]
+
+            # Строка без Name закрывает блок и копируется как есть
+            if name is None or str(name).strip() == "":
+                if group:
+                    out = emit_group(group, out_row_idx)
+                    out_row_idx += len(out)
+                    group = []
+                    yield from out
+                out_row_idx += 1
+                yield list(row)
+                continue
+
+            if group and str(name) == str(group[0][name_col - 1]):
+                group.append(row)
+                continue
+
+            if group:
+                out = emit_group(group, out_row_idx)
+                out_row_idx += len(out)
+                yield from out
+            group = [row]
+
+        if group:
+            yield from emit_group(group, out_row_idx)
+
+    def gen_hash():
+        # Один проход: ключ → строки группы; строки без Name — каждая сама по себе (копируется как есть)
+        groups = {}
+        items = []   # [(строки группы, без Name?)] в порядке первого появления
+        for row in rows:
+            key = name_key(row[name_col - 1])
+            if not key:
+                items.append(([row], True))
+                continue
+            group = groups.get(key)
+            if group is None:
+                group = groups[key] = []
+                items.append((group, False))
+            group.append(row)
+
+        # Ключ сортировки — один на группу (по первой строке); при равных — порядок первого появления
+        row_key = sort_key_fn(headers)
+
+        def sort_key(item):
+            return row_key(item[0][0])
+
+        out_row_idx = 1
+        for group, blank in sorted(items, key=sort_key):
+            if blank:
+                out_row_idx += 1
+                yield list(group[0])
+                continue
+            out = emit_group(group, out_row_idx)
+            out_row_idx += len(out)
+            yield from out
+
+    return gen_hash() if grouping == "hash" else gen_adjacent()
+
+
+def save_compressed(headers, out_rows, path, title=OUTPUT_SHEET):
+    # итоговые ячейки с формулой — с переносом строк (черта над числом)
+    decorate = bom_io.wrap_formula_cells(headers.index(QTY_HEADER)) if QTY_HEADER in headers else None
+    return bom_io.write_sheet(path, title, headers, out_rows, widths=COLUMN_WIDTHS, decorate=decorate)
+
+
+def compress_db(conn, src="sorted", dst="compressed", grouping=GROUPING, merge_similar=MERGE_SIMILAR, merged=None):
+    """То же в SQLite (bom_db.py): строки src по порядку → таблица dst. Возвращает число строк."""
+    headers, rows = bom_db.read_stage(conn, src)
+    return bom_db.write_stage(conn, dst, headers,
+                              list(compress_rows(headers, rows, grouping, merge_similar, merged)))
+
+
+def print_merged(merged):
+    for variant, name in sorted(merged.items(), key=lambda vn: (vn[1], vn[0])):
+        print(f"Слито: {variant!r} → {name!r}")
+
+
+@memory_budget.exit_on_budget
+def main():
+    ap = argparse.ArgumentParser(description="Сжатие BOM по Name")
+    ap.add_argument("--db", nargs="?", const=bom_db.DB_PATH, metavar="SQLITE",
+                    help=f"сжать таблицу sorted в compressed в базе (по умолчанию {bom_db.DB_PATH})")
+    ap.add_argument("--grouping", choices=GROUPINGS, default=GROUPING, help="группировка строк по Name")
+    ap.add_argument("-i", "--input", default=INPUT_XLSX,
+                    help="входной файл (с --grouping hash сортировка не нужна: подойдёт и BOM_with_category.xlsx); "
+                         "с --db — таблица (sorted или categorized)")
+    ap.add_argument("--merge-similar", nargs="?", type=float, const=name_dedup.APPLY_THRESHOLD,
+                    default=MERGE_SIMILAR, metavar="THRESHOLD",
+                    help=f"слить почти одинаковые Name (name_dedup.py), порог по умолчанию {name_dedup.APPLY_THRESHOLD}")
+    profiling.add_argument(ap)
+    memory_budget.add_argument(ap)
+    args = ap.parse_args()
+    if args.merge_similar and args.grouping != "hash":
+        ap.error("--merge-similar — только с --grouping hash")
+    merged = {}
+
+    if args.db:
+        with run_metrics.stage("compress", outputs=[args.db], profile_dir=args.profile,
+                               memory=args.memory) as m, \
+                closing(bom_db.connect(args.db)) as conn:
+            src = args.input if args.input in bom_db.STAGES else "sorted"
+            m.rows_in = bom_db.count_rows(conn, src)
+            m.rows_out = compress_db(conn, src, "compressed", args.grouping, args.merge_similar, merged)
+            m.extra["merged_names"] = len(merged)
+        print_merged(merged)
+        print(f"OK: {args.db}:compressed")
+        return
+
+    in_path = bom_io.stage_path(args.input)
+    out_path = bom_io.stage_path(OUTPUT_XLSX)
+    with run_metrics.stage("compress", inputs=[in_path], outputs=[out_path], profile_dir=args.profile,
+                           memory=args.memory) as m:
+        _, headers, rows = bom_io.read_sheet(in_path, INPUT_SHEET)
+        headers = [normalize_header(h) for h in headers]
+
+        # Пустые строки сохраняем как есть.
+        out_rows = compress_rows(headers, m.count_in(rows), args.grouping, args.merge_similar, merged)
+        m.rows_out = save_compressed(headers, out_rows, out_path)
+        m.extra["merged_names"] = len(merged)
+    print_merged(merged)
+    print(f"OK: {out_path}")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,192 @@
+# docx_tables.py
+# Чтение строк таблиц спецификации (DOCX) — два движка с одинаковым результатом:
+#
+# - "docx": python-docx Document → doc.tables → row.cells → c.text (как было);
+# - "lxml": потоковый проход по word/document.xml прямо из zip (iterparse по w:tbl/w:tr/w:tc).
+#   Остальные части пакета (картинки штампа, стили, колонтитулы) не читаются вовсе,
+#   объекты-обёртки на ячейки не создаются, каждая строка таблицы удаляется из дерева
+#   сразу после разбора — память не растёт с размером спецификации.
+#
+# Оба движка выдают список "сырых" текстов ячеек строки (до clean), повторяя правила python-docx:
+# - берутся только таблицы верхнего уровня тела документа (вложенные и в колонтитулах — нет);
+# - ячейка с gridSpan=N повторяется N раз;
+# - ячейка vMerge="continue" берёт текст ячейки над ней (из предыдущей строки);
+# - текст ячейки = абзацы через "\n"; в абзаце — w:r и w:hyperlink;
+#   в w:r — w:t, w:tab/w:ptab ("\t"), w:br/w:cr ("\n"), w:noBreakHyphen ("-").
+
+import zipfile
+
+from lxml import etree
+
+ENGINES = ("docx", "lxml")
+
+W_NS = "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
+
+
+def _w(tag: str) -> str:
+    return f"{{{W_NS}}}{tag}"
+
+
+W_BODY = _w("body")
+W_TBL = _w("tbl")
+W_TR = _w("tr")
+W_TC = _w("tc")
+W_P = _w("p")
+W_R = _w("r")
+W_HYPERLINK = _w("hyperlink")
+W_SDT = _w("sdt")
+W_TCPR = _w("tcPr")
+W_TRPR = _w("trPr")
+W_GRIDSPAN = _w("gridSpan")
+W_GRIDBEFORE = _w("gridBefore")
+W_VMERGE = _w("vMerge")
+W_VAL = _w("val")
+W_TYPE = _w("type")
+
+# Текстовые эквиваленты содержимого w:r (как __str__ у элементов python-docx)
+_RUN_CHARS = {
+    _w("tab"): "\t",
+    _w("ptab"): "\t",
+    _w("cr"): "\n",
+    _w("noBreakHyphen"): "-",
+}
+W_T = _w("t")
+W_BR = _w("br")
+
+
+# ==========================
+# ДВИЖОК python-docx
+# ==========================
+
+def iter_rows_docx(input_path):
+    from docx import Document
+
+    doc = Document(input_path)
+    for table in doc.tables:
+        for row in table.rows:
+            yield [c.text for c in row.cells]
+
+
+# ==========================
+# ПОТОКОВЫЙ ДВИЖОК lxml
+# ==========================
+
+def _run_text(r) -> str:
+    parts = []
+    for e in r:
+        tag = e.tag
+        if tag == W_T:
+            parts.append(e.text or "")
+        elif tag == W_BR:
+            parts.append("\n" if e.get(W_TYPE, "textWrapping") == "textWrapping" else "")
+        else:
+            ch = _RUN_CHARS.get(tag)
+            if ch is not None:
+                parts.append(ch)
+    return "".join(parts)
+
+
+def _paragraph_text(p) -> str:
+    parts = []
+    for e in p:
+        if e.tag == W_R:
+            parts.append(_run_text(e))
+        elif e.tag == W_HYPERLINK:
+            parts.extend(_run_text(r) for r in e if r.tag == W_R)
+    return "".join(parts)
+
+
+def _cell_text(tc) -> str:
+    return "\n".join(_paragraph_text(p) for p in tc if p.tag == W_P)
+
+
+def _int_val(parent, tag, default):
+    if parent is None:
+        return default
+    e = parent.find(tag)
+    if e is None:
+        return default
+    return int(e.get(W_VAL))
+
+
+def _row_cells(tr, prev_row):
+    """
+    Разбор одной строки. prev_row — {grid_offset: [тексты]} предыдущей строки
+    этой же таблицы (для vMerge="continue"). Возвращает (cells, row_map).
+    """
+    cells = []
+    row_map = {}
+    offset = _int_val(tr.find(W_TRPR), W_GRIDBEFORE, 0)
+
+    for tc in tr:
+        if tc.tag != W_TC:
+            continue
+        tcpr = tc.find(W_TCPR)
+        span = _int_val(tcpr, W_GRIDSPAN, 1)
+        vmerge = tcpr.find(W_VMERGE) if tcpr is not None else None
+
+        if vmerge is not None and vmerge.get(W_VAL, "continue") == "continue":
+            # продолжение вертикального объединения — содержимое у ячейки выше
+            if prev_row is None:
+                raise ValueError("no tr above topmost tr in w:tbl")
+            if offset not in prev_row:
+                raise ValueError(f"no `tc` element at grid_offset={offset}")
+            texts = prev_row[offset]
+        else:
+            texts = [_cell_text(tc)] * span
+
+        row_map[offset] = texts
+        cells.extend(texts)
+        offset += span
+
+    return cells, row_map
+
+
+def iter_rows_lxml(input_path):
+    with zipfile.ZipFile(input_path) as zf, zf.open("word/document.xml") as f:
+        context = etree.iterparse(
+            f,
+            events=("end",),
+            tag=(W_TR, W_TBL, W_P, W_SDT),
+            remove_blank_text=True,   # как парсер python-docx
+            resolve_entities=False,
+        )
+        prev_row = None
+        current_tbl = None
+
+        for _, elem in context:
+            parent = elem.getparent()
+
+            if elem.tag == W_TR:
+                tbl = parent
+                if tbl is None or tbl.getparent() is None or tbl.getparent().tag != W_BODY:
+                    continue  # вложенная таблица — её строки не нужны, уйдут вместе с родителем
+                if tbl is not current_tbl:
+                    current_tbl = tbl
+                    prev_row = None
+
+                cells, prev_row = _row_cells(elem, prev_row)
+                yield cells
+
+                # строка разобрана — освобождаем её и всё, что было до неё
+                elem.clear()
+                while elem.getprevious() is not None:
+                    del tbl[0]
+                continue
+
+            # w:tbl / w:p / w:sdt верхнего уровня тела: просто освобождаем память
+            if parent is not None and parent.tag == W_BODY:
+                elem.clear()
+                while elem.getprevious() is not None:
+                    del parent[0]
+
+        del context
+
+
+def iter_table_rows(input_path, engine="docx"):
+    """Строки всех таблиц документа: списки сырых текстов ячеек."""
+    if engine == "docx":
+        return iter_rows_docx(input_path)
+    if engine == "lxml":
+        return iter_rows_lxml(input_path)
+    raise ValueError(f"Неизвестный движок парсера '{engine}'. Доступны: {', '.join(ENGINES)}")
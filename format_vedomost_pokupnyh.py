@@ -1,8 +1,18 @@
+import argparse
 import re
-from openpyxl import load_workbook, Workbook
+from contextlib import closing
+
+from openpyxl import Workbook
 from openpyxl.styles import Font, Alignment
 from openpyxl.utils import get_column_letter
 
+import bom_db
+import bom_io
+import memory_budget
+import product_structure
+import profiling
+import run_metrics
+
 # ===== НАСТРОЙКИ =====
 INPUT_XLSX = "BOM_split.xlsx"   # твой файл после compress + split_name_to_supplydoc
 INPUT_SHEET = "BOM_compressed"               # имя листа во входном файле
@@ -51,11 +61,16 @@ def to_int_or_empty(v):
     except Exception:
         return v  # на всякий
 
-def main():
-    wb = load_workbook(INPUT_XLSX)
-    ws = wb[INPUT_SHEET] if INPUT_SHEET in wb.sheetnames else wb.active
-
-    in_headers = [clean(c.value) for c in ws[1]]
+def build_vp(in_headers, rows, multiplicity=None):
+    """
+    Строит ведомость покупных по строкам BOM (после compress + split).
+    in_headers — заголовки входа, rows — строки без заголовка (кортежи/списки значений).
+    multiplicity — {module_code: количество модуля на изделие} (product_structure.py);
+    "Всего" = Qty × количество модуля, модулей без количества — по одному.
+    Возвращает Workbook с листом "ВП" (ещё не сохранённый).
+    """
+    multiplicity = multiplicity or {}
+    in_headers = [clean(h) for h in in_headers]
     idx = {h: i for i, h in enumerate(in_headers)}  # 0-based
 
     for need in ("Category", "Name_Clean", "SupplyDoc", "Module", "Qty", "Comment"):
@@ -73,6 +88,8 @@ def main():
     out_ws = out_wb.active
     out_ws.title = "ВП"
     out_ws.append(OUT_HEADERS)
+    # номер последней строки листа: out_ws.max_row каждый раз обходит все ячейки листа
+    out_row_idx = 1
 
     underline_font = Font(underline="single")
     wrap = Alignment(wrap_text=True)
@@ -87,8 +104,6 @@ def main():
 
     last_category = None
 
-    # Считываем все строки входа в список (чтобы удобно делать группировку)
-    rows = [tuple(c.value for c in r) for r in ws.iter_rows(min_row=2)]
     n = len(rows)
 
     pos_idx = 0
@@ -118,9 +133,11 @@ def main():
             row_cat = [""] * len(OUT_HEADERS)
             row_cat[0] = cat
             out_ws.append(row_cat)
-            out_ws.cell(out_ws.max_row, 1).font = underline_font
+            out_row_idx += 1
+            out_ws.cell(out_row_idx, 1).font = underline_font
 
             out_ws.append([""] * len(OUT_HEADERS))  # пустая строка после категории
+            out_row_idx += 1
             last_category = cat
 
         # ---- собираем группу "позиция" ----
@@ -163,26 +180,31 @@ def main():
 
             out_row[OUT_COL_MODULE - 1] = g_module
             out_row[OUT_COL_QTY_ON_ITEM - 1] = g_qty
-            out_row[OUT_COL_TOTAL - 1] = g_qty  # в строках позиции "Всего" = Qty
+            # в строках позиции "Всего" = Qty × сколько таких модулей в изделии;
+            # нечисловой Qty (формула, текст) переносится как есть — строку умножать нельзя
+            out_row[OUT_COL_TOTAL - 1] = g_qty * multiplicity.get(g_module, 1) if isinstance(g_qty, int) else g_qty
 
             out_ws.append(out_row)
+            out_row_idx += 1
 
             if first_out_row is None:
-                first_out_row = out_ws.max_row
-            last_out_row = out_ws.max_row
+                first_out_row = out_row_idx
+            last_out_row = out_row_idx
 
         # ---- итог по позиции: только колонка "Всего" с чертой+SUM ----
         # Итоговую строку выводим только если в позиции больше одной строки (по твоей логике compress)
         if len(group) > 1 and first_out_row is not None and last_out_row is not None:
             total_row = [""] * len(OUT_HEADERS)
-            col_letter = get_column_letter(OUT_COL_QTY_ON_ITEM)  # суммируем "на изделие"
+            col_letter = get_column_letter(OUT_COL_TOTAL)  # суммируем "Всего" строк позиции
             formula = f'=REPT("_",4)&CHAR(10)&SUM({col_letter}{first_out_row}:{col_letter}{last_out_row})'
             total_row[OUT_COL_TOTAL - 1] = formula
             out_ws.append(total_row)
-            out_ws.cell(out_ws.max_row, OUT_COL_TOTAL).alignment = wrap
+            out_row_idx += 1
+            out_ws.cell(out_row_idx, OUT_COL_TOTAL).alignment = wrap
 
         # 3) Пустая строка ПОСЛЕ ПОЗИЦИИ (т.е. перед следующим Наименованием)
         out_ws.append([""] * len(OUT_HEADERS))
+        out_row_idx += 1
 
         pos_idx = j
 
@@ -191,7 +213,34 @@ def main():
     for i, w in enumerate(widths, 1):
         out_ws.column_dimensions[get_column_letter(i)].width = w
 
-    out_wb.save(OUTPUT_XLSX)
+    return out_wb
+
+
+@memory_budget.exit_on_budget
+def main():
+    ap = argparse.ArgumentParser(description="Формирование ведомости покупных")
+    ap.add_argument("--db", nargs="?", const=bom_db.DB_PATH, metavar="SQLITE",
+                    help=f"читать таблицу split из базы (по умолчанию {bom_db.DB_PATH})")
+    profiling.add_argument(ap)
+    memory_budget.add_argument(ap)
+    args = ap.parse_args()
+
+    in_path = args.db or bom_io.stage_path(INPUT_XLSX)
+    with run_metrics.stage("vp", inputs=[in_path], outputs=[OUTPUT_XLSX], profile_dir=args.profile,
+                           memory=args.memory) as m:
+        if args.db:
+            with closing(bom_db.connect(args.db)) as conn:
+                in_headers, rows = bom_db.read_stage(conn, "split")
+                rows = list(rows)  # до закрытия соединения
+        else:
+            _, in_headers, rows = bom_io.read_sheet(in_path, INPUT_SHEET)
+
+        # Считываем все строки входа в список (чтобы удобно делать группировку)
+        rows = list(rows)
+        m.rows_in = len(rows)
+        out_wb = build_vp(in_headers, rows, product_structure.load_multiplicities())
+        m.rows_out = out_wb.active.max_row
+        out_wb.save(OUTPUT_XLSX)
     print(f"OK: {OUTPUT_XLSX}")
 
 if __name__ == "__main__":
@@ -0,0 +1,222 @@
+# incremental.py
+# Инкрементальный прогон конвейера (run_pipeline.py --incremental): пересчитываются только
+# изменившиеся модули.
+#
+# Между запусками в .bom_cache/incremental/ хранится состояние:
+#   - по каждому module_code из SPECS — sha256 его DOCX, строки модуля уже с Category
+#     (включая пустую строку-разделитель после модуля) и ключи сортировки этих строк;
+#   - порядок всех строк после сортировки — ссылками (module_code, номер строки);
+#   - Name → (Name_Clean, SupplyDoc).
+# При следующем запуске разбираются, классифицируются и получают ключи сортировки только модули,
+# у которых изменился DOCX (и новые); строки удалённых из SPECS модулей выбрасываются.
+# Сортировка: строки неизменившихся модулей уже стоят в прошлом порядке, новые дописываются в конец —
+# sort (timsort) находит готовую упорядоченную серию и сливает с ней только новые строки.
+# Порядок тот же, что у полной устойчивой сортировки: при равных ключах — по месту модуля в SPECS
+# и номеру строки в модуле. SupplyDoc считается только для Name, которых ещё не было.
+# Сжатие по Name, ВП и запись итогового файла — линейные проходы по готовым строкам.
+#
+# Состояние сбрасывается само, если изменились версия парсера, RULES или category_overrides.json.
+# После правки логики сортировки или split_name — STATE_VERSION + 1 (или --no-cache: полный пересчёт).
+
+import hashlib
+import json
+import os
+import pickle
+import zlib
+from pathlib import Path
+
+import add_category
+import category_cache
+import parallel_names
+import parse_cache
+import parse_specs_to_bom_many as parse_stage
+import split_name_to_supplydoc
+from sort_bom_after_category import sort_key_fn
+
+BASE_DIR = Path(__file__).resolve().parent
+
+# ===== НАСТРОЙКИ =====
+STATE_DIR = BASE_DIR / ".bom_cache" / "incremental"
+STATE_NAME = "pipeline"
+# =====================
+
+# Версия состояния: увеличить при правке row_sort_key / split_name / формата состояния
+STATE_VERSION = 2
+
+
+def state_path(name=STATE_NAME, state_dir=STATE_DIR) -> Path:
+    return Path(state_dir) / f"{name}.state"
+
+
+def pipeline_digest() -> str:
+    """Всё, от чего зависят сохранённые строки модулей, кроме самих DOCX."""
+    overrides = category_cache.load_overrides()
+    h = hashlib.sha256()
+    h.update(f"v{STATE_VERSION}\0p{parse_stage.PARSER_VERSION}\0a{add_category.FASTENER_ATTRS:d}\0".encode("utf-8"))
+    h.update(category_cache.rules_digest(add_category.RULES, add_category.DEFAULT_CATEGORY).encode("utf-8"))
+    h.update(json.dumps(overrides, ensure_ascii=False, sort_keys=True).encode("utf-8"))
+    return h.hexdigest()
+
+
+class PipelineState:
+    """Строки по модулям, порядок сортировки и SupplyDoc по Name между запусками."""
+
+    def __init__(self, digest):
+        self.digest = digest
+        self.modules = {}   # module_code → {"docx": имя файла, "file": sha256, "rows": [...], "keys": [...]}
+        self.order = []     # [(module_code, номер строки)] — порядок после сортировки
+        self.names = {}     # Name → (Name_Clean, SupplyDoc)
+        self.codes = []     # module_code в порядке SPECS последнего update
+        self.headers = add_category.output_headers(parse_stage.BOM_HEADERS)
+
+    @classmethod
+    def load(cls, path=None, fresh=False):
+        """Состояние с диска; пустое, если файла нет, он битый, устарел или fresh=True."""
+        digest = pipeline_digest()
+        path = state_path() if path is None else Path(path)
+        if not fresh:
+            try:
+                state = pickle.loads(zlib.decompress(path.read_bytes()))
+            except FileNotFoundError:
+                state = None
+            except Exception:
+                # битый файл (например, оборванная запись) — начинаем заново
+                state = None
+            if isinstance(state, cls) and state.digest == digest:
+                return state
+        return cls(digest)
+
+    def save(self, path=None):
+        path = state_path() if path is None else Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # SupplyDoc храним только для Name, которые ещё есть в строках
+        name_i = self.headers.index("Name")
+        used = {"" if r[name_i] is None else str(r[name_i]) for m in self.modules.values() for r in m["rows"]}
+        self.names = {k: v for k, v in self.names.items() if k in used}
+        blob = zlib.compress(pickle.dumps(self, protocol=pickle.HIGHEST_PROTOCOL), 1)
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        tmp.write_bytes(blob)
+        os.replace(tmp, path)
+
+    def update(self, specs, workers=parse_stage.WORKERS, timeout=parse_stage.FILE_TIMEOUT,
+               engine=parse_stage.PARSER_ENGINE, use_cache=parse_stage.USE_PARSE_CACHE, memory=None,
+               touched=None, name_workers=parallel_names.WORKERS, chunk_size=parallel_names.CHUNK_SIZE):
+        """
+        Приводит состояние к specs: разбирает и классифицирует изменившиеся модули, пересобирает порядок.
+        Возвращает dict: changed (module_code разобранных заново), removed, reused (модулей взято из состояния
+        без разбора), cache_hits (сколько из разобранных заново нашлось в parse_cache), specs (время разбора
+        изменившихся файлов, как в parse_specs).
+        memory — memory_budget.MemoryTracker для parse_specs.
+        touched — имена DOCX, которые могли измениться (watch.py); у остальных модулей sha256 не пересчитывается.
+        name_workers, chunk_size — процессы для классификации новых Name (parallel_names.py).
+        """
+        codes = [m for _, m in specs]
+        if len(set(codes)) != len(codes):
+            dup = sorted({m for m in codes if codes.count(m) > 1})
+            raise ValueError(f"Повторяющиеся module_code в SPECS: {dup}")
+
+        changed, files = [], {}
+        for input_docx, module_code in specs:
+            known = self.modules.get(module_code)
+            if touched is not None and known is not None and known.get("docx") == input_docx \
+                    and input_docx not in touched:
+                files[module_code] = known["file"]
+                continue
+            p = parse_stage.SPECS_DIR / input_docx
+            files[module_code] = parse_cache.file_digest(p) if p.exists() else None
+            if known is None or files[module_code] is None or known["file"] != files[module_code]:
+                changed.append((input_docx, module_code))
+
+        removed = sorted(set(self.modules) - set(codes))
+        for m in removed:
+            del self.modules[m]
+
+        info = {}
+        if changed:
+            blocks = parse_stage.parse_specs(changed, workers=workers, timeout=timeout, engine=engine,
+                                             use_cache=use_cache, info=info, memory=memory)
+            # все изменившиеся модули — одним проходом классификации (справочник читается один раз)
+            block_rows = [parse_stage.bom_rows([b]) for b in blocks]
+            _, cat_rows = add_category.categorize_rows(
+                parse_stage.BOM_HEADERS, (r for rows in block_rows for r in rows), use_cache=use_cache,
+                workers=name_workers, chunk_size=chunk_size,
+            )
+            cat_rows = list(cat_rows)
+            sort_key = sort_key_fn(self.headers)
+            start = 0
+            for (input_docx, module_code), rows in zip(changed, block_rows):
+                mod_rows = cat_rows[start:start + len(rows)]
+                start += len(rows)
+                self.modules[module_code] = {
+                    "docx": input_docx,
+                    "file": files[module_code],
+                    "rows": mod_rows,
+                    "keys": [sort_key(r) for r in mod_rows],
+                }
+
+        dirty = {m for _, m in changed} | set(removed)
+        order = [ref for ref in self.order if ref[0] not in dirty]
+        for _, module_code in changed:
+            order.extend((module_code, i) for i in range(len(self.modules[module_code]["rows"])))
+        pos = {m: i for i, m in enumerate(codes)}
+        modules = self.modules
+        order.sort(key=lambda ref: (modules[ref[0]]["keys"][ref[1]], pos[ref[0]], ref[1]))
+        self.order = order
+        self.codes = codes
+
+        return {
+            "changed": [m for _, m in changed],
+            "removed": removed,
+            "reused": len(codes) - len(changed),
+            "cache_hits": info.get("cache_hits", 0),
+            "specs": info.get("specs", []),
+        }
+
+    def select(self, specs):
+        """
+        Состояние только с модулями specs, уже разобранными в этом (batch_build.py: одно общее
+        состояние на несколько изделий). Строки модулей и SupplyDoc по Name — общие с этим
+        состоянием, не копии; порядок — пока прежний, update(specs, touched=set()) пересортирует
+        его по порядку specs без чтения DOCX.
+        """
+        codes = [m for _, m in specs]
+        missing = [m for m in codes if m not in self.modules]
+        if missing:
+            raise KeyError(f"Модулей нет в состоянии: {missing}")
+        view = PipelineState(self.digest)
+        view.headers = self.headers
+        view.names = self.names
+        view.modules = {m: self.modules[m] for m in codes}
+        view.order = [ref for ref in self.order if ref[0] in view.modules]
+        view.codes = codes
+        return view
+
+    def parsed_rows(self):
+        """Строки BOMs_parsed (в порядке SPECS, без Category)."""
+        width = len(parse_stage.BOM_HEADERS)
+        return [r[:width] for m in self.codes for r in self.modules[m]["rows"]]
+
+    def categorized_rows(self):
+        """Строки BOM_with_category (в порядке SPECS)."""
+        return [r for m in self.codes for r in self.modules[m]["rows"]]
+
+    def sorted_rows(self):
+        """Строки BOM_with_category_sorted."""
+        modules = self.modules
+        return [modules[m]["rows"][i] for m, i in self.order]
+
+    def parsed_count(self) -> int:
+        """Строк BOM без разделителей между модулями."""
+        return sum(len(self.modules[m]["rows"]) - 1 for m in self.codes)
+
+    def split_names(self, names, workers=parallel_names.WORKERS, chunk_size=parallel_names.CHUNK_SIZE):
+        """Заранее посчитать split_name для Name, которых ещё нет в состоянии (в workers процессах)."""
+        todo = [n for n in dict.fromkeys(names) if n not in self.names]
+        self.names.update(split_name_to_supplydoc.split_many(todo, workers, chunk_size))
+
+    def split_name(self, name):
+        """split_name_to_supplydoc.split_name с запоминанием по Name."""
+        parts = self.names.get(name)
+        if parts is None:
+            parts = self.names[name] = split_name_to_supplydoc.split_name(name)
+        return parts
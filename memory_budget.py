@@ -0,0 +1,260 @@
+# memory_budget.py
+# Пик памяти шагов конвейера и бюджет памяти: --memory [МБ] у каждого скрипта шага и у run_pipeline.py.
+#
+# С --memory шаг идёт под tracemalloc; в отчёт run_report.json (run_metrics.py) у шага добавляется
+# "memory": пик памяти Python-объектов, пик RSS процесса, крупнейшие места выделения (файл:строка)
+# около пика; у парсера — ещё пик по каждой спецификации.
+# Места выделения — снимок tracemalloc, который делается каждый раз, когда занятая память выросла
+# в SNAPSHOT_GROWTH раз с прошлого снимка, — т.е. последний снимок близок к пику.
+#
+# --memory 2000 — бюджет 2000 МБ: фоновый поток раз в POLL_SECONDS сверяет память шага с бюджетом
+# и при превышении только отмечает его; шаг прерывается с MemoryBudgetError в ближайшей точке
+# проверки (poll): на каждой строке входа (run_metrics count_in), в конце каждой спецификации,
+# в цикле ожидания параллельного парсера и в конце шага. В сообщении шаг, спецификация (для парсера),
+# сколько занято и где выделено. В конце шага и спецификации сверяется ещё и пик
+# (короткий всплеск между опросами тоже ловится). Прерывать основной поток асинхронно (как Ctrl+C)
+# нельзя: исключение может прийти уже после выхода из шага и мимо обработки.
+# Скрипт шага (и run_pipeline.py, batch_build.py) в этом случае печатает сообщение и завершается
+# с кодом 1 — сборочный агент видит отказ без трассировки Python.
+# С бюджетом сверяется и память Python-объектов (tracemalloc), и RSS процесса: память libxml2
+# (lxml под python-docx и openpyxl) tracemalloc не видит, её видно только в RSS.
+#
+# Бюджет — на процесс: при параллельном разборе (-j > 1) каждый дочерний процесс парсера следит
+# за своей памятью сам и при превышении сообщает, на какой спецификации это случилось.
+#
+# tracemalloc замедляет шаг в несколько раз (на чтении XLSX через openpyxl — до 5–8 раз) — включать
+# для разбора проблем и на сборочных агентах с ограниченной памятью, а не всегда.
+
+import functools
+import os
+import sys
+import threading
+import tracemalloc
+from contextlib import contextmanager
+
+# ===== НАСТРОЙКИ =====
+MEMORY_BUDGET_MB = None   # бюджет по умолчанию; None — без ограничения
+POLL_SECONDS = 0.05       # как часто фоновый поток сверяет память с бюджетом
+SNAPSHOT_GROWTH = 1.5     # новый снимок мест выделения — при росте памяти в 1.5 раза
+TOP_SITES = 10            # мест выделения в отчёте
+# =====================
+
+MB = 2 ** 20
+
+
+def rss_bytes():
+    """Текущий RSS процесса (Linux, /proc); None, если узнать нельзя."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def top_sites(snapshot, top=TOP_SITES) -> list:
+    snapshot = snapshot.filter_traces([tracemalloc.Filter(False, tracemalloc.__file__)])
+    return [
+        {"site": f"{s.traceback[0].filename}:{s.traceback[0].lineno}",
+         "mb": round(s.size / MB, 2), "blocks": s.count}
+        for s in snapshot.statistics("lineno")[:top]
+    ]
+
+
+class MemoryBudgetError(MemoryError):
+    def __init__(self, stage, spec, used, budget_mb, what="память Python", sites=()):
+        self.stage, self.spec, self.used, self.budget_mb = stage, spec, used, budget_mb
+        self.what, self.sites = what, list(sites)
+        where = f"шаг {stage}" + (f", спецификация {spec}" if spec else "")
+        lines = [f"Превышен бюджет памяти ({where}): {what} {used / MB:.0f} МБ при бюджете {budget_mb:g} МБ"]
+        if self.sites:
+            lines.append("Больше всего памяти выделено в:")
+            lines += [f"  {s['mb']:>8.1f} МБ  {s['site']}" for s in self.sites]
+        super().__init__("\n".join(lines))
+
+
+class MemoryTracker:
+    """
+    Пик памяти шага stage и контроль бюджета budget_mb (None — только замер).
+        with MemoryTracker("parse", 2000) as mem:
+            with mem.spec("КОР-01.00.000"):
+                ...
+    """
+
+    def __init__(self, stage, budget_mb=None, top=TOP_SITES):
+        self.stage = stage
+        self.budget_mb = budget_mb or None
+        self.top = top
+        self.peak = 0            # пик tracemalloc за шаг, байт
+        self.rss_peak = 0
+        self.specs = {}          # спецификация → {"peak_mb", "rss_mb"}
+        self.sites = []
+        self.current_spec = None
+        self._exceeded = None
+        self._armed = False      # бюджет проверяется только внутри шага / спецификации
+        self._snap_size = 0
+        self._started_tracing = False
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    # --- замер ---
+
+    def _sample(self):
+        current, peak = tracemalloc.get_traced_memory()
+        self.peak = max(self.peak, peak)
+        rss = rss_bytes()
+        if rss is not None:
+            self.rss_peak = max(self.rss_peak, rss)
+        return current, rss
+
+    def _over_budget(self, traced, rss):
+        """(что превышено, байт) или None."""
+        if self.budget_mb is None:
+            return None
+        limit = self.budget_mb * MB
+        if traced > limit:
+            return "память Python", traced
+        if rss is not None and rss > limit:
+            return "RSS процесса", rss
+        return None
+
+    def _snapshot_if_grown(self, current):
+        if current > self._snap_size * SNAPSHOT_GROWTH and current > MB:
+            self.sites = top_sites(tracemalloc.take_snapshot(), self.top)
+            self._snap_size = current
+
+    def _trip(self, over, armed_only=False) -> bool:
+        """
+        Фиксирует превышение; True — если оно первое (второй раз шаг не прерываем).
+        armed_only — только внутри шага / спецификации (фоновый поток: проверка и запись — под замком,
+        чтобы превышение не отнеслось к уже законченной спецификации).
+        """
+        with self._lock:
+            if self._exceeded is not None or (armed_only and not self._armed):
+                return False
+            self.sites = top_sites(tracemalloc.take_snapshot(), self.top)
+            self._exceeded = MemoryBudgetError(self.stage, self.current_spec, over[1], self.budget_mb,
+                                               over[0], self.sites)
+            return True
+
+    def _watch(self):
+        while not self._stop.wait(POLL_SECONDS):
+            current, rss = self._sample()
+            self._snapshot_if_grown(current)
+            over = self._over_budget(current, rss) if self._armed else None
+            if over is not None and self._trip(over, armed_only=True):
+                return  # дальше — poll() в основном потоке
+
+    def poll(self):
+        """MemoryBudgetError, если фоновый поток уже заметил превышение (дёшево: можно на каждой строке)."""
+        if self._exceeded is not None:
+            raise self._exceeded
+
+    def check(self):
+        """Сверка пика с бюджетом (после спецификации и в конце шага)."""
+        _, rss = self._sample()
+        _, peak = tracemalloc.get_traced_memory()
+        over = self._over_budget(peak, rss)
+        if over is not None:
+            self._trip(over)
+        self.poll()
+
+    @contextmanager
+    def spec(self, name):
+        """
+        Замер одной спецификации: в specs[name] пишется, на сколько память выросла на её разборе
+        (пик минус занятое до начала — без уже разобранных раньше файлов).
+        """
+        base, _ = self._sample()
+        tracemalloc.reset_peak()
+        with self._lock:
+            self.current_spec = name
+            armed, self._armed = self._armed, True
+        try:
+            yield
+            with self._lock:
+                self._armed = armed
+            self.check()  # и превышение, замеченное фоновым потоком на этой спецификации
+            _, peak = tracemalloc.get_traced_memory()
+            self.record_spec(name, peak - base, rss_bytes())
+        finally:
+            with self._lock:
+                self._armed = armed
+                self.current_spec = None
+            self._sample()
+
+    def record_spec(self, name, peak, rss=None):
+        self.specs[name] = {"peak_mb": round(peak / MB, 2),
+                            "rss_mb": round(rss / MB, 1) if rss is not None else None}
+
+    # --- контекст шага ---
+
+    def start(self):
+        """Трассировка и фоновый поток без проверки бюджета (дочерний процесс: проверка — в spec())."""
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+        tracemalloc.reset_peak()
+        self._thread = threading.Thread(target=self._watch, name=f"memory:{self.stage}", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+
+    def __enter__(self):
+        self.start()
+        self._armed = True
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            if exc_type is None:
+                self.check()
+                current, _ = self._sample()
+                self._snapshot_if_grown(current)
+        finally:
+            with self._lock:
+                self._armed = False
+            self.stop()
+        return False
+
+    def as_dict(self) -> dict:
+        return {
+            "peak_mb": round(self.peak / MB, 2),
+            "rss_peak_mb": round(self.rss_peak / MB, 1) if self.rss_peak else None,
+            "budget_mb": self.budget_mb,
+            "top_sites": self.sites,
+        }
+
+
+def tracker(stage, memory):
+    """memory: None — без замера; 0 — только замер; > 0 — бюджет в МБ."""
+    if memory is None:
+        return None
+    return MemoryTracker(stage, memory)
+
+
+def exit_on_budget(main):
+    """
+    Обёртка main() скрипта: превышение бюджета — сообщение MemoryBudgetError в stderr
+    и код возврата 1 (без трассировки; отчёт о шаге при этом не пишется).
+    """
+    @functools.wraps(main)
+    def run(*args, **kwargs):
+        try:
+            return main(*args, **kwargs)
+        except MemoryBudgetError as e:
+            sys.exit(str(e))
+    return run
+
+
+def add_argument(ap):
+    """--memory [МБ] для argparse скрипта шага."""
+    ap.add_argument("--memory", nargs="?", type=float, const=0, default=MEMORY_BUDGET_MB, metavar="MB",
+                    help="замерить пик памяти шага (tracemalloc); с числом — ещё и бюджет памяти в МБ")
+
@@ -0,0 +1,286 @@
+# name_dedup.py
+# Похожие Name (почти дубли) перед сжатием: одна и та же позиция, записанная по-разному в разных
+# спецификациях, иначе становится в ВП отдельными позициями:
+#   "Резистор  P1-12-0,125-10 кОм ±5%"  и  "Резистор Р1-12-0,125-10кОм±5%"  (латинская P и кириллическая Р)
+#
+# 1) Канонический ключ Name: NFKC, без регистра, латинские и кириллические буквы-двойники приведены
+#    к одному виду, кавычки и тире — к одному знаку, десятичная запятая — к точке, без пробелов.
+#    Name с одинаковым ключом — варианты одной позиции (похожесть 1.0).
+#    Числа берутся до удаления пробелов: "DB-9M 1 10" и "DB-9M 11 0" дают один ключ, но разные числа.
+# 2) Остальные пары — по похожести ключей (difflib, 0..1), но только с одинаковыми числами:
+#    "10 кОм" и "12 кОм" — разные позиции, как бы ни были похожи строки.
+#    Все пары не сравниваются: кандидаты ищутся по индексу 3-грамм внутри группы с теми же числами.
+#    Каждый ключ попадает только в блоки своих самых редких 3-грамм, столько, чтобы любые два ключа
+#    с долей общих 3-грамм не меньше BLOCK_JACCARD встретились хотя бы в одном блоке
+#    (prefix filtering). Время — почти линейное по числу разных Name.
+# 3) Похожие Name собираются в группы; имя группы — самое частое в BOM (при равенстве — первое).
+#
+# Предложения — в отчёт REPORT_JSON и в консоль; применяются они только по запросу:
+#   python name_dedup.py                                   # предложения по BOM_with_category.xlsx
+#   python name_dedup.py -i BOMs_parsed.xlsx --threshold 0.85
+#   python compress_by_name.py --merge-similar             # слить при похожести ≥ APPLY_THRESHOLD
+#   python run_pipeline.py --merge-similar 0.95
+# При слиянии строка варианта получает Name (и Category с признаками крепежа) строки-образца группы.
+# Автоматически (--merge-similar) сливаются только варианты с теми же артикулами — словами из латинских
+# букв и цифр: SN74HC04N и SN74HC04D (DIP и SOIC) различаются одной буквой, и похожесть длинной
+# строки с общим производителем всё равно около 0.97. Такие пары остаются только предложениями.
+
+import argparse
+import difflib
+import json
+import math
+import re
+import unicodedata
+from collections import Counter, defaultdict
+
+import bom_io
+from sort_bom_after_category import FASTENER_COLUMNS
+
+# ===== НАСТРОЙКИ =====
+INPUT_XLSX = "BOM_with_category.xlsx"
+SHEET_NAME = "BOM"
+REPORT_JSON = "name_merge_suggestions.json"
+
+SUGGEST_THRESHOLD = 0.9   # с какой похожести предлагать слияние
+APPLY_THRESHOLD = 0.98    # порог по умолчанию для --merge-similar (сливать без проверки человеком)
+COPY_HEADERS = ("Category",) + FASTENER_COLUMNS   # колонки, которые вариант берёт у образца вместе с Name
+NGRAM = 3
+BLOCK_JACCARD = 0.5       # кандидаты — пары с долей общих 3-грамм не меньше этой
+# =====================
+
+# кириллические буквы, похожие на латинские (после casefold), → латинские
+_HOMOGLYPHS = str.maketrans({
+    "а": "a", "в": "b", "е": "e", "ё": "e", "і": "i", "к": "k", "м": "m", "н": "h",
+    "о": "o", "р": "p", "с": "c", "т": "t", "у": "y", "х": "x", "ѕ": "s", "ј": "j",
+    # кавычки, тире, знак умножения
+    "«": '"', "»": '"', "„": '"', "“": '"', "”": '"', "‟": '"', "'": '"', "‘": '"', "’": '"', "‚": '"',
+    "`": '"', "‐": "-", "‑": "-", "‒": "-", "–": "-", "—": "-", "―": "-", "−": "-", "×": "x", "*": "x",
+})
+_SPACE_RE = re.compile(r"\s+")
+_DECIMAL_COMMA_RE = re.compile(r"(?<=\d),(?=\d)")
+_NUMBER_RE = re.compile(r"\d+(?:\.\d+)?")
+# слово артикула: латиница и цифры, внутри — дефис, точка, косая черта
+_PART_TOKEN_RE = re.compile(r"[0-9a-z]+(?:[-./][0-9a-z]+)*")
+_LETTER_RE = re.compile(r"[a-z]")
+_DIGIT_RE = re.compile(r"\d")
+
+
+def normalize(name) -> str:
+    """Name для сравнения: как ключ (см. заголовок), но пробелы схлопнуты до одного, а не удалены."""
+    s = unicodedata.normalize("NFKC", "" if name is None else str(name)).casefold()
+    s = s.translate(_HOMOGLYPHS)
+    s = _DECIMAL_COMMA_RE.sub(".", s)
+    return _SPACE_RE.sub(" ", s).strip()
+
+
+def canonical_key(name) -> str:
+    """Ключ для сравнения Name (см. заголовок); "" — пустое Name."""
+    return normalize(name).replace(" ", "")
+
+
+def numbers(text) -> tuple:
+    """Числа по порядку из normalize(Name) (с пробелами): у вариантов одной позиции они совпадают."""
+    return tuple(_NUMBER_RE.findall(text))
+
+
+def part_tokens(text) -> tuple:
+    """Артикулы из normalize(Name) — слова, где есть и латинская буква, и цифра (по алфавиту)."""
+    return tuple(sorted(t for t in _PART_TOKEN_RE.findall(text) if _LETTER_RE.search(t) and _DIGIT_RE.search(t)))
+
+
+def ngrams(key, n=NGRAM) -> set:
+    if len(key) <= n:
+        return {key}
+    return {key[i:i + n] for i in range(len(key) - n + 1)}
+
+
+def similarity(a, b, threshold=0.0) -> float:
+    """
+    Похожесть двух канонических ключей, 0..1 (difflib ratio).
+    threshold — если похожесть заведомо ниже (по оценке сверху quick_ratio), вернуть оценку сразу.
+    """
+    if a == b:
+        return 1.0
+    sm = difflib.SequenceMatcher(None, a, b, autojunk=False)
+    quick = sm.quick_ratio()
+    if quick < threshold:
+        return quick
+    return sm.ratio()
+
+
+def _candidate_pairs(keys, nums, block_jaccard=BLOCK_JACCARD):
+    """
+    Пары индексов keys с одинаковыми числами (nums[i] — числа ключа i) и общими редкими 3-граммами
+    (без повторов). Ключи сначала делятся по числам (ключ с неповторимыми числами пар не имеет), внутри
+    группы 3-граммы упорядочены по редкости, и у каждого ключа в индекс идут первые
+    len - ceil(block_jaccard * len) + 1 его 3-грамм: двум множествам с Jaccard ≥ block_jaccard
+    этого хватает, чтобы пересечься.
+    """
+    by_numbers = defaultdict(list)
+    for i, n in enumerate(nums):
+        by_numbers[n].append(i)
+
+    for members in by_numbers.values():
+        if len(members) < 2:
+            continue
+        grams = {i: ngrams(keys[i]) for i in members}
+        df = Counter(g for gs in grams.values() for g in gs)
+        rank = {g: r for r, g in enumerate(sorted(df, key=lambda g: (df[g], g)))}
+        blocks = defaultdict(list)
+        for i, gs in grams.items():
+            ordered = sorted(gs, key=rank.__getitem__)
+            prefix = len(ordered) - math.ceil(block_jaccard * len(ordered)) + 1
+            for g in ordered[:prefix]:
+                if df[g] > 1:   # 3-грамма только этого ключа пары не даст
+                    blocks[g].append(i)
+
+        seen = set()
+        for block in blocks.values():
+            for x in range(len(block)):
+                for y in range(x + 1, len(block)):
+                    pair = (block[x], block[y])
+                    if pair not in seen:
+                        seen.add(pair)
+                        yield pair
+
+
+class _Groups:
+    """Объединение множеств (union-find) по индексам ключей."""
+
+    def __init__(self, n):
+        self.parent = list(range(n))
+
+    def find(self, i):
+        while self.parent[i] != i:
+            self.parent[i] = self.parent[self.parent[i]]
+            i = self.parent[i]
+        return i
+
+    def union(self, i, j):
+        i, j = self.find(i), self.find(j)
+        if i != j:
+            self.parent[max(i, j)] = min(i, j)
+
+
+def find_similar(name_counts, threshold=SUGGEST_THRESHOLD, block_jaccard=BLOCK_JACCARD) -> list:
+    """
+    name_counts — {Name: число строк} (порядок — порядок появления в BOM).
+    Возвращает группы похожих Name:
+      [{"name": образец, "rows": строк у образца,
+        "variants": [{"name": вариант, "rows": строк, "similarity": похожесть на образец,
+                      "same_part": те же артикулы, что у образца (или тот же ключ)}, ...]}]
+    Группы — по убыванию числа строк всех вариантов.
+    """
+    by_key = {}   # (ключ, числа) → [Name, ...] в порядке появления
+    for name in name_counts:
+        text = normalize(name)
+        if text:
+            by_key.setdefault((text.replace(" ", ""), numbers(text)), []).append(name)
+    keys = [key for key, _ in by_key]
+
+    groups = _Groups(len(keys))
+    for i, j in _candidate_pairs(keys, [n for _, n in by_key], block_jaccard):
+        a, b = keys[i], keys[j]
+        if 2 * min(len(a), len(b)) / (len(a) + len(b)) < threshold:  # верхняя граница ratio
+            continue
+        if similarity(a, b, threshold) >= threshold:
+            groups.union(i, j)
+
+    members = defaultdict(list)
+    for i, entry in enumerate(by_key):
+        members[groups.find(i)].extend((name, keys[i]) for name in by_key[entry])
+
+    out = []
+    for items in members.values():
+        if len(items) < 2:
+            continue
+        # образец — самое частое Name; max() при равенстве оставляет первое
+        rep, rep_key = max(items, key=lambda nk: name_counts[nk[0]])
+        rep_parts = part_tokens(normalize(rep))
+        out.append({
+            "name": rep,
+            "rows": name_counts[rep],
+            "variants": [
+                {"name": name, "rows": name_counts[name], "similarity": round(similarity(rep_key, key), 4),
+                 "same_part": key == rep_key or part_tokens(normalize(name)) == rep_parts}
+                for name, key in items if name != rep
+            ],
+        })
+    out.sort(key=lambda g: -(g["rows"] + sum(v["rows"] for v in g["variants"])))
+    return out
+
+
+def merge_map(groups, threshold=APPLY_THRESHOLD) -> dict:
+    """{вариант: образец} для вариантов с похожестью на образец ≥ threshold и теми же артикулами."""
+    return {v["name"]: g["name"] for g in groups for v in g["variants"]
+            if v["similarity"] >= threshold and v["same_part"]}
+
+
+def name_counts(headers, rows, name_header="Name") -> Counter:
+    ni = headers.index(name_header)
+    return Counter(row[ni] for row in rows if row[ni] is not None and str(row[ni]).strip())
+
+
+def merge_rows(headers, rows, threshold=APPLY_THRESHOLD, name_header="Name", copy_headers=COPY_HEADERS):
+    """
+    Сливает похожие Name в rows (строки в порядке headers): у вариантов Name и колонки copy_headers
+    (Category, признаки крепежа) заменяются на значения строки-образца. Возвращает (новые строки, {вариант: образец}).
+    """
+    rows = [list(r) for r in rows]
+    mapping = merge_map(find_similar(name_counts(headers, rows, name_header), threshold), threshold)
+    if not mapping:
+        return rows, mapping
+    ni = headers.index(name_header)
+    copy_i = [headers.index(h) for h in copy_headers if h in headers]
+    copied = {}
+    if copy_i:
+        targets = set(mapping.values())
+        for row in rows:
+            if row[ni] in targets:
+                copied.setdefault(row[ni], [row[i] for i in copy_i])
+    for row in rows:
+        rep = mapping.get(row[ni])
+        if rep is not None:
+            row[ni] = rep
+            if rep in copied:
+                for i, v in zip(copy_i, copied[rep]):
+                    row[i] = v
+    return rows, mapping
+
+
+def format_groups(groups, limit=None) -> str:
+    lines = []
+    for g in groups[:limit]:
+        lines.append(f"{g['rows']:>5}  {g['name']}")
+        for v in g["variants"]:
+            mark = "" if v["same_part"] else "  [другой артикул — только вручную]"
+            lines.append(f"{v['rows']:>5}  {v['similarity']:.3f}  {v['name']}{mark}")
+        lines.append("")
+    return "\n".join(lines)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Поиск похожих Name (почти дублей) в BOM")
+    ap.add_argument("-i", "--input", default=INPUT_XLSX, help=f"BOM (по умолчанию {INPUT_XLSX})")
+    ap.add_argument("--threshold", type=float, default=SUGGEST_THRESHOLD, help="с какой похожести предлагать, 0..1")
+    ap.add_argument("-o", "--output", default=REPORT_JSON, help="отчёт с предложениями (JSON)")
+    ap.add_argument("--top", type=int, default=50, help="сколько групп показать в консоли")
+    args = ap.parse_args()
+
+    in_path = bom_io.stage_path(args.input)
+    _, headers, rows = bom_io.read_sheet(in_path, SHEET_NAME)
+    headers = ["" if h is None else str(h).strip() for h in headers]
+    counts = name_counts(headers, rows)
+    groups = find_similar(counts, args.threshold)
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump({"input": str(in_path), "threshold": args.threshold, "names": len(counts), "groups": groups},
+                  f, ensure_ascii=False, indent=2)
+    print(format_groups(groups, args.top))
+    variants = sum(len(g["variants"]) for g in groups)
+    print(f"Разных Name: {len(counts)}, групп похожих: {len(groups)}, вариантов к слиянию: {variants}")
+    print(f"OK: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+# parallel_names.py
+# Обработка уникальных Name в нескольких процессах — для шагов, где на каждое имя только работа
+# процессора: классификация (add_category.py) и split_name (split_name_to_supplydoc.py).
+# На сводном BOM всех изделий (сотни тысяч строк) иначе они занимают одно ядро.
+#
+# - Берутся уникальные Name в порядке появления: каждое имя считается один раз.
+# - Они делятся на куски по CHUNK_SIZE, куски раздаются WORKERS процессам (multiprocessing.Pool).
+# - Результаты собираются в {Name: значение}, и строки заполняются по нему в исходном порядке,
+#   поэтому выход не зависит ни от числа процессов, ни от размера куска.
+# - Если уникальных имён меньше MIN_PARALLEL_NAMES, всё считается в этом же процессе: запуск
+#   процессов (и индекса правил в каждом) дороже самой работы.
+#
+# Запуск:
+#   python add_category.py --name-workers 0                       # по числу ядер
+#   python split_name_to_supplydoc.py --name-workers 4 --chunk-size 5000
+#   python run_pipeline.py -j 0 --name-workers 0
+
+import multiprocessing
+import os
+
+# ===== НАСТРОЙКИ =====
+WORKERS = 1                 # процессов: 1 = в этом же процессе (как раньше), 0 = по числу ядер
+CHUNK_SIZE = 2000           # Name в одном куске (меньше — ровнее загрузка, больше — меньше пересылок)
+MIN_PARALLEL_NAMES = 5000   # меньше уникальных Name — без процессов
+# =====================
+
+
+def resolve_workers(workers) -> int:
+    """Число процессов: 0 — по числу ядер."""
+    if workers == 0:
+        return os.cpu_count() or 1
+    return max(1, workers)
+
+
+def map_names(fn, names, workers=WORKERS, chunk_size=CHUNK_SIZE) -> dict:
+    """
+    {Name: fn(Name)} по уникальным names (в порядке первого появления).
+    fn — функция уровня модуля: в процессы она передаётся по имени. Процессы запускаются
+    обычным для платформы способом (на Linux — fork: уже построенные в этом процессе индексы
+    и скомпилированные regex достаются им готовыми).
+    """
+    unique = list(dict.fromkeys(names))
+    chunk_size = max(1, chunk_size)
+    # процессов больше, чем кусков, не нужно
+    workers = min(resolve_workers(workers), -(-len(unique) // chunk_size))
+    if workers <= 1 or len(unique) < MIN_PARALLEL_NAMES:
+        return {name: fn(name) for name in unique}
+    with multiprocessing.get_context().Pool(workers) as pool:
+        return dict(zip(unique, pool.map(fn, unique, chunksize=chunk_size)))
+
+
+def add_argument(ap):
+    """--name-workers и --chunk-size для argparse скрипта шага."""
+    ap.add_argument("--name-workers", type=int, default=WORKERS, metavar="N",
+                    help="процессов для разбора уникальных Name (1 = в этом процессе, 0 = по числу ядер)")
+    ap.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, metavar="NAMES",
+                    help=f"Name в одном куске для процессов (по умолчанию {CHUNK_SIZE})")
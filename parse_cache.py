@@ -0,0 +1,150 @@
+# parse_cache.py
+# Кэш результатов parse_spec на диске.
+#
+# Ключ записи = sha256 содержимого DOCX + версия парсера (PARSER_VERSION в parse_specs_to_bom_many.py),
+# поэтому переименование файла кэш не сбрасывает, а правка спецификации или логики парсера — сбрасывает.
+# Значение — строки parse_spec (уже отсортированные, как их отдаёт parse_block) без колонки Module (она подставляется при чтении) в pickle+zlib.
+# При превышении MAX_CACHE_MB удаляются записи, к которым дольше всего не обращались.
+#
+# Команды:
+#   python parse_cache.py stats   — сколько записей и места занимает кэш
+#   python parse_cache.py purge   — очистить кэш
+
+import argparse
+import hashlib
+import os
+import pickle
+import time
+import zlib
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent
+
+# ===== НАСТРОЙКИ =====
+CACHE_DIR = BASE_DIR / ".bom_cache" / "parsed"
+MAX_CACHE_MB = 256
+# =====================
+
+SUFFIX = ".rows"
+_CHUNK = 1 << 20
+
+
+def file_digest(path) -> str:
+    """sha256 содержимого файла."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(_CHUNK)
+            if not chunk:
+                break
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _entry_path(digest: str, version, cache_dir=CACHE_DIR) -> Path:
+    key = hashlib.sha256(f"{version}:{digest}".encode("utf-8")).hexdigest()
+    return Path(cache_dir) / key[:2] / (key + SUFFIX)
+
+
+def load(digest: str, version, module_code, cache_dir=CACHE_DIR):
+    """Строки из кэша (с подставленным module_code) или None, если записи нет."""
+    p = _entry_path(digest, version, cache_dir)
+    try:
+        blob = p.read_bytes()
+    except FileNotFoundError:
+        return None
+    try:
+        tail_rows = pickle.loads(zlib.decompress(blob))
+    except Exception:
+        # битая запись (например, оборванная запись на диск) — считаем промахом
+        p.unlink(missing_ok=True)
+        return None
+    # отметка последнего обращения — по ней идёт вытеснение
+    os.utime(p, None)
+    return [[module_code, *r] for r in tail_rows]
+
+
+def store(digest: str, version, rows, cache_dir=CACHE_DIR):
+    """Сохраняет строки parse_spec (колонка Module не хранится)."""
+    p = _entry_path(digest, version, cache_dir)
+    p.parent.mkdir(parents=True, exist_ok=True)
+    blob = zlib.compress(pickle.dumps([r[1:] for r in rows], protocol=pickle.HIGHEST_PROTOCOL), 1)
+    tmp = p.with_name(f"{p.name}.{os.getpid()}.tmp")
+    tmp.write_bytes(blob)
+    os.replace(tmp, p)  # атомарно: параллельные запуски не увидят половину записи
+
+
+def _entries(cache_dir=CACHE_DIR):
+    root = Path(cache_dir)
+    if not root.exists():
+        return []
+    out = []
+    for p in root.glob(f"*/*{SUFFIX}"):
+        try:
+            st = p.stat()
+        except FileNotFoundError:
+            continue
+        out.append((p, st.st_size, st.st_mtime))
+    return out
+
+
+def evict(max_mb=MAX_CACHE_MB, cache_dir=CACHE_DIR) -> int:
+    """Удаляет самые давно использованные записи, пока кэш больше max_mb. Возвращает число удалённых."""
+    entries = _entries(cache_dir)
+    limit = int(max_mb * 1024 * 1024)
+    total = sum(size for _, size, _ in entries)
+    removed = 0
+    for p, size, _ in sorted(entries, key=lambda e: e[2]):
+        if total <= limit:
+            break
+        p.unlink(missing_ok=True)
+        total -= size
+        removed += 1
+    return removed
+
+
+def stats(cache_dir=CACHE_DIR) -> dict:
+    entries = _entries(cache_dir)
+    mtimes = [m for _, _, m in entries]
+    return {
+        "dir": str(cache_dir),
+        "entries": len(entries),
+        "bytes": sum(size for _, size, _ in entries),
+        "limit_bytes": int(MAX_CACHE_MB * 1024 * 1024),
+        "oldest_use": min(mtimes) if mtimes else None,
+        "newest_use": max(mtimes) if mtimes else None,
+    }
+
+
+def purge(cache_dir=CACHE_DIR) -> int:
+    n = 0
+    for p, _, _ in _entries(cache_dir):
+        p.unlink(missing_ok=True)
+        n += 1
+    return n
+
+
+def _fmt_time(t):
+    return "-" if t is None else time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(t))
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Кэш разобранных спецификаций")
+    ap.add_argument("command", choices=("stats", "purge"))
+    ap.add_argument("--dir", default=str(CACHE_DIR), help="каталог кэша")
+    args = ap.parse_args()
+
+    if args.command == "purge":
+        n = purge(args.dir)
+        print(f"Удалено записей: {n}")
+        return
+
+    st = stats(args.dir)
+    print(f"Каталог:   {st['dir']}")
+    print(f"Записей:   {st['entries']}")
+    print(f"Размер:    {st['bytes'] / 1024 / 1024:.2f} МБ (лимит {MAX_CACHE_MB} МБ)")
+    print(f"Обращения: {_fmt_time(st['oldest_use'])} … {_fmt_time(st['newest_use'])}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,10 @@
 # parse_spec_to_bom.py
 
-from docx import Document
+import argparse
 import re
 from openpyxl import Workbook
 from openpyxl.utils import get_column_letter
+from docx_tables import ENGINES, iter_table_rows
 
 
 # ==========================
@@ -13,6 +14,7 @@ from openpyxl.utils import get_column_letter
 INPUT_DOCX = "КОР_03_11_000_Кросс_модуль_4FTR_Спецификация.docx"          # входной Word
 OUTPUT_XLSX = "BOM.xlsx"          # выходной Excel
 MODULE_CODE = "КОР-03.11.000"     # код модуля
+PARSER_ENGINE = "docx"            # "docx" (python-docx) или "lxml" (потоковый)
 
 
 # ==========================
@@ -39,8 +41,7 @@ def extract_manufacturer(text: str) -> str:
 # ОСНОВНОЙ ПАРСЕР
 # ==========================
 
-def parse_spec(input_path, module_code):
-    doc = Document(input_path)
+def parse_spec(input_path, module_code, engine=PARSER_ENGINE):
 
     rows = []
 
@@ -95,93 +96,91 @@ def parse_spec(input_path, module_code):
     # ПРОХОД ПО ТАБЛИЦАМ
     # ==========================
 
-    for table in doc.tables:
+    for raw_cells in iter_table_rows(input_path, engine):
 
-        for row in table.rows:
+        cells = [clean(t) for t in raw_cells]
 
-            cells = [clean(c.text) for c in row.cells]
+        if not any(cells):
+            continue
 
-            if not any(cells):
-                continue
+        row_text = " ".join(cells)
 
-            row_text = " ".join(cells)
 
+        # --------------------------
+        # Определение разделов
+        # --------------------------
 
-            # --------------------------
-            # Определение разделов
-            # --------------------------
+        if "Стандартные изделия" in row_text:
+            flush()
+            current_section = "Стандартные"
+            continue
 
-            if "Стандартные изделия" in row_text:
-                flush()
-                current_section = "Стандартные"
-                continue
+        if "Прочие изделия" in row_text:
+            flush()
+            current_section = "Прочие"
+            continue
 
-            if "Прочие изделия" in row_text:
-                flush()
-                current_section = "Прочие"
-                continue
+        if any(x in row_text for x in ["Документация", "Детали"]):
+            flush()
+            current_section = None
+            continue
 
-            if any(x in row_text for x in ["Документация", "Детали"]):
-                flush()
-                current_section = None
-                continue
 
+        # --------------------------
+        # Пропуск заголовков
+        # --------------------------
 
-            # --------------------------
-            # Пропуск заголовков
-            # --------------------------
+        if "Формат" in row_text and "Поз." in row_text:
+            continue
 
-            if "Формат" in row_text and "Поз." in row_text:
-                continue
 
+        if current_section not in ("Стандартные", "Прочие"):
+            continue
 
-            if current_section not in ("Стандартные", "Прочие"):
-                continue
 
+        # --------------------------
+        # Нормализация колонок
+        # --------------------------
+        # Ожидаемый формат:
+        # Формат | Зона | Поз | Обозн | Наим | Кол | Прим
 
-            # --------------------------
-            # Нормализация колонок
-            # --------------------------
-            # Ожидаемый формат:
-            # Формат | Зона | Поз | Обозн | Наим | Кол | Прим
+        while len(cells) < 7:
+            cells.append("")
 
-            while len(cells) < 7:
-                cells.append("")
+        fmt, zone, pos_c, desig_c, name_c, qty_c, comm_c = cells[:7]
 
-            fmt, zone, pos_c, desig_c, name_c, qty_c, comm_c = cells[:7]
 
+        # --------------------------
+        # Новая позиция?
+        # --------------------------
 
-            # --------------------------
-            # Новая позиция?
-            # --------------------------
+        is_new = (
+            re.fullmatch(r"\d{1,3}", pos_c)
+            and
+            re.fullmatch(r"\d{1,4}", qty_c)
+        )
 
-            is_new = (
-                re.fullmatch(r"\d{1,3}", pos_c)
-                and
-                re.fullmatch(r"\d{1,4}", qty_c)
-            )
 
+        if is_new:
+            flush()
+            buf_pos = pos_c
+            buf_qty = qty_c
 
-            if is_new:
-                flush()
-                buf_pos = pos_c
-                buf_qty = qty_c
 
+        # --------------------------
+        # Накопление колонок
+        # --------------------------
 
-            # --------------------------
-            # Накопление колонок
-            # --------------------------
+        if buf_pos is not None:
 
-            if buf_pos is not None:
+            if desig_c:
+                buf_designation.append(desig_c)
 
-                if desig_c:
-                    buf_designation.append(desig_c)
+            if name_c:
+                buf_name.append(name_c)
 
-                if name_c:
-                    buf_name.append(name_c)
-
-                if comm_c:
-                    buf_comment.append(comm_c)
+            if comm_c:
+                buf_comment.append(comm_c)
 
 
     # Последняя позиция
@@ -232,7 +231,12 @@ def save_xlsx(rows, path):
 
 if __name__ == "__main__":
 
-    data = parse_spec(INPUT_DOCX, MODULE_CODE)
+    ap = argparse.ArgumentParser(description="Парсинг одной спецификации DOCX в BOM")
+    ap.add_argument("--engine", choices=ENGINES, default=PARSER_ENGINE,
+                    help="движок чтения DOCX: docx (python-docx) или lxml (потоковый)")
+    args = ap.parse_args()
+
+    data = parse_spec(INPUT_DOCX, MODULE_CODE, args.engine)
 
     data.sort(key=lambda x: (0 if x[1]=="Стандартные" else 1, x[2]))
 
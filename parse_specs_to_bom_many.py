@@ -6,11 +6,27 @@
 # - При встрече секции "Материалы" парсинг файла прекращается (строки материалов не нужны для ВП)
 # - В выходной файл добавлен столбец PosText (номер позиции или прочерк)
 # - После каждого файла добавляется пустая строка (как было)
+# - Параллельный режим (-j N): файлы разбираются в N процессах, крупные — первыми,
+#   с лимитом времени на файл; результат собирается в порядке SPECS (идентичен последовательному)
 
-from docx import Document
+import argparse
+import os
+from contextlib import closing, nullcontext
 import re
+import time
+import multiprocessing
+from collections import deque
+from multiprocessing.connection import wait
 from openpyxl import Workbook
 from openpyxl.utils import get_column_letter
+from docx_tables import ENGINES, iter_table_rows
+import bom_columnar
+import bom_db
+import bom_io
+import memory_budget
+import parse_cache
+import profiling
+import run_metrics
 from specs_list import SPECS
 from pathlib import Path
 BASE_DIR = Path(__file__).resolve().parent
@@ -23,6 +39,19 @@ SPECS_DIR = BASE_DIR / "specs"
 
 OUTPUT_XLSX = "BOMs_parsed.xlsx"  # один общий выходной Excel
 
+# Параллельный парсинг: 1 = последовательно (как раньше), 0 = по числу ядер
+WORKERS = 1
+# Лимит времени на один DOCX в параллельном режиме, сек (None = без лимита)
+FILE_TIMEOUT = 300
+
+# Движок чтения DOCX: "docx" (python-docx) или "lxml" (потоковый, только word/document.xml)
+PARSER_ENGINE = "docx"
+
+# Кэш разобранных файлов (см. parse_cache.py). PARSER_VERSION увеличивать при любой
+# правке логики parse_spec/parse_block — иначе из кэша придут строки старого парсера.
+USE_PARSE_CACHE = True
+PARSER_VERSION = 1
+
 
 
 # ==========================
@@ -71,9 +100,7 @@ def pos_sort_key(pos_text: str) -> tuple[int, str]:
 # ОСНОВНОЙ ПАРСЕР
 # ==========================
 
-def parse_spec(input_path, module_code):
-    doc = Document(input_path)
-
+def parse_spec(input_path, module_code, engine=PARSER_ENGINE):
     rows = []
     current_section = None
 
@@ -119,144 +146,411 @@ def parse_spec(input_path, module_code):
         buf_comment = []
         buf_designation = []
 
-    stop_parsing = False
+    for raw_cells in iter_table_rows(input_path, engine):
+        cells = [clean(t) for t in raw_cells]
+        if not any(cells):
+            continue
+
+        row_text = " ".join(cells)
 
-    for table in doc.tables:
-        if stop_parsing:
+        # --------------------------
+        # Остановка на секции "Материалы"
+        # --------------------------
+        # Как только встретили "Материалы" (обычно после Прочих изделий) — прекращаем парсинг файла.
+        if "Материалы" in row_text:
+            flush()
             break
 
-        for row in table.rows:
-            cells = [clean(c.text) for c in row.cells]
-            if not any(cells):
-                continue
+        # --------------------------
+        # Определение разделов
+        # --------------------------
+        if "Стандартные изделия" in row_text:
+            flush()
+            current_section = "Стандартные"
+            continue
+
+        if "Прочие изделия" in row_text:
+            flush()
+            current_section = "Прочие"
+            continue
+
+        if any(x in row_text for x in ["Документация", "Детали"]):
+            flush()
+            current_section = None
+            continue
+
+        # --------------------------
+        # Пропуск заголовков
+        # --------------------------
+        if "Формат" in row_text and "Поз." in row_text:
+            continue
+
+        if current_section not in ("Стандартные", "Прочие"):
+            continue
+
+        # --------------------------
+        # Нормализация колонок
+        # --------------------------
+        # Ожидаемый формат:
+        # Формат | Зона | Поз | Обозн | Наим | Кол | Прим
+        while len(cells) < 7:
+            cells.append("")
+        fmt, zone, pos_c, desig_c, name_c, qty_c, comm_c = cells[:7]
+
+        # --------------------------
+        # Новая позиция?
+        # --------------------------
+        # 1) Обычная позиция: Pos числовой И qty в этой же строке (как было)
+        is_new_numeric = is_pos_numeric(pos_c) and is_qty_numeric(qty_c)
+
+        # 2) Позиция-прочерк: Pos = '-'/'–'/'—' И qty в этой же строке
+        #    (чтобы прочерки не склеивались друг с другом, считаем КАЖДУЮ такую строку началом новой позиции)
+        is_new_dash = is_pos_dash(pos_c) and is_qty_numeric(qty_c) and bool(name_c)
+
+        if is_new_numeric or is_new_dash:
+            flush()
+            buf_pos_text = pos_c
+            buf_qty = qty_c
+
+        # --------------------------
+        # Накопление колонок
+        # --------------------------
+        if buf_pos_text is not None:
+            if desig_c:
+                buf_designation.append(desig_c)
+            if name_c:
+                buf_name.append(name_c)
+            if comm_c:
+                buf_comment.append(comm_c)
 
-            row_text = " ".join(cells)
-
-            # --------------------------
-            # Остановка на секции "Материалы"
-            # --------------------------
-            # Как только встретили "Материалы" (обычно после Прочих изделий) — прекращаем парсинг файла.
-            if "Материалы" in row_text:
-                flush()
-                stop_parsing = True
-                break
-
-            # --------------------------
-            # Определение разделов
-            # --------------------------
-            if "Стандартные изделия" in row_text:
-                flush()
-                current_section = "Стандартные"
-                continue
+    flush()
+    return rows
 
-            if "Прочие изделия" in row_text:
-                flush()
-                current_section = "Прочие"
-                continue
 
-            if any(x in row_text for x in ["Документация", "Детали"]):
-                flush()
-                current_section = None
-                continue
+# ==========================
+# ПАРСИНГ НАБОРА СПЕЦИФИКАЦИЙ
+# ==========================
 
-            # --------------------------
-            # Пропуск заголовков
-            # --------------------------
-            if "Формат" in row_text and "Поз." in row_text:
+def parse_block(input_path, module_code, engine=PARSER_ENGINE):
+    """Парсинг одного файла + сортировка блока (как в выходном файле)."""
+    data = parse_spec(str(input_path), module_code, engine)
+    # сортировка блока: Section (Стандартные/Прочие) + PosText (числа, потом прочерки)
+    data.sort(key=lambda x: (0 if x[1] == "Стандартные" else 1, pos_sort_key(x[2])))
+    return data
+
+
+def _worker_loop(conn):
+    """
+    Рабочий процесс: получает (idx, path, module_code, engine, memory), возвращает (idx, rows, error, mem).
+    memory — None или бюджет памяти (0 — только замер, memory_budget.py); mem — замер файла
+    или {"budget_error": ...}, если бюджет превышен.
+    """
+    tracker = None
+    while True:
+        job = conn.recv()
+        if job is None:
+            break
+        idx, input_path, module_code, engine, memory = job
+        if memory is not None and tracker is None:
+            tracker = memory_budget.MemoryTracker("parse", memory).start()
+        try:
+            if tracker is None:
+                conn.send((idx, parse_block(input_path, module_code, engine), None, None))
+            else:
+                with tracker.spec(module_code):
+                    rows = parse_block(input_path, module_code, engine)
+                conn.send((idx, rows, None, tracker.specs[module_code]))
+        except memory_budget.MemoryBudgetError as e:
+            conn.send((idx, None, str(e), {"budget_error": (e.spec, e.used, e.budget_mb, e.what, e.sites)}))
+        except Exception as e:
+            conn.send((idx, None, f"{type(e).__name__}: {e}", None))
+    if tracker is not None:
+        tracker.stop()
+    conn.close()
+
+
+class _Worker:
+    """Процесс-обработчик со своим каналом. Держим сами, чтобы зависший можно было убить."""
+
+    def __init__(self, ctx):
+        self.conn, child_conn = ctx.Pipe()
+        self.proc = ctx.Process(target=_worker_loop, args=(child_conn,), daemon=True)
+        self.proc.start()
+        child_conn.close()
+        self.job = None      # индекс файла в работе
+        self.started = 0.0
+
+    def submit(self, idx, input_path, module_code, engine, memory=None):
+        self.job = idx
+        self.started = time.monotonic()
+        self.conn.send((idx, str(input_path), module_code, engine, memory))
+
+    def stop(self):
+        try:
+            self.conn.send(None)
+        except (BrokenPipeError, OSError):
+            pass
+        self.proc.join(timeout=1)
+        self.kill()
+
+    def kill(self):
+        if self.proc.is_alive():
+            self.proc.terminate()
+            self.proc.join()
+        self.conn.close()
+
+
+def _parse_parallel(jobs, workers, timeout, seconds=None, memory=None):
+    """
+    jobs: [(input_path, module_code, engine), ...]
+    Возвращает (results, errors): results[i] — строки i-го файла, errors — {i: текст ошибки}.
+    seconds — если передан (список длины jobs), в него пишется время разбора каждого файла.
+    memory — memory_budget.MemoryTracker шага: рабочие процессы меряют (и ограничивают) свою память
+    по каждому файлу; превышение бюджета — сразу MemoryBudgetError, без ожидания остальных файлов.
+    Крупные файлы отправляем первыми, чтобы они не досчитывались в хвосте.
+    """
+    mem_opt = None if memory is None else (memory.budget_mb or 0)
+    ctx = multiprocessing.get_context()
+    results = [None] * len(jobs)
+    errors = {}
+
+    order = sorted(
+        range(len(jobs)),
+        key=lambda i: os.path.getsize(jobs[i][0]) if os.path.exists(jobs[i][0]) else 0,
+        reverse=True,
+    )
+    pending = deque(order)
+
+    pool = [_Worker(ctx) for _ in range(min(workers, len(jobs)))]
+    try:
+        while pending or any(w.job is not None for w in pool):
+            for w in pool:
+                if w.job is None and pending:
+                    i = pending.popleft()
+                    w.submit(i, *jobs[i], memory=mem_opt)
+
+            busy = [w for w in pool if w.job is not None]
+            wait_for = None
+            if timeout is not None:
+                now = time.monotonic()
+                wait_for = max(0.0, min(w.started + timeout - now for w in busy))
+            if memory is not None:
+                # бюджет памяти самого процесса-распределителя: просыпаемся, чтобы проверить
+                memory.poll()
+                wait_for = memory_budget.POLL_SECONDS if wait_for is None else min(wait_for, memory_budget.POLL_SECONDS)
+            ready = wait([w.conn for w in busy], timeout=wait_for)
+
+            for k, w in enumerate(pool):
+                if w.job is None:
+                    continue
+                if w.conn in ready:
+                    try:
+                        idx, rows, err, spec_mem = w.conn.recv()
+                    except EOFError:
+                        # процесс упал целиком (например, нехватка памяти)
+                        errors[w.job] = f"рабочий процесс завершился (код {w.proc.exitcode})"
+                        w.kill()
+                        pool[k] = _Worker(ctx)
+                        continue
+                    if seconds is not None:
+                        seconds[idx] = time.monotonic() - w.started
+                    if spec_mem and "budget_error" in spec_mem:
+                        # спецификация и бюджет — как их видел дочерний процесс
+                        spec, used, budget_mb, what, sites = spec_mem["budget_error"]
+                        raise memory_budget.MemoryBudgetError("parse", spec or jobs[idx][1], used, budget_mb,
+                                                              what, sites)
+                    if spec_mem is not None:
+                        memory.specs[jobs[idx][1]] = spec_mem
+                    if err is None:
+                        results[idx] = rows
+                    else:
+                        errors[idx] = err
+                    w.job = None
+                elif timeout is not None and time.monotonic() - w.started > timeout:
+                    errors[w.job] = f"превышен лимит {timeout} с"
+                    w.kill()
+                    pool[k] = _Worker(ctx)
+    finally:
+        for w in pool:
+            w.stop()
+
+    return results, errors
+
+
+def parse_specs(specs, workers=WORKERS, timeout=FILE_TIMEOUT, engine=PARSER_ENGINE,
+                use_cache=USE_PARSE_CACHE, info=None, memory=None):
+    """
+    Парсит все спецификации из specs. Возвращает список блоков строк в порядке specs,
+    поэтому результат не зависит от числа процессов.
+    Неизменившиеся файлы (по sha256 содержимого) берутся из кэша parse_cache.
+    info (dict) — если передан, заполняется счётчиками: parsed, cache_hits
+    и specs — по каждому файлу {file, module, rows, seconds, cached}.
+    memory — memory_budget.MemoryTracker шага: пик памяти по каждому файлу (в specs — peak_mb, rss_mb)
+    и бюджет памяти.
+    """
+    jobs = [(SPECS_DIR / input_docx, module_code, engine) for input_docx, module_code in specs]
+    results = [None] * len(jobs)
+    seconds = [0.0] * len(jobs)
+    digests = {}
+    todo = list(range(len(jobs)))
+
+    if use_cache:
+        todo = []
+        for i, (input_path, module_code, _) in enumerate(jobs):
+            if not input_path.exists():
+                todo.append(i)  # пусть ошибку покажет парсер, как обычно
                 continue
+            t0 = time.perf_counter()
+            digests[i] = parse_cache.file_digest(input_path)
+            cached = parse_cache.load(digests[i], PARSER_VERSION, module_code)
+            seconds[i] = time.perf_counter() - t0
+            if cached is None:
+                todo.append(i)
+            else:
+                results[i] = cached
+
+    if workers == 0:
+        workers = os.cpu_count() or 1
+
+    if workers <= 1 or len(todo) <= 1:
+        for i in todo:
+            t0 = time.perf_counter()
+            with memory.spec(jobs[i][1]) if memory is not None else nullcontext():
+                results[i] = parse_block(*jobs[i])
+            seconds[i] += time.perf_counter() - t0
+    else:
+        todo_seconds = [0.0] * len(todo)
+        parsed, errors = _parse_parallel([jobs[i] for i in todo], workers, timeout, todo_seconds, memory)
+        if errors:
+            lines = [f"  {specs[todo[k]][0]}: {errors[k]}" for k in sorted(errors)]
+            raise RuntimeError("Не удалось разобрать спецификации:\n" + "\n".join(lines))
+        for k, i in enumerate(todo):
+            results[i] = parsed[k]
+            seconds[i] += todo_seconds[k]
+
+    if use_cache and todo:
+        for i in todo:
+            if i in digests:
+                parse_cache.store(digests[i], PARSER_VERSION, results[i])
+        parse_cache.evict()
+
+    if info is not None:
+        info["parsed"] = len(todo)
+        info["cache_hits"] = len(jobs) - len(todo)
+        parsed_now = set(todo)
+        info["specs"] = [
+            {"file": str(specs[i][0]), "module": specs[i][1], "rows": len(results[i]),
+             "seconds": round(seconds[i], 4), "cached": i not in parsed_now,
+             **(memory.specs.get(specs[i][1], {}) if memory is not None else {})}
+            for i in range(len(jobs))
+        ]
+    return results
 
-            if current_section not in ("Стандартные", "Прочие"):
-                continue
 
-            # --------------------------
-            # Нормализация колонок
-            # --------------------------
-            # Ожидаемый формат:
-            # Формат | Зона | Поз | Обозн | Наим | Кол | Прим
-            while len(cells) < 7:
-                cells.append("")
-            fmt, zone, pos_c, desig_c, name_c, qty_c, comm_c = cells[:7]
-
-            # --------------------------
-            # Новая позиция?
-            # --------------------------
-            # 1) Обычная позиция: Pos числовой И qty в этой же строке (как было)
-            is_new_numeric = is_pos_numeric(pos_c) and is_qty_numeric(qty_c)
-
-            # 2) Позиция-прочерк: Pos = '-'/'–'/'—' И qty в этой же строке
-            #    (чтобы прочерки не склеивались друг с другом, считаем КАЖДУЮ такую строку началом новой позиции)
-            is_new_dash = is_pos_dash(pos_c) and is_qty_numeric(qty_c) and bool(name_c)
-
-            if is_new_numeric or is_new_dash:
-                flush()
-                buf_pos_text = pos_c
-                buf_qty = qty_c
-
-            # --------------------------
-            # Накопление колонок
-            # --------------------------
-            if buf_pos_text is not None:
-                if desig_c:
-                    buf_designation.append(desig_c)
-                if name_c:
-                    buf_name.append(name_c)
-                if comm_c:
-                    buf_comment.append(comm_c)
+# ==========================
+# ВЫГРУЗКА В EXCEL (один файл)
+# ==========================
+
+BOM_HEADERS = [
+    "Module",
+    "Section",
+    "PosText",   # <-- новый столбец
+    "Name",
+    "Manufacturer",
+    "PartNumber",
+    "Qty",
+    "Comment"
+]
 
-    flush()
+# Ширины колонок
+BOM_WIDTHS = [16, 14, 8, 60, 28, 28, 6, 60]
+
+
+def bom_rows(blocks):
+    """Блоки строк по файлам → строки общего BOM (без заголовка)."""
+    rows = []
+    for data in blocks:
+        rows.extend(data)
+        # Пустая строка после каждого файла
+        rows.append([""] * len(BOM_HEADERS))
     return rows
 
 
-# ==========================
-# ВЫГРУЗКА В EXCEL (один файл)
-# ==========================
+def save_bom_xlsx(rows, path):
+    if bom_columnar.is_columnar(path):
+        bom_io.write_sheet(path, "BOM", BOM_HEADERS, rows, widths=dict(zip(BOM_HEADERS, BOM_WIDTHS)))
+        return
 
-def save_xlsx_many(specs, path):
     wb = Workbook()
     ws = wb.active
     ws.title = "BOM"
 
     # Заголовок
-    ws.append([
-        "Module",
-        "Section",
-        "PosText",   # <-- новый столбец
-        "Name",
-        "Manufacturer",
-        "PartNumber",
-        "Qty",
-        "Comment"
-    ])
-
-    total_rows = 0
-
-    for i, (input_docx, module_code) in enumerate(specs, start=1):
-        #data = parse_spec(input_docx, module_code)
-        input_path = SPECS_DIR / input_docx
-        data = parse_spec(str(input_path), module_code)
-        # сортировка блока: Section (Стандартные/Прочие) + PosText (числа, потом прочерки)
-        data.sort(key=lambda x: (0 if x[1] == "Стандартные" else 1, pos_sort_key(x[2])))
-
-        for r in data:
-            ws.append(r)
-            total_rows += 1
+    ws.append(BOM_HEADERS)
 
-        # Пустая строка после каждого файла
-        ws.append([""] * 8)
+    for r in rows:
+        ws.append(r)
 
-    # Ширины колонок
-    widths = [16, 14, 8, 60, 28, 28, 6, 60]
-    for i, w in enumerate(widths, 1):
+    for i, w in enumerate(BOM_WIDTHS, 1):
         ws.column_dimensions[get_column_letter(i)].width = w
 
     wb.save(path)
-    return total_rows
+
+
+def save_bom_db(rows, db_path):
+    """Строки общего BOM → таблица parsed в SQLite (bom_db.py)."""
+    with closing(bom_db.connect(db_path)) as conn:
+        bom_db.write_stage(conn, "parsed", BOM_HEADERS, rows)
+
+
+def save_xlsx_many(specs, path, workers=WORKERS, timeout=FILE_TIMEOUT, engine=PARSER_ENGINE,
+                   use_cache=USE_PARSE_CACHE, info=None, db_path=None, memory=None):
+    """db_path — писать в таблицу parsed этой базы вместо файла path."""
+    blocks = parse_specs(specs, workers=workers, timeout=timeout, engine=engine,
+                         use_cache=use_cache, info=info, memory=memory)
+    if db_path:
+        save_bom_db(bom_rows(blocks), db_path)
+    else:
+        save_bom_xlsx(bom_rows(blocks), path)
+    return sum(len(data) for data in blocks)
 
 
 # ==========================
 # ТОЧКА ВХОДА
 # ==========================
 
+@memory_budget.exit_on_budget
+def main():
+    ap = argparse.ArgumentParser(description="Парсинг спецификаций из specs_list.SPECS в общий BOM")
+    ap.add_argument("-o", "--output", default=str(bom_io.stage_path(OUTPUT_XLSX)),
+                    help="выходной файл (.xlsx или .bomc)")
+    ap.add_argument("-j", "--workers", type=int, default=WORKERS,
+                    help="число процессов парсинга (1 = последовательно, 0 = по числу ядер)")
+    ap.add_argument("--timeout", type=float, default=FILE_TIMEOUT,
+                    help="лимит времени на один DOCX в параллельном режиме, сек (0 = без лимита)")
+    ap.add_argument("--engine", choices=ENGINES, default=PARSER_ENGINE,
+                    help="движок чтения DOCX: docx (python-docx) или lxml (потоковый)")
+    ap.add_argument("--no-cache", action="store_true",
+                    help="не использовать кэш разобранных файлов (parse_cache.py)")
+    ap.add_argument("--db", nargs="?", const=bom_db.DB_PATH, metavar="SQLITE",
+                    help=f"писать в таблицу parsed базы SQLite вместо файла (по умолчанию {bom_db.DB_PATH})")
+    profiling.add_argument(ap)
+    memory_budget.add_argument(ap)
+    args = ap.parse_args()
+
+    if args.profile and args.workers != 1:
+        print("Профиль: файлы разбираются в дочерних процессах и в профиль не попадут (для профиля разбора -j 1)")
+    info = {}
+    with run_metrics.stage("parse", outputs=[args.db or args.output], profile_dir=args.profile,
+                           memory=args.memory) as m:
+        n = save_xlsx_many(SPECS, args.output, workers=args.workers, timeout=args.timeout or None,
+                           engine=args.engine, use_cache=not args.no_cache, info=info, db_path=args.db,
+                           memory=m.memory)
+        m.rows_out = n
+        m.extra.update(files=len(SPECS), cache_hits=info["cache_hits"], specs=info["specs"])
+    target = f"{args.db}:parsed" if args.db else args.output
+    print(f"Готово: {len(SPECS)} файлов ({info['cache_hits']} из кэша), {n} строк BOM → {target}")
+
+
 if __name__ == "__main__":
-    n = save_xlsx_many(SPECS, OUTPUT_XLSX)
-    print(f"Готово: {len(SPECS)} файлов, {n} строк BOM → {OUTPUT_XLSX}")
+    main()
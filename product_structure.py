@@ -0,0 +1,140 @@
+# product_structure.py
+# Структура изделия: какие модули (сборочные единицы) входят в какие и сколько раз.
+#
+# Задаётся в specs_list.py рядом с SPECS:
+#   STRUCTURE = {
+#       "КОР-01.00.000": [("КОР-01.10.000", 1), ("КОР-02.20.000", 4)],
+#       "КОР-02.20.000": [("КОР-02.50.000", 2)],
+#   }
+# т.е. модуль-родитель → [(входящий модуль, сколько штук на один родитель)].
+# Модуль, который ни в кого не входит (в т.ч. любой модуль SPECS, которого нет в STRUCTURE), —
+# верхний уровень, он считается один раз. Узел может быть и без своей спецификации в SPECS
+# (например, шкаф, который только собирает модули) — количество через него передаётся дальше.
+#
+# Количество модуля на изделие = сумма по всем его родителям (количество родителя × кратность).
+# Считается с запоминанием: каждый узел — один раз, каждое ребро — один раз, сколько бы путей
+# к нему ни вело (общий модуль в десяти сборках не пересчитывается десять раз).
+# Цикл (модуль прямо или через другие входит сам в себя) — StructureError с путём цикла.
+#
+# В ВП (format_vedomost_pokupnyh.py): "на изделие" — как в спецификации модуля (на одну сборку),
+# "Всего" — на изделие × количество модуля; итог позиции — сумма "Всего".
+#
+# Запуск:
+#   python product_structure.py            # дерево изделия с количествами и проверка на циклы
+
+import argparse
+from collections import defaultdict
+
+import specs_list
+
+
+class StructureError(ValueError):
+    pass
+
+
+def load_structure() -> dict:
+    """STRUCTURE из specs_list.py ({} — структура не задана)."""
+    return getattr(specs_list, "STRUCTURE", {}) or {}
+
+
+def parent_edges(structure) -> dict:
+    """{модуль: [(родитель, кратность), ...]} с проверкой кратностей."""
+    parents = defaultdict(list)
+    for parent, children in structure.items():
+        for child, k in children:
+            if not isinstance(k, int) or isinstance(k, bool) or k < 1:
+                raise StructureError(f"Кратность {child} в {parent} должна быть целым числом ≥ 1, а не {k!r}")
+            parents[child].append((parent, k))
+    return parents
+
+
+def _cycle_message(chain, parent) -> str:
+    # chain — узлы от parent вверх по родителям до текущего; parent — родитель последнего из них
+    path = [parent] + chain[:0:-1] + [parent]
+    return "Цикл в структуре изделия: " + " → ".join(path)
+
+
+def multiplicities(structure, modules=()) -> dict:
+    """
+    {модуль: количество на изделие} для всех узлов structure и модулей modules (обычно module_code из SPECS).
+    Обход вверх по родителям с запоминанием, без рекурсии: O(узлов + рёбер).
+    """
+    parents = parent_edges(structure)
+    nodes = list(dict.fromkeys([*modules, *structure, *parents]))
+    total = {}
+
+    for start in nodes:
+        if start in total:
+            continue
+        # кадр: [узел, итератор по родителям, накопленная сумма, кратность ребра к ребёнку]
+        stack = [[start, iter(parents.get(start, ())), 0, 1]]
+        on_path = {start: 0}
+        while stack:
+            frame = stack[-1]
+            for parent, k in frame[1]:
+                if parent in total:
+                    frame[2] += total[parent] * k
+                    continue
+                if parent in on_path:
+                    chain = [f[0] for f in stack[on_path[parent]:]]
+                    raise StructureError(_cycle_message(chain, parent))
+                on_path[parent] = len(stack)
+                stack.append([parent, iter(parents.get(parent, ())), 0, k])
+                break
+            else:
+                node, _, acc, k = stack.pop()
+                del on_path[node]
+                total[node] = acc if node in parents else 1
+                if stack:
+                    stack[-1][2] += total[node] * k
+    return total
+
+
+def load_multiplicities(specs=None, structure=None) -> dict:
+    """
+    Количества по STRUCTURE из specs_list.py (или по structure — например, из манифеста изделия
+    batch_build.py); {} — если структура не задана (всё по одному).
+    """
+    structure = load_structure() if structure is None else structure
+    if not structure:
+        return {}
+    modules = [m for _, m in (specs_list.SPECS if specs is None else specs)]
+    return multiplicities(structure, modules)
+
+
+def format_tree(structure, modules=()) -> str:
+    """Дерево изделия (общие узлы раскрываются один раз, дальше — ссылкой)."""
+    total = multiplicities(structure, modules)
+    parents = parent_edges(structure)
+    roots = [m for m in total if m not in parents]
+    lines, shown = [], set()
+
+    def walk(node, k, depth):
+        mark = " (см. выше)" if node in shown and structure.get(node) else ""
+        lines.append(f"{'  ' * depth}{node} ×{k}  всего {total[node]}{mark}")
+        if mark:
+            return
+        shown.add(node)
+        for child, kc in structure.get(node, ()):
+            walk(child, kc, depth + 1)
+
+    for root in roots:
+        walk(root, 1, 0)
+    return "\n".join(lines)
+
+
+def main():
+    argparse.ArgumentParser(description="Структура изделия из specs_list.STRUCTURE").parse_args()
+    structure = load_structure()
+    modules = [m for _, m in specs_list.SPECS]
+    if not structure:
+        print("STRUCTURE в specs_list.py не задана: каждый модуль из SPECS считается один раз")
+        return
+    print(format_tree(structure, modules))
+    missing = sorted((set(structure) | set(parent_edges(structure))) - set(modules))
+    if missing:
+        print(f"Нет в SPECS (своих покупных нет или спецификация не подключена): {', '.join(missing)}")
+
+
+if __name__ == "__main__":
+    main()
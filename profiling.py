@@ -0,0 +1,138 @@
+# profiling.py
+# Профилирование шагов конвейера: --profile у каждого скрипта шага и у run_pipeline.py.
+#
+# По каждому шагу в каталог профилей (по умолчанию profiles/) пишутся:
+#   <шаг>.pstats     — статистика cProfile (python -m pstats, snakeviz, gprof2dot);
+#   <шаг>.collapsed  — стеки в свёрнутом виде "f1;f2;f3 мкс" для flamegraph.pl, speedscope,
+#                      inferno и т.п.
+# cProfile не хранит стеки целиком, только рёбра "вызывающий → вызываемый". Стеки восстанавливаются
+# обходом от корней: время функции на пути делится между её вызывающими пропорционально их доле
+# (как во flameprof). Для функций, которые зовут из разных мест, это оценка, а не точный замер.
+#
+# Без --profile шаг не трогается совсем (nullcontext) — накладных расходов нет.
+# Парсер с -j > 1 разбирает файлы в дочерних процессах, их профиль сюда не попадает —
+# для профиля разбора запускать с -j 1.
+#
+# Запуск:
+#   python sort_bom_after_category.py --profile           # → profiles/sort.pstats, profiles/sort.collapsed
+#   python run_pipeline.py --profile prof                 # все шаги → prof/<шаг>.*
+#   python profiling.py profiles/sort.pstats              # самые тяжёлые функции
+#   flamegraph.pl profiles/sort.collapsed > sort.svg
+
+import argparse
+import cProfile
+import os
+import pstats
+from collections import defaultdict
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+
+# ===== НАСТРОЙКИ =====
+PROFILE_DIR = "profiles"
+MIN_STACK_US = 1   # стеки короче (мкс) в .collapsed не пишутся
+TOP = 25           # строк в сводке python profiling.py
+# =====================
+
+
+def _label(func) -> str:
+    filename, line, name = func
+    if filename == "~":  # встроенные функции: ('~', 0, "<built-in method ...>")
+        label = name
+    else:
+        label = f"{name} ({os.path.basename(filename)}:{line})"
+    return label.replace(";", ",")
+
+
+def collapsed_stacks(stats, min_us=MIN_STACK_US, root=None) -> dict:
+    """
+    pstats.Stats → {"корень;...;функция": собственное время на этом пути, мкс}.
+    root — общий корень всех стеков (имя шага): функции, вызванные до включения профиля,
+    иначе оказываются отдельными корнями.
+    Рекурсия (функция уже есть в стеке) обрывается — её время остаётся у внешнего вызова.
+    """
+    table = stats.stats  # func → (cc, nc, tt, ct, callers{caller: (cc, nc, tt, ct)})
+    children = defaultdict(dict)
+    for func, (_, _, _, _, callers) in table.items():
+        for caller, edge in callers.items():
+            children[caller][func] = edge[3]
+
+    out = defaultdict(float)
+
+    def walk(func, path, on_stack, share):
+        # share — доля всего времени func, пришедшаяся на этот путь
+        _, _, tt, ct, _ = table[func]
+        path = f"{path};{_label(func)}" if path else _label(func)
+        out[path] += tt * share * 1e6
+        for child, edge_ct in children[func].items():
+            if child in on_stack or child not in table:
+                continue
+            child_ct = table[child][3]
+            if child_ct <= 0:
+                continue
+            child_share = min(1.0, share * edge_ct / child_ct)
+            if child_ct * child_share * 1e6 < min_us:
+                continue
+            on_stack.add(child)
+            walk(child, path, on_stack, child_share)
+            on_stack.discard(child)
+
+    for func, (_, _, _, _, callers) in table.items():
+        if not callers:
+            walk(func, root or "", {func}, 1.0)
+    return {k: v for k, v in out.items() if v >= min_us}
+
+
+def write_collapsed(stats, path, min_us=MIN_STACK_US, root=None) -> int:
+    """Пишет .collapsed. Возвращает число стеков."""
+    stacks = collapsed_stacks(stats, min_us, root)
+    with open(path, "w", encoding="utf-8") as f:
+        for stack, us in sorted(stacks.items()):
+            f.write(f"{stack} {round(us)}\n")
+    return len(stacks)
+
+
+@contextmanager
+def _profile(name, out_dir):
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    prof = cProfile.Profile()
+    prof.enable()
+    try:
+        yield prof
+    finally:
+        prof.disable()
+        prof.dump_stats(out_dir / f"{name}.pstats")
+        write_collapsed(pstats.Stats(prof), out_dir / f"{name}.collapsed", root=name)
+
+
+def profile(name, out_dir=None):
+    """Контекст профилирования шага name; out_dir=None — профилирование выключено."""
+    if not out_dir:
+        return nullcontext()
+    return _profile(name, out_dir)
+
+
+def add_argument(ap):
+    """--profile [DIR] для argparse скрипта шага."""
+    ap.add_argument("--profile", nargs="?", const=PROFILE_DIR, metavar="DIR",
+                    help=f"профилировать шаг: .pstats и .collapsed (flamegraph) в DIR (по умолчанию {PROFILE_DIR})")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Сводка по профилю шага (.pstats)")
+    ap.add_argument("pstats", help="файл .pstats")
+    ap.add_argument("--sort", default="cumulative", help="порядок: cumulative, tottime, ncalls ...")
+    ap.add_argument("--top", type=int, default=TOP, help="сколько функций показать")
+    ap.add_argument("--collapsed", metavar="FILE", help="заново построить свёрнутые стеки в FILE")
+    ap.add_argument("--min-us", type=float, default=MIN_STACK_US, help="порог времени стека для --collapsed, мкс")
+    args = ap.parse_args()
+
+    stats = pstats.Stats(args.pstats)
+    stats.sort_stats(args.sort).print_stats(args.top)
+    if args.collapsed:
+        n = write_collapsed(stats, args.collapsed, args.min_us, root=Path(args.pstats).stem)
+        print(f"OK: {args.collapsed} ({n} стеков)")
+
+
+if __name__ == "__main__":
+    main()
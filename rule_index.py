@@ -0,0 +1,251 @@
+# rule_index.py
+# Быстрый классификатор по упорядоченному списку правил (категория, regex) — "первое совпадение выигрывает".
+#
+# Идея: почти каждое правило можно сузить до набора обязательных подстрок ("якорей"):
+# любое совпадение regex обязательно содержит хотя бы один из них. Например,
+#   \b(винт|болт|закл[её]пк)\b  →  {"винт", "болт", "заклепк", "заклёпк"}.
+# Якоря достаются из разобранного дерева regex (re._parser / sre_parse), без ручной разметки правил.
+#
+# Классификация строки:
+#   1) строка приводится к "свёрнутому" регистру так же, как якоря;
+#   2) один regex в виде префиксного дерева всех якорей (якоря после \b — с \b) находит за проход,
+#      какие якоря есть в строке, — это и есть правила-кандидаты;
+#   3) regex запускаются только у этих правил, по возрастанию приоритета, до первого совпадения.
+# Правила без якорей (если такие найдутся) проверяются всегда. Результат тот же, что у
+# последовательного перебора: отсев лишь убирает правила, которые заведомо не могут совпасть.
+# Время на строку зависит от длины строки и числа правил-кандидатов, а не от общего числа правил.
+
+import re
+
+try:
+    from re import _parser as sre_parse  # Python 3.11+
+except ImportError:  # pragma: no cover
+    import sre_parse
+
+LITERAL = sre_parse.LITERAL
+IN = sre_parse.IN
+AT = sre_parse.AT
+AT_BOUNDARY = sre_parse.AT_BOUNDARY
+BRANCH = sre_parse.BRANCH
+SUBPATTERN = sre_parse.SUBPATTERN
+MAX_REPEAT = sre_parse.MAX_REPEAT
+MIN_REPEAT = sre_parse.MIN_REPEAT
+_REPEATS = {MAX_REPEAT, MIN_REPEAT}
+if hasattr(sre_parse, "POSSESSIVE_REPEAT"):
+    _REPEATS.add(sre_parse.POSSESSIVE_REPEAT)
+ATOMIC_GROUP = getattr(sre_parse, "ATOMIC_GROUP", None)
+
+# Сколько вариантов строк допускаем при раскрытии классов вида [её] внутри литерала
+MAX_VARIANTS = 32
+
+# Все символы BMP одной строкой — для поиска символов, равных данному без учёта регистра
+_BMP = "".join(map(chr, range(0x10000)))
+
+
+# ==========================
+# ЯКОРЯ ИЗ ДЕРЕВА REGEX
+# ==========================
+# Якорь — пара (строка, с_начала_слова). Второй флаг ставится, когда перед строкой в regex стоит \b,
+# а сама строка начинается с буквы/цифры: тогда в тексте она обязана стоять в начале слова.
+
+_WORD_CHAR = re.compile(r"\w")
+
+
+def _best(factors):
+    """Самый избирательный из обязательных наборов: длиннее самый короткий якорь, меньше вариантов."""
+    if not factors:
+        return None
+    return max(factors, key=lambda f: (min(len(s) for s, _ in f), -len(f)))
+
+
+def _in_literals(av):
+    """Символы класса [..], если он состоит только из отдельных литералов (иначе None)."""
+    chars = []
+    for op, v in av:
+        if op != LITERAL:
+            return None
+        chars.append(chr(v))
+    return chars
+
+
+def _required(items, initial=False):
+    """
+    Набор якорей, один из которых обязательно входит в любое совпадение последовательности items,
+    или None, если такой набор вывести не удаётся. initial — перед items стоит \b.
+    """
+    factors = []
+    run = [""]
+    run_initial = False
+    at_boundary = initial
+
+    def flush():
+        nonlocal run
+        if run[0]:
+            factors.append(frozenset(
+                (s, run_initial and _WORD_CHAR.match(s) is not None) for s in run
+            ))
+        run = [""]
+
+    for op, av in items:
+        if op == LITERAL or op == IN:
+            chars = [chr(av)] if op == LITERAL else _in_literals(av)
+            if chars and len(run) * len(chars) <= MAX_VARIANTS:
+                if not run[0]:
+                    run_initial = at_boundary
+                run = [s + c for s in run for c in chars]
+                at_boundary = False
+                continue
+            flush()
+            at_boundary = False
+            continue
+
+        flush()
+        child = None
+        if op == AT:
+            at_boundary = av == AT_BOUNDARY
+            continue
+        if op == BRANCH:
+            alts = [_required(list(a), at_boundary) for a in av[1]]
+            if all(alts):
+                child = frozenset().union(*alts)
+        elif op == SUBPATTERN:
+            child = _required(list(av[-1]), at_boundary)
+        elif op in _REPEATS:
+            if av[0] >= 1:
+                child = _required(list(av[2]), at_boundary)
+        elif op == ATOMIC_GROUP:
+            child = _required(list(av), at_boundary)
+        # ANY, NOT_LITERAL, CATEGORY, проверки вперёд/назад — якорей не дают
+        if child:
+            factors.append(child)
+        at_boundary = False
+
+    flush()
+    return _best(factors)
+
+
+def required_literals(rx):
+    """Обязательные якоря скомпилированного regex: frozenset пар (строка, с_начала_слова) или None."""
+    return _required(list(sre_parse.parse(rx.pattern, rx.flags)))
+
+
+# ==========================
+# ИНДЕКС ПРАВИЛ
+# ==========================
+
+def _trie_pattern(strings):
+    """Regex-альтернатива строк в виде префиксного дерева: a(?:bc|d)|x(?:y)? — без перебора всех строк."""
+    trie = {}
+    for w in strings:
+        node = trie
+        for ch in w:
+            node = node.setdefault(ch, {})
+        node[""] = {}
+
+    def emit(node):
+        end = "" in node
+        alts = [re.escape(ch) + emit(child) for ch, child in sorted(node.items()) if ch]
+        if not alts:
+            return ""
+        body = alts[0] if len(alts) == 1 else "(?:" + "|".join(alts) + ")"
+        if end:
+            body = (body if len(alts) > 1 else "(?:" + body + ")") + "?"
+        return body
+
+    return emit(trie)
+
+
+class RuleIndex:
+    """
+    Упорядоченные правила [(категория, скомпилированный regex), ...] + категория по умолчанию.
+    classify(s) даёт тот же результат, что перебор правил по порядку с rx.search(s).
+    """
+
+    def __init__(self, rules, default):
+        self.rules = list(rules)
+        self.default = default
+        self.anchors = [required_literals(rx) for _, rx in self.rules]
+
+        self._fold, self._exotic = self._fold_table(a for a in self.anchors if a)
+
+        self._always = []   # правила без якорей
+        rules_of = {}       # якорь (свёрнутый) → номера правил
+        initial, inner = set(), set()
+        for idx, anchor_set in enumerate(self.anchors):
+            if not anchor_set:
+                self._always.append(idx)
+                continue
+            for a, at_word_start in anchor_set:
+                a = a.translate(self._fold)
+                rules_of.setdefault(a, set()).add(idx)
+                (initial if at_word_start else inner).add(a)
+        self._rules_of = {a: frozenset(v) for a, v in rules_of.items()}
+
+        # Один проход regex по строке находит якоря. Найденные совпадения не перекрываются,
+        # поэтому якорь, начинающийся внутри найденного, может быть пропущен — такие
+        # "соседи" для каждого якоря заготовлены заранее и проверяются прямым поиском.
+        alts = []
+        if initial:
+            alts.append(r"\b" + _trie_pattern(initial))
+        if inner:
+            alts.append(_trie_pattern(inner))
+        self._scan = re.compile("|".join(alts)) if alts else None
+        self._overlaps = {a: self._overlapping(a, rules_of) for a in rules_of}
+
+    @staticmethod
+    def _overlapping(a, anchors):
+        """Якоря, которые могут начинаться внутри вхождения a (кроме самого a)."""
+        out = []
+        for b in anchors:
+            for k in range(len(a)):
+                tail = a[k:]
+                if (tail.startswith(b) or b.startswith(tail)) and not (k == 0 and b == a):
+                    out.append(b)
+                    break
+        return tuple(out)
+
+    @staticmethod
+    def _fold_table(anchor_sets):
+        """
+        Свёртка регистра для символов якорей. Классы "равных без учёта регистра" берутся у самого re
+        (включая его особые пары вроде "s"/"ſ" и "в"/"ᲀ"), представитель класса — строчная буква.
+        Возвращает (таблица str.translate, regex символов, для которых str.lower() даёт не представителя):
+        строка без таких символов сворачивается просто через lower().
+        """
+        chars = {c for anchor_set in anchor_sets for s, _ in anchor_set for c in s}
+        table = {}
+        for c in sorted(chars):
+            if ord(c) in table:
+                continue
+            rep = c.lower() if len(c.lower()) == 1 else c
+            for x in re.findall(re.escape(c), _BMP, re.I) or [c]:
+                table[ord(x)] = rep
+        exotic = sorted(chr(o) for o, rep in table.items() if chr(o).lower() != rep)
+        exotic_rx = re.compile("[" + "".join(map(re.escape, exotic)) + "]") if exotic else None
+        return table, exotic_rx
+
+    def _folded(self, s):
+        if self._exotic is not None and self._exotic.search(s):
+            return s.translate(self._fold)
+        return s.lower()
+
+    def candidates(self, s):
+        """Номера правил, которые могут совпасть со строкой s (по возрастанию)."""
+        found = set(self._always)
+        if self._scan is not None:
+            text = self._folded(s)
+            rules_of = self._rules_of
+            for a in set(self._scan.findall(text)):
+                found |= rules_of[a]
+                for b in self._overlaps[a]:
+                    if not rules_of[b] <= found and b in text:
+                        found |= rules_of[b]
+        return sorted(found)
+
+    def classify(self, s):
+        s = s or ""
+        for idx in self.candidates(s):
+            cat, rx = self.rules[idx]
+            if rx.search(s):
+                return cat
+        return self.default
@@ -0,0 +1,138 @@
+# rule_stats.py
+# Замеры правил классификации (RULES в add_category.py): сколько раз правило пробовали,
+# сколько раз оно решило категорию, сколько времени на него ушло, на каких Name медленнее всего.
+#
+# Классификация при замерах идёт тем же порядком, что и обычно (первое совпадение выигрывает),
+# но каждый rx.search засекается отдельно. Без справочника категорий: замеряется каждая строка.
+# С движком "index" пробуются только правила-кандидаты, время отбора кандидатов считается отдельно.
+#
+# Запуск:
+#   python add_category.py --rule-stats                  # отчёт в rule_stats.json + таблица в консоль
+#   python add_category.py --rule-stats out.json --engine sequential
+
+import heapq
+import json
+from time import perf_counter_ns
+
+# ===== НАСТРОЙКИ =====
+REPORT_JSON = "rule_stats.json"
+TOP_NAMES = 20   # сколько самых медленных Name показывать
+# =====================
+
+
+class RuleStats:
+    """
+    Классификатор с замерами. index — RuleIndex по тем же правилам (движок "index"),
+    None — перебор всех правил по порядку (движок "sequential").
+    """
+
+    def __init__(self, rules, default, index=None, top_names=TOP_NAMES):
+        self.rules = list(rules)
+        self.default = default
+        self.index = index
+        self.top_names = top_names
+
+        n = len(self.rules)
+        self.tried = [0] * n
+        self.matched = [0] * n
+        self.total_ns = [0] * n
+        self.max_ns = [0] * n
+        self.max_name = [None] * n
+
+        self.names = 0
+        self.defaulted = 0
+        self.prefilter_ns = 0
+        self.name_ns = {}   # Name → худшее полное время классификации
+
+    def classify(self, name):
+        s = name or ""
+        t_start = perf_counter_ns()
+
+        if self.index is not None:
+            order = self.index.candidates(s)
+            self.prefilter_ns += perf_counter_ns() - t_start
+        else:
+            order = range(len(self.rules))
+
+        cat = self.default
+        for idx in order:
+            rx = self.rules[idx][1]
+            t0 = perf_counter_ns()
+            m = rx.search(s)
+            dt = perf_counter_ns() - t0
+
+            self.tried[idx] += 1
+            self.total_ns[idx] += dt
+            if dt > self.max_ns[idx]:
+                self.max_ns[idx] = dt
+                self.max_name[idx] = s
+            if m:
+                self.matched[idx] += 1
+                cat = self.rules[idx][0]
+                break
+        else:
+            self.defaulted += 1
+
+        total = perf_counter_ns() - t_start
+        self.names += 1
+        if total > self.name_ns.get(s, (0,))[0]:
+            self.name_ns[s] = (total, cat)
+        return cat
+
+    def report(self) -> dict:
+        rules = []
+        for i, (cat, rx) in enumerate(self.rules):
+            tried = self.tried[i]
+            rules.append({
+                "rule": i + 1,
+                "category": cat,
+                "pattern_len": len(rx.pattern),
+                "tried": tried,
+                "matched": self.matched[i],
+                "match_rate": round(self.matched[i] / tried, 4) if tried else 0.0,
+                "total_ms": round(self.total_ns[i] / 1e6, 3),
+                "avg_us": round(self.total_ns[i] / tried / 1e3, 2) if tried else 0.0,
+                "max_us": round(self.max_ns[i] / 1e3, 2),
+                "max_name": self.max_name[i],
+            })
+        slowest = heapq.nlargest(self.top_names, self.name_ns.items(), key=lambda kv: kv[1][0])
+        return {
+            "engine": "index" if self.index is not None else "sequential",
+            "names": self.names,
+            "unique_names": len(self.name_ns),
+            "defaulted": self.defaulted,
+            "default_category": self.default,
+            "regex_ms": round(sum(self.total_ns) / 1e6, 3),
+            "prefilter_ms": round(self.prefilter_ns / 1e6, 3),
+            "rules": rules,
+            "slowest_names": [
+                {"name": name, "us": round(ns / 1e3, 2), "category": cat}
+                for name, (ns, cat) in slowest
+            ],
+        }
+
+
+def save_json(report, path=REPORT_JSON):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+def format_table(report) -> str:
+    """Консольная таблица по отчёту report()."""
+    lines = [
+        f"Движок: {report['engine']}, строк: {report['names']} (уникальных Name: {report['unique_names']}), "
+        f"без категории: {report['defaulted']}",
+        f"Время regex: {report['regex_ms']:.1f} мс, отбор кандидатов: {report['prefilter_ms']:.1f} мс",
+        "",
+        f"{'№':>3}  {'Категория':<40} {'пробовали':>9} {'решило':>7} {'%':>6} {'всего мс':>9} {'ср. мкс':>8} {'макс мкс':>9}",
+    ]
+    for r in report["rules"]:
+        lines.append(
+            f"{r['rule']:>3}  {r['category'][:40]:<40} {r['tried']:>9} {r['matched']:>7} "
+            f"{100 * r['match_rate']:>6.1f} {r['total_ms']:>9.2f} {r['avg_us']:>8.1f} {r['max_us']:>9.1f}"
+        )
+    if report["slowest_names"]:
+        lines += ["", "Самые медленные Name (мкс):"]
+        for item in report["slowest_names"]:
+            lines.append(f"  {item['us']:>9.1f}  {item['name'][:80]}  → {item['category']}")
+    return "\n".join(lines)
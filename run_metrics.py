@@ -0,0 +1,202 @@
+# run_metrics.py
+# Отчёт о прогоне конвейера: по каждому шагу — время (общее и CPU), строки на входе и выходе,
+# строк в секунду, размеры входных и выходных файлов; для парсера — ещё время и число строк
+# по каждой спецификации.
+#
+# Отчёт — JSON-файл RUN_REPORT (run_report.json рядом с выходными файлами):
+#   {"updated": ..., "stages": {"parse": {...}, "category": {...}, ...}}
+# Отдельные скрипты дописывают в него свой шаг (запись шага с тем же именем заменяется), поэтому
+# после прогона шагов 1–7 по очереди в файле все семь. run_pipeline.py пишет отчёт целиком заново
+# (шаги + "total"). Так по ночным прогонам видно, какой шаг стал медленнее.
+#
+# В скрипте:
+#   with run_metrics.stage("category", inputs=[in_path], outputs=[out_path]) as m:
+#       rows = m.count_in(rows)          # считать строки на входе по мере чтения
+#       m.rows_out = write_sheet(...)
+#   python run_metrics.py                 # показать последний отчёт таблицей
+
+import argparse
+import json
+import os
+import time
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+
+import memory_budget
+import profiling
+
+# ===== НАСТРОЙКИ =====
+RUN_REPORT = "run_report.json"   # None — не писать отчёт
+# =====================
+
+
+def file_size(path):
+    try:
+        return os.path.getsize(path)
+    except (OSError, TypeError):
+        return None
+
+
+class StageMetrics:
+    """Замеры одного шага. rows_in / rows_out заполняет сам шаг; extra — любые свои поля."""
+
+    def __init__(self, name, inputs=(), outputs=()):
+        self.name = name
+        self.inputs = [str(p) for p in inputs]
+        self.outputs = [str(p) for p in outputs]
+        self.rows_in = None
+        self.rows_out = None
+        self.extra = {}
+        self.memory = None   # memory_budget.MemoryTracker, если шаг идёт с --memory
+        self.started = time.strftime("%Y-%m-%d %H:%M:%S")
+        self._t0 = time.perf_counter()
+        self._cpu0 = time.process_time()
+        self.seconds = None
+        self.cpu_seconds = None
+
+    def count_in(self, rows):
+        """Итератор по rows, который по ходу считает rows_in (с --memory — и сверяет бюджет памяти)."""
+        self.rows_in = 0
+        poll = self.memory.poll if self.memory is not None else None
+        for row in rows:
+            self.rows_in += 1
+            if poll is not None:
+                poll()
+            yield row
+
+    def finish(self):
+        self.seconds = time.perf_counter() - self._t0
+        self.cpu_seconds = time.process_time() - self._cpu0
+
+    def as_dict(self) -> dict:
+        rows = self.rows_in if self.rows_in is not None else self.rows_out
+        return {
+            "started": self.started,
+            "seconds": round(self.seconds, 3),
+            "cpu_seconds": round(self.cpu_seconds, 3),
+            "rows_in": self.rows_in,
+            "rows_out": self.rows_out,
+            "rows_per_sec": round(rows / self.seconds, 1) if rows and self.seconds else None,
+            "inputs": {p: file_size(p) for p in self.inputs},
+            "outputs": {p: file_size(p) for p in self.outputs},
+            **self.extra,
+        }
+
+
+def _write(path, report):
+    path = Path(path)
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, path)
+
+
+def load(path=RUN_REPORT) -> dict:
+    try:
+        with open(path, encoding="utf-8") as f:
+            report = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {"stages": {}}
+    if not isinstance(report.get("stages"), dict):
+        report["stages"] = {}
+    return report
+
+
+def record(metrics, path=RUN_REPORT):
+    """Дописывает (заменяет) шаг в отчёте path."""
+    if path is None:
+        return
+    report = load(path)
+    report["stages"][metrics.name] = metrics.as_dict()
+    report["updated"] = time.strftime("%Y-%m-%d %H:%M:%S")
+    _write(path, report)
+
+
+@contextmanager
+def stage(name, inputs=(), outputs=(), path=RUN_REPORT, collector=None, profile_dir=None, memory=None):
+    """
+    Замер шага name. По выходу (без ошибки) шаг пишется в отчёт path,
+    или — если задан collector (RunCollector) — копится в нём.
+    profile_dir — ещё и профиль шага в этот каталог (profiling.py);
+    memory — пик памяти (0) и бюджет в МБ (> 0) шага (memory_budget.py), m.memory — его трекер.
+    """
+    m = StageMetrics(name, inputs, outputs)
+    m.memory = memory_budget.tracker(name, memory)
+    with profiling.profile(name, profile_dir), m.memory or nullcontext():
+        yield m
+        m.finish()
+    if m.memory is not None:
+        m.extra["memory"] = m.memory.as_dict()
+    if collector is not None:
+        collector.add(m)
+    else:
+        record(m, path)
+
+
+class RunCollector:
+    """Шаги одного процесса (run_pipeline.py): отчёт пишется целиком в конце."""
+
+    def __init__(self):
+        self.stages = []
+        self._t0 = time.perf_counter()
+        self._cpu0 = time.process_time()
+        self.started = time.strftime("%Y-%m-%d %H:%M:%S")
+
+    def add(self, metrics):
+        self.stages.append(metrics)
+
+    def report(self, **extra) -> dict:
+        return {
+            "updated": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "runner": "run_pipeline",
+            "total": {
+                "started": self.started,
+                "seconds": round(time.perf_counter() - self._t0, 3),
+                "cpu_seconds": round(time.process_time() - self._cpu0, 3),
+                **extra,
+            },
+            "stages": {m.name: m.as_dict() for m in self.stages},
+        }
+
+    def save(self, path=RUN_REPORT, **extra):
+        if path is not None:
+            _write(path, self.report(**extra))
+
+
+def format_report(report) -> str:
+    stages = report.get("stages", {})
+    with_memory = any("memory" in s for s in stages.values())
+    head = f"{'шаг':<12} {'сек':>8} {'CPU':>8} {'вход':>8} {'выход':>8} {'строк/с':>9} {'файлы, КБ':>12}"
+    lines = [head + (f" {'пик, МБ':>9} {'RSS, МБ':>9}" if with_memory else "")]
+    for name, s in stages.items():
+        size = sum(v for v in s.get("outputs", {}).values() if v)
+        line = (f"{name:<12} {s['seconds']:>8.2f} {s['cpu_seconds']:>8.2f} {s['rows_in'] or '-':>8} "
+                f"{s['rows_out'] or '-':>8} {s['rows_per_sec'] or 0:>9.0f} {size / 1024:>12.1f}")
+        mem = s.get("memory")
+        if mem:
+            line += f" {mem['peak_mb']:>9.1f} {mem['rss_peak_mb'] or 0:>9.1f}"
+        lines.append(line)
+    total = report.get("total")
+    if total:
+        lines.append(f"{'всего':<12} {total['seconds']:>8.2f} {total['cpu_seconds']:>8.2f}")
+    return "\n".join(lines)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Отчёт о прогоне конвейера по шагам")
+    ap.add_argument("report", nargs="?", default=RUN_REPORT, help="файл отчёта")
+    ap.add_argument("--specs", action="store_true", help="показать время по каждой спецификации")
+    args = ap.parse_args()
+
+    report = load(args.report)
+    print(format_report(report))
+    if args.specs:
+        parse = report["stages"].get("parse", {})
+        for s in sorted(parse.get("specs", []), key=lambda s: -s["seconds"]):
+            cached = " (кэш)" if s["cached"] else ""
+            peak = f"  {s['peak_mb']:>7.1f} МБ" if s.get("peak_mb") is not None else ""
+            print(f"  {s['seconds']:>7.3f} с  {s['rows']:>5} строк{peak}  {s['module']}{cached}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,286 @@
+# run_pipeline.py
+# Весь конвейер (шаги 1–7 из README) в одном процессе.
+#
+# Строки передаются между шагами в памяти, без промежуточных XLSX:
+#   parse_spec → classify → row_sort_key → сжатие по Name → split_name → ВП → перенос строк.
+# На диск пишется только финальная ВП; промежуточные файлы — только если их попросили (--keep).
+# Имена промежуточных файлов те же, что у отдельных скриптов, поэтому любой шаг
+# можно потом перезапустить отдельным скриптом с этого места.
+#
+# Запуск:
+#   python run_pipeline.py
+#   python run_pipeline.py --keep parsed,split -j 0 --engine lxml
+#   python run_pipeline.py --keep all --out-dir out
+#   python run_pipeline.py --incremental            # только изменившиеся модули (incremental.py)
+# Время и строки по шагам — в out-dir/run_report.json (run_metrics.py).
+#   python run_pipeline.py --profile                # профиль каждого шага в profiles/ (profiling.py)
+#   python run_pipeline.py --memory 2000            # пик памяти по шагам, бюджет 2000 МБ (memory_budget.py)
+
+import argparse
+from contextlib import closing
+from pathlib import Path
+
+import bom_db
+import bom_io
+import incremental
+import memory_budget
+import name_dedup
+import parallel_names
+import run_metrics
+import parse_specs_to_bom_many as parse_stage
+import product_structure
+import profiling
+import add_category
+import sort_bom_after_category
+import compress_by_name
+import split_name_to_supplydoc
+import format_vedomost_pokupnyh
+import wrap_to_rows_set_widths
+from docx_tables import ENGINES
+from specs_list import SPECS
+
+# ===== НАСТРОЙКИ =====
+OUTPUT_XLSX = wrap_to_rows_set_widths.OUTPUT_XLSX
+OUT_DIR = "."
+# =====================
+
+# Промежуточные результаты: имя → файл (как у отдельных скриптов)
+STAGE_FILES = {
+    "parsed": parse_stage.OUTPUT_XLSX,
+    "categorized": add_category.OUTPUT_XLSX,
+    "sorted": sort_bom_after_category.OUTPUT_XLSX,
+    "compressed": compress_by_name.OUTPUT_XLSX,
+    "split": split_name_to_supplydoc.OUTPUT_XLSX,
+    "vp": format_vedomost_pokupnyh.OUTPUT_XLSX,
+}
+
+
+def run_pipeline(specs=SPECS, output=OUTPUT_XLSX, keep=(), out_dir=OUT_DIR,
+                 workers=parse_stage.WORKERS, timeout=parse_stage.FILE_TIMEOUT,
+                 engine=parse_stage.PARSER_ENGINE, use_cache=parse_stage.USE_PARSE_CACHE,
+                 fmt=None, db=None, incremental_state=None, report=run_metrics.RUN_REPORT,
+                 profile_dir=None, memory=None, state=None, touched=None,
+                 merge_similar=compress_by_name.MERGE_SIMILAR, name_workers=parallel_names.WORKERS,
+                 chunk_size=parallel_names.CHUNK_SIZE, structure=None):
+    """
+    Прогоняет все шаги в памяти и пишет финальную ВП в output.
+    keep — имена промежуточных результатов из STAGE_FILES, которые нужно сохранить (в out_dir);
+    fmt — их формат: "xlsx" или "bomc" (по умолчанию bom_io.INTERMEDIATE_FORMAT; ВП — всегда XLSX).
+    db — файл SQLite: таблицы parsed, categorized и split (bom_db.py) пишутся туда для запросов.
+    incremental_state — файл состояния incremental.py: шаги 1–3 и SupplyDoc пересчитываются только
+    для изменившихся модулей (use_cache=False — полный пересчёт с записью нового состояния).
+    report — имя отчёта о прогоне по шагам (run_metrics.py) в out_dir; None — не писать.
+    profile_dir — каталог для профилей шагов (profiling.py); None — без профилирования.
+    memory — пик памяти по шагам (0) и бюджет памяти в МБ (> 0), memory_budget.py; None — без замера.
+    state — уже загруженный incremental.PipelineState (watch.py держит его в памяти между прогонами):
+    инкрементальный прогон без чтения файла состояния; на диск — только если задан incremental_state.
+    touched — имена DOCX, которые могли измениться (остальные не перечитываются для сверки sha256).
+    merge_similar — порог слияния почти одинаковых Name перед сжатием (name_dedup.py); None — не сливать.
+    name_workers, chunk_size — процессы и размер куска для классификации и split_name по уникальным Name
+    (parallel_names.py); workers — только для разбора DOCX.
+    structure — структура изделия (как STRUCTURE, product_structure.py); None — из specs_list.py.
+    Возвращает dict со счётчиками строк по шагам.
+    """
+    keep = set(keep)
+    unknown = keep - set(STAGE_FILES)
+    if unknown:
+        raise ValueError(f"Неизвестные шаги: {sorted(unknown)}. Доступны: {', '.join(STAGE_FILES)}")
+
+    # количества модулей по структуре изделия — до разбора: цикл в STRUCTURE виден сразу
+    multiplicity = product_structure.load_multiplicities(specs, structure)
+
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    def kept(stage):
+        return stage in keep
+
+    def path_of(stage):
+        if stage == "vp":
+            return out_dir / STAGE_FILES[stage]
+        return out_dir / bom_io.stage_path(STAGE_FILES[stage], fmt)
+
+    def write_db(table, headers, rows):
+        # соединение — на одну запись: при ошибке любого шага оно закрывается, незавершённая пачка откатывается
+        with closing(bom_db.connect(db)) as conn:
+            bom_db.write_stage(conn, table, headers, rows)
+
+    counts = {}
+    collector = run_metrics.RunCollector()
+
+    def stage(name, kept_as=None):
+        outputs = [path_of(kept_as)] if kept_as and kept(kept_as) else []
+        return run_metrics.stage(name, outputs=outputs, collector=collector, profile_dir=profile_dir,
+                                 memory=memory)
+
+    if incremental_state is not None or state is not None:
+        # 1–3) Только изменившиеся модули: разбор, Category, ключи сортировки; слияние с прошлым порядком
+        with stage("incremental") as m:
+            if state is None:
+                state = incremental.PipelineState.load(incremental_state, fresh=not use_cache)
+            info = state.update(specs, workers=workers, timeout=timeout, engine=engine, use_cache=use_cache,
+                                memory=m.memory, touched=touched, name_workers=name_workers,
+                                chunk_size=chunk_size)
+            counts["parsed"] = state.parsed_count()
+            counts["reused"] = info["reused"]
+            counts["cache_hits"] = info["cache_hits"]
+            counts["changed"] = len(info["changed"])
+            rows = state.sorted_rows()
+            m.rows_out = len(rows)
+            m.extra.update(files=len(specs), reused=info["reused"], cache_hits=info["cache_hits"],
+                           changed=info["changed"], removed=info["removed"], specs=info["specs"])
+        if kept("parsed"):
+            parse_stage.save_bom_xlsx(state.parsed_rows(), path_of("parsed"))
+        if db:
+            write_db("parsed", parse_stage.BOM_HEADERS, state.parsed_rows())
+        headers = list(state.headers)
+        if kept("categorized"):
+            bom_io.write_sheet(path_of("categorized"), "BOM", headers, state.categorized_rows(),
+                               widths=add_category.COLUMN_WIDTHS)
+        if db:
+            write_db("categorized", headers, state.categorized_rows())
+        split = state.split_name
+    else:
+        state = None
+        split = split_name_to_supplydoc.split_name
+
+        # 1) Парсинг
+        with stage("parse", "parsed") as m:
+            info = {}
+            blocks = parse_stage.parse_specs(specs, workers=workers, timeout=timeout, engine=engine,
+                                             use_cache=use_cache, info=info, memory=m.memory)
+            headers = list(parse_stage.BOM_HEADERS)
+            rows = parse_stage.bom_rows(blocks)
+            counts["parsed"] = sum(len(b) for b in blocks)
+            counts["cache_hits"] = info.get("cache_hits", 0)
+            if kept("parsed"):
+                parse_stage.save_bom_xlsx(rows, path_of("parsed"))
+            if db:
+                write_db("parsed", headers, rows)
+            m.rows_out = counts["parsed"]
+            m.extra.update(files=len(specs), cache_hits=counts["cache_hits"], specs=info["specs"])
+
+        # 2) Category
+        with stage("category", "categorized") as m:
+            m.rows_in = len(rows)
+            headers, rows = add_category.categorize_rows(headers, rows, use_cache=use_cache,
+                                                         workers=name_workers, chunk_size=chunk_size)
+            rows = list(rows)
+            if kept("categorized"):
+                bom_io.write_sheet(path_of("categorized"), "BOM", headers, rows,
+                                   widths=add_category.COLUMN_WIDTHS)
+            if db:
+                write_db("categorized", headers, rows)
+            m.rows_out = len(rows)
+
+        # 3) Сортировка — при группировке "hash" порядок групп задаёт само сжатие,
+        #    отдельно сортируем только ради BOM_with_category_sorted
+        if compress_by_name.GROUPING != "hash" or kept("sorted"):
+            with stage("sort", "sorted") as m:
+                rows = sort_bom_after_category.sort_rows(headers, rows)
+                m.rows_in = m.rows_out = len(rows)
+
+    if kept("sorted"):
+        bom_io.write_sheet(path_of("sorted"), "BOM", headers, rows)
+
+    # 4) Сжатие по Name
+    with stage("compress", "compressed") as m:
+        m.rows_in = len(rows)
+        merged = {}
+        rows = list(compress_by_name.compress_rows(headers, rows, merge_similar=merge_similar, merged=merged))
+        counts["compressed"] = m.rows_out = len(rows)
+        counts["merged_names"] = m.extra["merged_names"] = len(merged)
+        if kept("compressed"):
+            compress_by_name.save_compressed(headers, rows, path_of("compressed"))
+
+    # 5) Name → Name_Clean + SupplyDoc
+    with stage("split", "split") as m:
+        if state is not None:
+            # новые Name — в состояние (и в процессах), дальше split_name берёт их оттуда
+            name_i = headers.index("Name")
+            state.split_names(("" if r[name_i] is None else str(r[name_i]) for r in rows), name_workers, chunk_size)
+            headers, rows = split_name_to_supplydoc.split_rows(headers, rows, split=split, workers=1)
+        else:
+            headers, rows = split_name_to_supplydoc.split_rows(headers, rows, split=split, workers=name_workers,
+                                                               chunk_size=chunk_size)
+        rows = list(rows)
+        m.rows_in = m.rows_out = len(rows)
+        if kept("split"):
+            bom_io.write_sheet(path_of("split"), compress_by_name.OUTPUT_SHEET, headers, rows,
+                               widths=split_name_to_supplydoc.COLUMN_WIDTHS,
+                               decorate=bom_io.wrap_formula_cells(headers.index("Qty")))
+        if db:
+            write_db("split", headers, rows)
+
+    # 6) Ведомость покупных
+    with stage("vp", "vp") as m:
+        m.rows_in = len(rows)
+        vp_wb = format_vedomost_pokupnyh.build_vp(headers, rows, multiplicity)
+        vp_ws = vp_wb.active
+        m.rows_out = vp_ws.max_row
+        if kept("vp"):
+            vp_wb.save(path_of("vp"))
+
+    # 7) Перенос строк и ширины — раскладка по строкам ВП из памяти, запись одним проходом
+    with run_metrics.stage("wrap", outputs=[output], collector=collector, profile_dir=profile_dir,
+                           memory=memory) as m:
+        rows = wrap_to_rows_set_widths.layout_vp(m.count_in(wrap_to_rows_set_widths.read_rows(vp_ws)))
+        counts["vp_rows"] = m.rows_out = wrap_to_rows_set_widths.write_rows(output, vp_ws.title, rows)
+
+    # состояние — только после успешной записи ВП
+    if state is not None and incremental_state is not None:
+        state.save(incremental_state)
+
+    if report:
+        collector.save(out_dir / report, files=len(specs), bom_rows=counts["parsed"],
+                       incremental=state is not None)
+    return counts
+
+
+@memory_budget.exit_on_budget
+def main():
+    ap = argparse.ArgumentParser(description="Весь конвейер DOCX → ВП в одном процессе")
+    ap.add_argument("-o", "--output", default=OUTPUT_XLSX, help="финальная ВП (XLSX)")
+    ap.add_argument("--keep", default="",
+                    help="какие промежуточные результаты сохранить: через запятую из "
+                         f"{', '.join(STAGE_FILES)} или all")
+    ap.add_argument("--out-dir", default=OUT_DIR, help="каталог для промежуточных файлов")
+    ap.add_argument("--format", choices=("xlsx", "bomc"), default=bom_io.INTERMEDIATE_FORMAT,
+                    help="формат промежуточных файлов --keep")
+    ap.add_argument("--db", nargs="?", const=bom_db.DB_PATH, metavar="SQLITE",
+                    help=f"записать таблицы parsed, categorized, split в базу SQLite (по умолчанию {bom_db.DB_PATH})")
+    ap.add_argument("-j", "--workers", type=int, default=parse_stage.WORKERS,
+                    help="число процессов парсинга (1 = последовательно, 0 = по числу ядер)")
+    ap.add_argument("--timeout", type=float, default=parse_stage.FILE_TIMEOUT,
+                    help="лимит времени на один DOCX в параллельном режиме, сек (0 = без лимита)")
+    ap.add_argument("--engine", choices=ENGINES, default=parse_stage.PARSER_ENGINE,
+                    help="движок чтения DOCX")
+    ap.add_argument("--no-cache", action="store_true", help="не использовать кэш разобранных файлов и справочник категорий")
+    ap.add_argument("--incremental", action="store_true",
+                    help="пересчитывать только изменившиеся модули (состояние в .bom_cache/incremental)")
+    ap.add_argument("--merge-similar", nargs="?", type=float, const=name_dedup.APPLY_THRESHOLD,
+                    default=compress_by_name.MERGE_SIMILAR, metavar="THRESHOLD",
+                    help=f"слить почти одинаковые Name перед сжатием, порог по умолчанию {name_dedup.APPLY_THRESHOLD}")
+    parallel_names.add_argument(ap)
+    profiling.add_argument(ap)
+    memory_budget.add_argument(ap)
+    args = ap.parse_args()
+
+    keep = list(STAGE_FILES) if args.keep == "all" else [k.strip() for k in args.keep.split(",") if k.strip()]
+
+    counts = run_pipeline(SPECS, args.output, keep=keep, out_dir=args.out_dir,
+                          workers=args.workers, timeout=args.timeout or None, engine=args.engine,
+                          use_cache=not args.no_cache, fmt=args.format, db=args.db,
+                          incremental_state=incremental.state_path() if args.incremental else None,
+                          profile_dir=args.profile, memory=args.memory, merge_similar=args.merge_similar,
+                          name_workers=args.name_workers, chunk_size=args.chunk_size)
+    # из состояния — модули без разбора; из кэша — разобранные заново, найденные в parse_cache
+    reused = f"{counts['reused']} из состояния, " if args.incremental else ""
+    changed = f", изменилось модулей: {counts['changed']}" if args.incremental else ""
+    merged = f", слито похожих Name: {counts['merged_names']}" if args.merge_similar else ""
+    print(f"Готово: {len(SPECS)} файлов ({reused}{counts['cache_hits']} из кэша{changed}{merged}), "
+          f"{counts['parsed']} строк BOM → {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,15 @@
+import argparse
 import re
-from pathlib import Path
-from openpyxl import load_workbook, Workbook
+from contextlib import closing
+from functools import lru_cache
+from operator import itemgetter
+
+import bom_columnar
+import bom_db
+import bom_io
+import memory_budget
+import profiling
+import run_metrics
 
 
 # ========== НАСТРОЙКИ ==========
@@ -10,6 +19,8 @@ OUTPUT_XLSX = "BOM_with_category_sorted.xlsx"
 
 CAT_FASTENERS = "Крепежные изделия"
 SECTION_STANDARD = "Стандартные"
+
+NAME_CACHE_SIZE = 65536   # сколько разных Name помнить с разобранными признаками крепежа
 # ===============================
 
 
@@ -49,97 +60,201 @@ M_SIZE_RE = re.compile(
     r"(?iu)\b[МM]\s*(\d+(?:[.,]\d+)?)\s*(?:[x×\*]\s*(\d+(?:[.,]\d+)?))?"
 )
 
-def fastener_key(name: str):
-    """
-    Сортировка для крепежа:
-    1) DIN/ISO/ГОСТ номер
-    2) Алфавит
-    3) Размер резьбы (M)
-    4) Длина
-    """
-    n = norm_space(name)
+# Признаки крепежа — колонки после Category (их заполняет add_category.py у Category = CAT_FASTENERS):
+# стандарт (DIN / ISO / ГОСТ), номер стандарта, резьба M, длина. Пусто — в Name не найдено.
+FASTENER_COLUMNS = ("Std", "Std_No", "Thread", "Length")
+STD_RANKS = {"DIN": 1, "ISO": 2, "ГОСТ": 3}   # порядок стандартов в сортировке; без стандарта — 9
+NO_NUMBER = 10**9                             # в ключе вместо пустого номера/размера (в конец)
 
-    din = DIN_RE.search(n)
-    iso = ISO_RE.search(n)
-    gost = GOST_RE.search(n)
+def to_number(num: str):
+    """Число из "8", "2,5": целые — int (в таблице без ".0")."""
+    v = to_float(num)
+    return int(v) if v.is_integer() else v
 
-    std_rank = 9
-    std_num = 10**9
+@lru_cache(maxsize=NAME_CACHE_SIZE)
+def fastener_attrs(name: str) -> tuple:
+    """(стандарт, номер стандарта, резьба M, длина) из Name — значения FASTENER_COLUMNS, чего нет — None."""
+    n = norm_space(name)
 
-    if din:
-        std_rank = 1
-        std_num = int(din.group(1))
-    elif iso:
-        std_rank = 2
-        std_num = int(iso.group(1))
-    elif gost:
-        std_rank = 3
-        std_num = int(gost.group(1))
+    std = std_num = None
+    for family, rx in (("DIN", DIN_RE), ("ISO", ISO_RE), ("ГОСТ", GOST_RE)):
+        found = rx.search(n)
+        if found:
+            std, std_num = family, int(found.group(1))
+            break
 
     # размеры M
-    thread = 10**9
-    length = 10**9
+    thread = length = None
     m = M_SIZE_RE.search(n)
     if m:
-        try:
-            thread = to_float(m.group(1))
-        except Exception:
-            pass
+        thread = to_number(m.group(1))
         if m.group(2):
-            try:
-                length = to_float(m.group(2))
-            except Exception:
-                pass
+            length = to_number(m.group(2))
 
-    return (std_rank, std_num, lower_ru_lat(n), thread, length, natural_key(n))
+    return (std, std_num, thread, length)
+
+def _key_number(v):
+    """Значение колонки признака → число для ключа (пустое или не число — NO_NUMBER)."""
+    if isinstance(v, (int, float)):
+        return v
+    try:
+        return to_float(s(v))
+    except ValueError:
+        return NO_NUMBER
+
+def _fastener_key(n: str, attrs):
+    std, std_num, thread, length = attrs
+    return (STD_RANKS.get(s(std), 9), _key_number(std_num), lower_ru_lat(n),
+            _key_number(thread), _key_number(length), natural_key(n))
+
+def fastener_key(name: str):
+    """
+    Сортировка для крепежа:
+    1) DIN/ISO/ГОСТ номер
+    2) Алфавит
+    3) Размер резьбы (M)
+    4) Длина
+    """
+    n = norm_space(name)
+    return _fastener_key(n, fastener_attrs(n))
 # ----------------------------
 
 
-def row_sort_key(row_dict: dict):
-    cat = s(row_dict.get("Category"))
-    name = s(row_dict.get("Name"))
-    section = s(row_dict.get("Section"))
+def _sort_key(cat, name, section, attrs=None):
+    """Ключ сортировки строки; attrs — значения FASTENER_COLUMNS из строки (None — колонок нет)."""
+    cat = s(cat)
+    name = s(name)
+    section = s(section)
 
     cat_key = lower_ru_lat(cat)
 
     # Только крепеж — специальная логика
     if cat == CAT_FASTENERS or section == SECTION_STANDARD:
-        return (cat_key, 0, fastener_key(name))
+        n = norm_space(name)
+        if attrs is None or cat != CAT_FASTENERS:
+            # колонки заполнены только у категории крепежа — у остальных "Стандартных" разбираем Name
+            attrs = fastener_attrs(n)
+        return (cat_key, 0, _fastener_key(n, attrs))
 
     # Всё остальное — обычная естественная сортировка
     return (cat_key, 9, natural_key(name))
 
 
-def main():
-    in_path = Path(INPUT_XLSX)
-    if not in_path.exists():
-        raise FileNotFoundError(f"Не найден {INPUT_XLSX}")
+def row_sort_key(row_dict: dict):
+    attrs = None
+    if all(h in row_dict for h in FASTENER_COLUMNS):
+        attrs = tuple(row_dict[h] for h in FASTENER_COLUMNS)
+    return _sort_key(row_dict.get("Category"), row_dict.get("Name"), row_dict.get("Section"), attrs)
 
-    wb = load_workbook(in_path)
-    ws = wb[SHEET_NAME] if SHEET_NAME in wb.sheetnames else wb.active
 
-    headers = [s(c.value) for c in ws[1]]
+def sort_key_fn(headers):
+    """
+    Функция values → row_sort_key для строк в порядке headers, без dict на строку.
+    Признаки крепежа берутся из колонок FASTENER_COLUMNS, если они есть (иначе — разбором Name).
+    Ключ считается один раз на каждое сочетание Category, Name, Section (и признаков),
+    для повторов — поиск в словаре.
+    """
     if "Category" not in headers or "Name" not in headers:
         raise RuntimeError(f"Ожидались колонки Category и Name. Есть: {headers}")
+    cols = [headers.index("Category"), headers.index("Name")]
+    has_section = "Section" in headers
+    if has_section:
+        cols.append(headers.index("Section"))
+    has_attrs = all(h in headers for h in FASTENER_COLUMNS)
+    if has_attrs:
+        cols.extend(headers.index(h) for h in FASTENER_COLUMNS)
+    get = itemgetter(*cols)
+    memo = {}
+
+    def key(values):
+        k = get(values)
+        out = memo.get(k)
+        if out is None:
+            out = memo[k] = _sort_key(k[0], k[1], k[2] if has_section else None,
+                                      k[-len(FASTENER_COLUMNS):] if has_attrs else None)
+        return out
+
+    return key
 
-    rows = []
-    for r in range(2, ws.max_row + 1):
-        values = [ws.cell(r, c).value for c in range(1, len(headers) + 1)]
-        row_dict = {headers[i]: values[i] for i in range(len(headers))}
-        rows.append((row_dict, values))
 
-    rows_sorted = sorted(rows, key=lambda rv: row_sort_key(rv[0]))
+def sort_rows(headers, rows):
+    """Сортирует строки (списки значений в порядке headers) по row_sort_key. Возвращает новый список."""
+    return sorted(rows, key=sort_key_fn(headers))
 
-    out_wb = Workbook()
-    out_ws = out_wb.active
-    out_ws.title = ws.title
 
-    out_ws.append(headers)
-    for _, values in rows_sorted:
-        out_ws.append(values)
+def sort_columnar(src, dst):
+    """
+    То же для .bomc → .bomc: ключ сортировки строится по колонкам Category, Name, Section
+    (и FASTENER_COLUMNS, если есть), остальные колонки переставляются как есть. Возвращает число строк.
+    Заголовки, как и у XLSX, без пробелов по краям (s()) — и при поиске колонок, и в результате.
+    """
+    with bom_columnar.ColumnarFile(src) as cf:
+        raw = {}   # заголовок после s() → имя колонки в файле
+        for h in cf.headers:
+            raw.setdefault(s(h), h)
+        headers = [s(h) for h in cf.headers]
+        if "Category" not in raw or "Name" not in raw:
+            raise RuntimeError(f"Ожидались колонки Category и Name. Есть: {headers}")
+        key_cols = [h for h in ("Category", "Name", "Section") + FASTENER_COLUMNS if h in raw]
+        key = sort_key_fn(key_cols)
+        keys = [key(values) for values in cf.iter_rows([raw[h] for h in key_cols])]
+
+    order = sorted(range(len(keys)), key=keys.__getitem__)
+    bom_columnar.take_rows(src, dst, order, headers)
+    return len(order)
+
+
+def sort_db(conn, src="categorized", dst="sorted"):
+    """
+    То же в SQLite (bom_db.py): читаются только seq и колонки ключа таблицы src,
+    dst — строки src в новом порядке. Возвращает число строк.
+    """
+    headers = bom_db.stage_headers(conn, src)
+    if "Category" not in headers or "Name" not in headers:
+        raise RuntimeError(f"Ожидались колонки Category и Name. Есть: {headers}")
+    key_cols = [h for h in ("Category", "Name", "Section") + FASTENER_COLUMNS if h in headers]
+    _, rows = bom_db.read_stage(conn, src, [bom_db.SEQ] + key_cols)
+    key = sort_key_fn(key_cols)
+    keyed = [(key(values), seq) for seq, *values in rows]
+
+    order = [seq for _, seq in sorted(keyed, key=itemgetter(0))]
+    return bom_db.permute_stage(conn, src, dst, order)
+
+
+@memory_budget.exit_on_budget
+def main():
+    ap = argparse.ArgumentParser(description="Сортировка BOM по Category и Name")
+    ap.add_argument("--db", nargs="?", const=bom_db.DB_PATH, metavar="SQLITE",
+                    help=f"сортировать таблицу categorized в sorted в базе (по умолчанию {bom_db.DB_PATH})")
+    profiling.add_argument(ap)
+    memory_budget.add_argument(ap)
+    args = ap.parse_args()
+
+    if args.db:
+        with run_metrics.stage("sort", outputs=[args.db], profile_dir=args.profile,
+                               memory=args.memory) as m, \
+                closing(bom_db.connect(args.db)) as conn:
+            m.rows_in = m.rows_out = sort_db(conn)
+        print(f"OK: {args.db}:sorted")
+        return
+
+    in_path = bom_io.stage_path(INPUT_XLSX)
+    out_path = bom_io.stage_path(OUTPUT_XLSX)
+    if not in_path.exists():
+        raise FileNotFoundError(f"Не найден {in_path}")
+
+    with run_metrics.stage("sort", inputs=[in_path], outputs=[out_path], profile_dir=args.profile,
+                           memory=args.memory) as m:
+        if bom_columnar.is_columnar(in_path) and bom_columnar.is_columnar(out_path):
+            m.rows_in = m.rows_out = sort_columnar(in_path, out_path)
+        else:
+            title, headers, rows = bom_io.read_sheet(in_path, SHEET_NAME)
+            headers = [s(h) for h in headers]
+
+            rows_sorted = sort_rows(headers, list(m.count_in(rows)))
 
-    out_wb.save(OUTPUT_XLSX)
-    print(f"OK: {OUTPUT_XLSX}")
+            m.rows_out = bom_io.write_sheet(out_path, title, headers, rows_sorted)
+    print(f"OK: {out_path}")
 
 
 if __name__ == "__main__":
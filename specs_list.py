@@ -32,3 +32,9 @@ SPECS = [
 
     # ...
 ]
+
+# Структура изделия (product_structure.py): модуль → [(входящий модуль, сколько штук на один модуль)].
+# Модули, которые никуда не входят, считаются по одному. Пустой словарь — каждый модуль по одному.
+STRUCTURE = {
+    # "КОР-01.00.000": [("КОР-01.10.000", 1), ("КОР-02.20.000", 4)],
+}
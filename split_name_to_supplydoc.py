@@ -1,11 +1,30 @@
+import argparse
 import re
-from openpyxl import load_workbook
-from openpyxl.utils import get_column_letter
+from contextlib import closing
+from functools import lru_cache
+
+import bom_columnar
+import bom_db
+import bom_io
+import memory_budget
+import parallel_names
+import profiling
+import run_metrics
 
 INPUT_XLSX = "BOM_compressed_by_name.xlsx"
 SHEET = "BOM"
 OUTPUT_XLSX = "BOM_split.xlsx"
 
+# Запоминание split_name по Name: сколько разных Name держать (None — без ограничения)
+SPLIT_CACHE_SIZE = 65536
+
+# Ширины колонок выхода (как в BOM_compressed_by_name.xlsx + новые колонки)
+COLUMN_WIDTHS = {
+    "Module": 16, "Section": 14, "PosText": 8, "Category": 22, "Name": 60,
+    "Manufacturer": 28, "PartNumber": 28, "Qty": 8, "Comment": 60,
+    "Name_Clean": 60, "SupplyDoc": 55,
+}
+
 # --- patterns ---
 VENDOR_QUOTED_AT_END = re.compile(r'\s*["“”«»]([^"“”«»]+)["“”«»]\s*$', re.U)
 
@@ -23,6 +42,15 @@ DECIMAL_RE = re.compile(r'(?iu)\b[А-ЯA-Z]{2,6}\.\d{3,6}\.\d{2,3}(?:\.\d{1,3})?
 # Плотный part number: длина >= 6, есть цифра, допускаем -,.,_
 PART_TOKEN_RE = re.compile(r'(?iu)\b(?=[A-ZА-Я0-9\-\._]{6,}\b)(?=.*\d)[A-ZА-Я0-9][A-ZА-Я0-9\-\._]*\b')
 
+# Те же шаблоны по частям — для split_name без возвратов (см. ниже)
+STD_KEY_RE = re.compile(r'(?iu)\b(?:DIN|ISO|EN|IEC|ГОСТ(?:\s*Р)?|ТУ|ОСТ|СТО)\b')
+STD_PART_RE = re.compile(r'(?iu)\s*№?\s*[A-ZА-Я0-9][A-ZА-Я0-9\.\-\/]*|\s*\d[\d\.\-\/]*')
+PART_RUN_RE = re.compile(r'(?iu)[A-ZА-Я0-9\-\._]+')
+PART_START_RE = re.compile(r'(?iu)[A-ZА-Я0-9]')
+LAST_DIGIT_RE = re.compile(r'.*\d', re.S)
+REFDES_RE = re.compile(r'(?iu)[RCVDT]{1,2}\d+')
+QUOTES = '"“”«»'
+
 # “служебные” токены (корпуса/диэлектрики и т.п.) — не считать part number
 PART_BAD = set(map(str.upper, [
     "SOIC", "SOIC-8", "SOIC8", "DIP", "DIP-8", "DIP-32", "PLCC", "QFN", "SOT",
@@ -30,11 +58,14 @@ PART_BAD = set(map(str.upper, [
 ]))
 
 def clean(s: str) -> str:
-    return re.sub(r"\s+", " ", (s or "").strip())
+    # то же, что re.sub(r"\s+", " ", s.strip()): split() делит по тем же пробельным символам, что и \s
+    return " ".join((s or "").split())
 
 
-def split_name(name: str):
+def split_name_regex(name: str):
     """
+    Эталон split_name: прежний разбор целиком на regex (PART_TOKEN_RE и STD_RE с возвратами —
+    на длинных Name время растёт квадратично). Для сверки: python split_name_to_supplydoc.py --verify.
     Возвращает (Name_Clean, SupplyDoc)
 
     Требования:
@@ -92,36 +123,284 @@ def split_name(name: str):
     return name_clean, supply_doc
 
 
-def ensure_col(ws, headers, col_name, width=40):
-    if col_name in headers:
-        return headers.index(col_name) + 1
-    col = ws.max_column + 1
-    ws.cell(1, col).value = col_name
-    ws.column_dimensions[get_column_letter(col)].width = width
-    return col
+def _is_word(ch) -> bool:
+    """Буква, цифра или "_" — то, что regex считает символом слова (для границ слова)."""
+    return ch.isalnum() or ch == "_"
 
 
-def main():
-    wb = load_workbook(INPUT_XLSX)
-    ws = wb[SHEET] if SHEET in wb.sheetnames else wb.active
+def _cut_vendor(s):
+    """Как VENDOR_QUOTED_AT_END.search: (s без "Vendor" в конце, vendor) или (s, None)."""
+    if len(s) < 3 or s[-1] not in QUOTES:
+        return s, None
+    j = len(s) - 2
+    while j >= 0 and s[j] not in QUOTES:
+        j -= 1
+    if j < 0 or j == len(s) - 2:   # нет открывающей кавычки или пусто между кавычками
+        return s, None
+    start = j
+    while start > 0 and s[start - 1].isspace():
+        start -= 1
+    return s[:start], s[j + 1:-1]
+
+
+def _cut_matches(s, spans):
+    """s без участков spans [(start, end), ...] (по возрастанию, не пересекаются)."""
+    pieces, last = [], 0
+    for start, end in spans:
+        pieces.append(s[last:start])
+        last = end
+    pieces.append(s[last:])
+    return "".join(pieces)
+
+
+def _std_spans(s):
+    """Совпадения STD_RE: ключевое слово, затем номера по одному (без вложенного повтора)."""
+    spans, pos = [], 0
+    while True:
+        m = STD_KEY_RE.search(s, pos)
+        if m is None:
+            return spans
+        end = m.end()
+        while True:
+            part = STD_PART_RE.match(s, end)
+            if part is None or part.end() == end:
+                break
+            end = part.end()
+        spans.append((m.start(), end))
+        pos = end
+
+
+def _part_tokens(s):
+    """
+    То же, что PART_TOKEN_RE.findall(s), за один проход по сериям символов [A-ZА-Я0-9-._]:
+    токен начинается на границе слова с буквы/цифры, кончается на последней границе слова в серии,
+    длина ≥ 6, и где-то правее его начала есть цифра.
+    """
+    m = LAST_DIGIT_RE.match(s)
+    if m is None:
+        return []
+    last_digit = m.end() - 1
+    n = len(s)
+    tokens = []
+    for run in PART_RUN_RE.finditer(s):
+        r0, r1 = run.span()
+        if r0 > last_digit:
+            break
+        if r1 - r0 < 6:
+            continue
+        end = r1
+        while end > r0 and _is_word(s[end - 1]) == (end < n and _is_word(s[end])):
+            end -= 1
+        for p in range(r0, min(end - 5, last_digit + 1)):
+            if (p == 0 or not _is_word(s[p - 1])) and PART_START_RE.match(s[p]):
+                tokens.append(s[p:end])
+                break
+    return tokens
+
+
+def _split_name(name: str):
+    s = clean(name)
+
+    # 1) Vendor в кавычках в конце — держим ОТДЕЛЬНО, НЕ кладём в supply_parts
+    s, vendor = _cut_vendor(s)  # s уже без пробелов по краям
+    if vendor is not None:
+        vendor = clean(vendor)
+
+    supply_parts = []  # сюда только стандарты/децимал/артикул
+
+    # 2) Стандарты
+    spans = _std_spans(s)
+    if spans:
+        supply_parts.extend(clean(s[a:b]) for a, b in spans)
+        s = clean(_cut_matches(s, spans))
+
+    # 3) Децимальные обозначения
+    spans = [m.span() for m in DECIMAL_RE.finditer(s)]
+    if spans:
+        supply_parts.extend(clean(s[a:b]) for a, b in spans)
+        s = clean(_cut_matches(s, spans))
+
+    # 4) Part token (берём “главный” ближе к концу); refdes вида R12, C5, D3 — не part number
+    tokens = [t for t in _part_tokens(s) if t.upper() not in PART_BAD and not REFDES_RE.fullmatch(t)]
+    if tokens:
+        part = tokens[-1]
+        supply_parts.append(part)
+        s = clean(s.replace(part, "", 1))
+
+    # Уникализация (с сохранением порядка)
+    supply_parts = list(dict.fromkeys([p for p in supply_parts if p]))
+
+    # Финальная сборка SupplyDoc
+    supply_doc = "; ".join(supply_parts)
+    if vendor:
+        supply_doc = (supply_doc + f' "{vendor}"') if supply_doc else f'"{vendor}"'
 
-    headers = [clean(str(c.value)) if c.value is not None else "" for c in ws[1]]
+    return s, supply_doc
+
+
+@lru_cache(maxsize=SPLIT_CACHE_SIZE)
+def split_name(name: str):
+    """
+    Возвращает (Name_Clean, SupplyDoc); результат запоминается по Name (повторы строк не разбираются заново).
+    Разбор — тот же, что у эталона split_name_regex, но за линейное время: каждый шаг —
+    один проход по строке, регулярные выражения без возвратов на всю длину Name.
+
+    Требования:
+    - Vendor попадает в конец SupplyDoc только если реально есть в кавычках в конце исходной строки.
+    - Vendor в SupplyDoc в кавычках.
+    - Перед vendor точка с запятой не ставится.
+    """
+    return _split_name(name)
+
+
+def verify_split(names, reference=split_name_regex):
+    """Name, на которых split_name и эталон расходятся: [(name, split_name, эталон)]."""
+    diff = []
+    for name in names:
+        a, b = _split_name(name), reference(name)
+        if a != b:
+            diff.append((name, a, b))
+    return diff
+
+
+def split_many(names, workers=parallel_names.WORKERS, chunk_size=parallel_names.CHUNK_SIZE) -> dict:
+    """{Name: (Name_Clean, SupplyDoc)} по уникальным names — в workers процессах (parallel_names.py)."""
+    return parallel_names.map_names(_split_name, names, workers, chunk_size)
+
+
+def split_rows(headers, rows, split=split_name, workers=parallel_names.WORKERS,
+               chunk_size=parallel_names.CHUNK_SIZE):
+    """
+    Заполняет Name_Clean и SupplyDoc по Name для строк (последовательности значений в порядке headers).
+    Возвращает (headers, rows): новые заголовки (недостающие колонки добавляются в конец)
+    и ленивый итератор строк-списков. split — функция Name → (Name_Clean, SupplyDoc).
+    workers, chunk_size — уникальные Name разбираются заранее в workers процессах (split_many),
+    split — только для остальных; при workers != 1 строки читаются целиком.
+    """
     if "Name" not in headers:
         raise RuntimeError(f"Нет колонки Name. Заголовки: {headers}")
 
-    name_col = headers.index("Name") + 1
-    name_clean_col = ensure_col(ws, headers, "Name_Clean", width=60)
-    supply_col = ensure_col(ws, headers, "SupplyDoc", width=55)
+    name_i = headers.index("Name")
+
+    if parallel_names.resolve_workers(workers) > 1:
+        rows = [list(r) for r in rows]
+        parts = split_many(("" if r[name_i] is None else str(r[name_i]) for r in rows), workers, chunk_size)
+        split_one = split
+
+        def split(name):
+            found = parts.get(name)
+            return split_one(name) if found is None else found
+
+    out_headers = list(headers)
+    for h in ("Name_Clean", "SupplyDoc"):
+        if h not in out_headers:
+            out_headers.append(h)
+    name_clean_i = out_headers.index("Name_Clean")
+    supply_i = out_headers.index("SupplyDoc")
+    width = len(out_headers)
+
+    def gen():
+        for row in rows:
+            row = list(row)
+            if len(row) < width:
+                row.extend([None] * (width - len(row)))
+            name = row[name_i]
+            name = "" if name is None else str(name)
+            nc, sd = split(name)
+            row[name_clean_i] = nc or None
+            row[supply_i] = sd or None
+            yield row
+
+    return out_headers, gen()
+
+
+def split_columnar(src, dst, workers=parallel_names.WORKERS, chunk_size=parallel_names.CHUNK_SIZE):
+    """
+    То же для .bomc → .bomc: читается только колонка Name, Name_Clean и SupplyDoc дописываются,
+    остальные колонки копируются как есть. Возвращает число строк.
+    """
+    with bom_columnar.ColumnarFile(src) as cf:
+        if "Name" not in cf.headers:
+            raise RuntimeError(f"Нет колонки Name. Заголовки: {cf.headers}")
+        names = ["" if name is None else str(name) for name in cf.column("Name")]
+
+    parts = split_many(names, workers, chunk_size)
+    name_clean, supply = [], []
+    for name in names:
+        nc, sd = parts[name]
+        name_clean.append(nc or None)
+        supply.append(sd or None)
+
+    bom_columnar.append_columns(
+        src, dst, {"Name_Clean": name_clean, "SupplyDoc": supply},
+        widths={h: COLUMN_WIDTHS[h] for h in ("Name_Clean", "SupplyDoc")},
+    )
+    return len(names)
+
+
+def split_db(conn, src="compressed", dst="split", workers=parallel_names.WORKERS,
+             chunk_size=parallel_names.CHUNK_SIZE):
+    """
+    То же в SQLite (bom_db.py): split_name по уникальным Name таблицы src,
+    таблица dst = src + Name_Clean + SupplyDoc. Возвращает число строк.
+    """
+    parts = {}
+    distinct = bom_db.distinct_values(conn, src, "Name")
+    for name, (nc, sd) in split_many([str(name) for name in distinct], workers, chunk_size).items():
+        parts[name] = (nc or None, sd or None)
+    return bom_db.derive_stage(conn, src, dst, "Name", ["Name_Clean", "SupplyDoc"], parts)
+
+
+@memory_budget.exit_on_budget
+def main():
+    ap = argparse.ArgumentParser(description="Разделение Name на Name_Clean и SupplyDoc")
+    ap.add_argument("--db", nargs="?", const=bom_db.DB_PATH, metavar="SQLITE",
+                    help=f"читать таблицу compressed и писать split в базе (по умолчанию {bom_db.DB_PATH})")
+    ap.add_argument("--verify", action="store_true",
+                    help="только сверить split_name с эталоном split_name_regex на Name из входного файла")
+    parallel_names.add_argument(ap)
+    profiling.add_argument(ap)
+    memory_budget.add_argument(ap)
+    args = ap.parse_args()
+    if args.profile and args.name_workers != 1:
+        print("Профиль: Name разбираются в дочерних процессах и в профиль не попадут (для профиля --name-workers 1)")
+
+    if args.verify:
+        _, headers, rows = bom_io.read_sheet(bom_io.stage_path(INPUT_XLSX), SHEET)
+        name_i = [clean(str(h)) if h is not None else "" for h in headers].index("Name")
+        names = {str(r[name_i]) for r in rows if r[name_i] is not None}
+        diff = verify_split(sorted(names))
+        for name, a, b in diff:
+            print(f"  {name!r}: split_name={a!r} эталон={b!r}")
+        print(f"Сверено имён: {len(names)}, расхождений: {len(diff)}")
+        return
+
+    if args.db:
+        with run_metrics.stage("split", outputs=[args.db], profile_dir=args.profile,
+                               memory=args.memory) as m, \
+                closing(bom_db.connect(args.db)) as conn:
+            m.rows_in = m.rows_out = split_db(conn, workers=args.name_workers, chunk_size=args.chunk_size)
+        print(f"OK: {args.db}:split")
+        return
+
+    in_path = bom_io.stage_path(INPUT_XLSX)
+    out_path = bom_io.stage_path(OUTPUT_XLSX)
+    with run_metrics.stage("split", inputs=[in_path], outputs=[out_path], profile_dir=args.profile,
+                           memory=args.memory) as m:
+        if bom_columnar.is_columnar(in_path) and bom_columnar.is_columnar(out_path):
+            m.rows_in = m.rows_out = split_columnar(in_path, out_path, args.name_workers, args.chunk_size)
+        else:
+            title, headers, rows = bom_io.read_sheet(in_path, SHEET)
+            headers = [clean(str(h)) if h is not None else "" for h in headers]
 
-    for r in range(2, ws.max_row + 1):
-        name = ws.cell(r, name_col).value
-        name = "" if name is None else str(name)
-        nc, sd = split_name(name)
-        ws.cell(r, name_clean_col).value = nc or None
-        ws.cell(r, supply_col).value = sd or None
+            out_headers, out_rows = split_rows(headers, m.count_in(rows), workers=args.name_workers,
+                                               chunk_size=args.chunk_size)
 
-    wb.save(OUTPUT_XLSX)
-    print(f"OK: {OUTPUT_XLSX}")
+            # итоги сжатия (формулы в Qty) — с переносом строк, как в исходном листе
+            decorate = bom_io.wrap_formula_cells(out_headers.index("Qty")) if "Qty" in out_headers else None
+            m.rows_out = bom_io.write_sheet(out_path, title, out_headers, out_rows, widths=COLUMN_WIDTHS,
+                                            decorate=decorate)
+    print(f"OK: {out_path}")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,289 @@
+# synth_specs.py
+# Генератор синтетических спецификаций (DOCX) для проверок и замеров без настоящих КД.
+#
+# Таблица — в точности та, что разбирает parse_spec:
+#   Формат | Зона | Поз. | Обозначение | Наименование | Кол. | Примечание
+# Разделы: Документация, Детали, Стандартные изделия, Прочие изделия, Материалы (после него парсер
+# останавливается). В позициях бывают: наименование и примечание на 2–3 строках, прочерк вместо номера
+# позиции, производитель в кавычках в конце ("..." или «...»), лишние пробелы; заголовки разделов —
+# иногда объединённой ячейкой (gridSpan).
+#
+# Наименования берутся из пула заданного размера (--names): чем меньше пул, тем больше повторов Name
+# между модулями. Всё определяется --seed: один и тот же набор параметров даёт одинаковые файлы.
+#
+# DOCX пишется напрямую (zip с word/document.xml), без python-docx — 1000 спецификаций за секунды.
+#
+# Запуск:
+#   python synth_specs.py out_dir --specs 100
+#   python synth_specs.py out_dir --specs 1000 --positions 20-80 --names 3000 --seed 2
+# В out_dir появятся specs/*.docx и specs_list.py (SPECS для конвейера).
+
+import argparse
+import random
+import zipfile
+from pathlib import Path
+from xml.sax.saxutils import escape
+
+# ===== НАСТРОЙКИ =====
+SPECS_COUNT = 100
+POSITIONS = (10, 50)    # позиций в разделах Стандартные + Прочие на одну спецификацию (мин, макс)
+NAME_POOL = 1000        # число различных наименований
+SEED = 1
+# =====================
+
+# доли особых случаев
+P_MULTILINE = 0.35      # наименование на нескольких строках
+P_DASH = 0.08           # прочерк вместо номера позиции
+P_SPACES = 0.2          # лишние пробелы в наименовании
+P_MERGED_SECTION = 0.5  # заголовок раздела — объединённая ячейка
+
+HEADER = ["Формат", "Зона", "Поз.", "Обозначение", "Наименование", "Кол.", "Примечание"]
+
+VENDORS = ["Yageo", "Murata", "Bourns", "Harting", "Omron", "Kingbright", "Texas Instruments", "ST",
+           "Nexperia", "Mean Well", "Connfly", "Keystone", "Gainta", "Fischer", "Würth Elektronik"]
+SIZES = ["0402", "0603", "0805", "1206"]
+R_VALUES = ["10", "22", "47", "100", "220", "470", "1", "2,2", "4,7", "10", "47", "100"]
+C_VALUES = ["10 пФ", "22 пФ", "100 пФ", "1 нФ", "10 нФ", "100 нФ", "1 мкФ", "10 мкФ", "47 мкФ"]
+THREADS = ["M2", "M2,5", "M3", "M4", "M5", "M6", "M8"]
+LENGTHS = [4, 5, 6, 8, 10, 12, 16, 20, 25, 30]
+COMMENTS = ["", "", "", "R1-R4, R7", "C1...C12 C14 C18", "Допуск замена", "DD1, DD2", "XS1-XS3"]
+
+
+def _pn(r, n=8):
+    return "".join(r.choice("ABCDEFGHJKLMNPRSTUVWXYZ0123456789") for _ in range(n))
+
+
+def _quoted(r, vendor):
+    return f"«{vendor}»" if r.random() < 0.3 else f"\"{vendor}\""
+
+
+def _fastener(r):
+    kind = r.choice(["Винт", "Винт", "Гайка", "Шайба", "Болт", "Шпилька", "Заклепка"])
+    thread, length = r.choice(THREADS), r.choice(LENGTHS)
+    std = r.choice(["DIN 912", "DIN 7985", "ISO 4032", "DIN 125", "DIN 934", "ГОСТ 17473-80",
+                    "ГОСТ 11371-78", "ГОСТ Р ИСО 4762"])
+    if kind in ("Гайка", "Шайба"):
+        return f"{kind} {std} {thread}"
+    if r.random() < 0.2:
+        return f"{kind} A2.{thread}-6gx{length}.36.016 ГОСТ 17475-80"
+    return f"{kind} {std} {thread}x{length}" + (" A2" if r.random() < 0.3 else "")
+
+
+def _other(r):
+    vendor = r.choice(VENDORS)
+    kind = r.randrange(12)
+    if kind == 0:
+        return (f"Резистор {r.choice(SIZES)} {r.choice(R_VALUES)} кОм ±{r.choice([1, 5])}% "
+                f"RC{r.choice(SIZES)}FR-07{r.randint(10, 99)}KL {_quoted(r, vendor)}")
+    if kind == 1:
+        return f"Резистор Р1-12-0,125-{r.choice(R_VALUES)} кОм ±5% ОЖ0.467.173 ТУ"
+    if kind == 2:
+        return (f"Конденсатор {r.choice(SIZES)} X7R {r.choice(C_VALUES)} {r.choice([16, 25, 50])}В "
+                f"GRM{r.randint(10, 99)}BR71H{r.randint(100, 999)}KA01L {_quoted(r, vendor)}")
+    if kind == 3:
+        return f"Конденсатор К10-17б-Н90-{r.choice(C_VALUES)} ОЖ0.460.107 ТУ"
+    if kind == 4:
+        return f"Микросхема {r.choice(['STM32F', 'SN74HC', 'MAX', 'LM', 'AD'])}{_pn(r, 6)} {_quoted(r, vendor)}"
+    if kind == 5:
+        return f"{r.choice(['Вилка', 'Розетка'])} {r.choice(['PLS', 'PBS', 'DIN 41612 C', 'DB'])}-{r.randint(2, 96)} {_quoted(r, vendor)}"
+    if kind == 6:
+        return f"{r.choice(['Диод', 'Транзистор', 'Стабилитрон', 'Оптрон'])} {_pn(r, 7)} {_quoted(r, vendor)}"
+    if kind == 7:
+        return f"{r.choice(['Дроссель', 'Трансформатор', 'Катушка индуктивности'])} {_pn(r, 8)} {_quoted(r, vendor)}"
+    if kind == 8:
+        return f"{r.choice(['Светодиод', 'Кнопка', 'Индикатор'])} {_pn(r, 6)} {_quoted(r, vendor)}"
+    if kind == 9:
+        return f"{r.choice(['Блок питания', 'Предохранитель', 'Реле'])} {_pn(r, 6)} {_quoted(r, vendor)}"
+    if kind == 10:
+        return f"{r.choice(['Корпус', 'Стойка резьбовая', 'Панелька DIP-32', 'Радиатор'])} {_pn(r, 5)} {_quoted(r, vendor)}"
+    return f"Кварцевый резонатор HC-49S {r.choice([4, 8, 12, 16, 25])} МГц"
+
+
+def name_pool(size, seed=SEED):
+    """(крепёж, прочие): пулы различных наименований общим числом size (крепежа — около трети)."""
+    r = random.Random(f"names:{seed}")
+    pools = ([], [])
+    seen = set()
+    attempts = 0
+    while len(seen) < size and attempts < size * 50:
+        attempts += 1
+        fast = r.random() < 0.33
+        name = _fastener(r) if fast else _other(r)
+        if name not in seen:
+            seen.add(name)
+            pools[0 if fast else 1].append(name)
+    if not pools[0]:
+        pools[0].append(_fastener(r))
+    if not pools[1]:
+        pools[1].append(_other(r))
+    return pools
+
+
+# ==========================
+# DOCX
+# ==========================
+
+_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/word/document.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/>'
+    '</Types>'
+)
+_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="word/document.xml"/>'
+    '</Relationships>'
+)
+_W = 'xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main"'
+
+
+def _paragraphs(text):
+    return "".join(
+        f'<w:p><w:r><w:t xml:space="preserve">{escape(line)}</w:t></w:r></w:p>' if line else "<w:p/>"
+        for line in text.split("\n")
+    )
+
+
+def _row_xml(cells, span_first=1):
+    """Строка таблицы: cells — тексты ячеек; span_first — gridSpan первой ячейки."""
+    out = ["<w:tr>"]
+    for i, text in enumerate(cells):
+        pr = f'<w:tcPr><w:gridSpan w:val="{span_first}"/></w:tcPr>' if i == 0 and span_first > 1 else ""
+        out.append(f"<w:tc>{pr}{_paragraphs(text)}</w:tc>")
+    out.append("</w:tr>")
+    return "".join(out)
+
+
+def write_docx(path, title, rows):
+    """rows — [(тексты ячеек, gridSpan первой ячейки)]."""
+    grid = "".join('<w:gridCol w:w="1400"/>' for _ in HEADER)
+    body = (
+        f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?><w:document {_W}><w:body>'
+        f"{_paragraphs(title)}<w:tbl><w:tblGrid>{grid}</w:tblGrid>"
+        + "".join(_row_xml(cells, span) for cells, span in rows)
+        + "</w:tbl><w:p/></w:body></w:document>"
+    )
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as z:
+        z.writestr("[Content_Types].xml", _CONTENT_TYPES)
+        z.writestr("_rels/.rels", _RELS)
+        z.writestr("word/document.xml", body)
+
+
+# ==========================
+# СПЕЦИФИКАЦИЯ
+# ==========================
+
+def _section(r, title):
+    if r.random() < P_MERGED_SECTION:
+        # объединённая ячейка Формат..Обозначение, затем Наименование с заголовком
+        return (["", title, "", ""], 4)
+    return (["", "", "", "", title, "", ""], 1)
+
+
+def _split_lines(r, text, parts):
+    words = text.split(" ")
+    if parts <= 1 or len(words) < 2:
+        return [text]
+    cuts = sorted(r.sample(range(1, len(words)), min(parts - 1, len(words) - 1)))
+    bounds = [0] + cuts + [len(words)]
+    return [" ".join(words[a:b]) for a, b in zip(bounds, bounds[1:])]
+
+
+def spec_rows(r, code, pools, positions):
+    """Строки таблицы одной спецификации."""
+    fast_pool, other_pool = pools
+    rows = [(HEADER, 1)]
+    rows.append(_section(r, "Документация"))
+    rows.append((["A4", "", "", code + " СБ", "Сборочный чертеж", "", ""], 1))
+    rows.append((["A4", "", "", code + " Э3", "Схема электрическая принципиальная", "", ""], 1))
+    rows.append(_section(r, "Детали"))
+    rows.append((["A4", "", "1", code[:-3] + "001", "Плата печатная", "1", ""], 1))
+
+    total = r.randint(*positions)
+    n_fast = max(1, total // 3)
+    pos = 5
+    for title, pool, count in (("Стандартные изделия", fast_pool, n_fast),
+                               ("Прочие изделия", other_pool, max(1, total - n_fast))):
+        rows.append(_section(r, title))
+        for _ in range(count):
+            name = r.choice(pool)
+            if r.random() < P_SPACES:
+                name = name.replace(" ", "  ", 1)
+            qty = str(r.randint(1, 40))
+            comment = r.choice(COMMENTS)
+            pos_text = r.choice(["-", "–", "—"]) if r.random() < P_DASH else str(pos)
+
+            parts = r.choice([2, 2, 3]) if r.random() < P_MULTILINE else 1
+            lines = _split_lines(r, name, parts)
+            comments = _split_lines(r, comment, len(lines)) if comment else [""]
+            comments += [""] * (len(lines) - len(comments))
+            # продолжение примечания может уйти на строку ниже наименования
+            for k, line in enumerate(lines):
+                if k == 0:
+                    rows.append((["", "", pos_text, "", line, qty, comments[0]], 1))
+                else:
+                    rows.append((["", "", "", "", line, "", comments[k] if k < len(comments) else ""], 1))
+            pos += 1
+
+    rows.append(_section(r, "Материалы"))
+    rows.append((["", "", "", "", "Припой ПОС-61 ГОСТ 21931-76", "0,1 кг", ""], 1))
+    return rows
+
+
+def module_code(k):
+    return f"СИН-{k // 100:02d}.{k % 100:02d}.000"
+
+
+def generate(out_dir, specs=SPECS_COUNT, positions=POSITIONS, names=NAME_POOL, seed=SEED):
+    """Пишет out_dir/specs/*.docx и out_dir/specs_list.py. Возвращает SPECS [(имя файла, module_code)]."""
+    out_dir = Path(out_dir)
+    specs_dir = out_dir / "specs"
+    specs_dir.mkdir(parents=True, exist_ok=True)
+    pools = name_pool(names, seed)
+
+    result = []
+    for k in range(specs):
+        r = random.Random(f"spec:{seed}:{k}")
+        code = module_code(k)
+        fn = f"{code} Синтетическая спецификация {k}.docx"
+        write_docx(specs_dir / fn, "Спецификация " + code, spec_rows(r, code, pools, positions))
+        result.append((fn, code))
+
+    with open(out_dir / "specs_list.py", "w", encoding="utf-8") as f:
+        f.write("# specs_list.py — сгенерировано synth_specs.py\n\nSPECS = [\n")
+        f.write("".join(f"    ({fn!r}, {code!r}),\n" for fn, code in result))
+        f.write("]\n")
+    return result
+
+
+def parse_range(text):
+    """"20-80" → (20, 80); "30" → (30, 30)."""
+    a, _, b = text.partition("-")
+    lo, hi = int(a), int(b or a)
+    if lo < 1 or hi < lo:
+        raise argparse.ArgumentTypeError(f"Неверный диапазон: {text}")
+    return lo, hi
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Синтетические спецификации DOCX для конвейера")
+    ap.add_argument("out_dir", help="каталог: сюда пишутся specs/ и specs_list.py")
+    ap.add_argument("--specs", type=int, default=SPECS_COUNT, help="число спецификаций")
+    ap.add_argument("--positions", type=parse_range, default=POSITIONS,
+                    help=f"позиций на спецификацию: МИН-МАКС (по умолчанию {POSITIONS[0]}-{POSITIONS[1]})")
+    ap.add_argument("--names", type=int, default=NAME_POOL, help="число различных наименований")
+    ap.add_argument("--seed", type=int, default=SEED)
+    args = ap.parse_args()
+
+    specs = generate(args.out_dir, args.specs, args.positions, args.names, args.seed)
+    print(f"OK: {len(specs)} спецификаций → {Path(args.out_dir) / 'specs'}")
+
+
+if __name__ == "__main__":
+    main()
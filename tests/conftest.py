@@ -0,0 +1,8 @@
+# conftest.py
+# Скрипты конвейера лежат в корне репозитория и импортируются по имени модуля.
+#   python -m pytest -q
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
@@ -0,0 +1,51 @@
+# test_name_dedup.py
+# Пары Name, которые --merge-similar не должен сливать (разные детали), и которые должен.
+
+import pytest
+
+import name_dedup
+
+DIFFERENT_PARTS = [
+    # DIP и SOIC: одна буква в артикуле, похожесть строк 0.973
+    ('Микросхема SN74HC04N "Texas Instruments"', 'Микросхема SN74HC04D "Texas Instruments"'),
+    # разные варианты исполнения, похожесть 0.972
+    ('Микросхема ADG1206BCPZ "Analog Devices"', 'Микросхема ADG1206YCPZ "Analog Devices"'),
+    # без пробелов одинаковы ("...db-9m110"), но числа разные
+    ("Разъем DB-9M 1 10", "Разъем DB-9M 11 0"),
+]
+
+SAME_PART = [
+    # латинская P и кириллическая Р, пробелы, десятичная запятая
+    ("Резистор  P1-12-0,125-10 кОм ±5%", "Резистор Р1-12-0,125-10кОм±5%"),
+    ('Винт М3х10 ГОСТ 17473-80 "Завод"', "Винт M3x10 ГОСТ 17473-80 «Завод»"),
+]
+
+
+@pytest.mark.parametrize("a, b", DIFFERENT_PARTS)
+def test_different_parts_not_merged(a, b):
+    for counts in ({a: 2, b: 1}, {b: 2, a: 1}):
+        groups = name_dedup.find_similar(counts, threshold=0.9)
+        # даже с порогом ниже похожести пары
+        assert name_dedup.merge_map(groups, threshold=0.9) == {}
+        rows, mapping = name_dedup.merge_rows(["Name"], [[a], [b]], threshold=name_dedup.APPLY_THRESHOLD)
+        assert mapping == {}
+        assert rows == [[a], [b]]
+
+
+def test_numbers_kept_before_spaces_removed():
+    a, b = "Разъем DB-9M 1 10", "Разъем DB-9M 11 0"
+    assert name_dedup.canonical_key(a) == name_dedup.canonical_key(b)
+    assert name_dedup.numbers(name_dedup.normalize(a)) != name_dedup.numbers(name_dedup.normalize(b))
+    assert name_dedup.find_similar({a: 1, b: 1}, threshold=0.5) == []
+
+
+def test_part_tokens():
+    assert name_dedup.part_tokens(name_dedup.normalize('SN74HC04N "Texas Instruments"')) == ("sn74hc04n",)
+    assert name_dedup.part_tokens(name_dedup.normalize("Резистор 10 кОм")) == ()
+
+
+@pytest.mark.parametrize("a, b", SAME_PART)
+def test_same_part_merged(a, b):
+    rows, mapping = name_dedup.merge_rows(["Name"], [[a], [a], [b]])
+    assert mapping == {b: a}
+    assert rows == [[a], [a], [a]]
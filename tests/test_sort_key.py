@@ -0,0 +1,110 @@
+# test_sort_key.py
+# Порядок сортировки по sort_key_fn (признаки крепежа из колонок add_category, ключ на сочетание
+# значений) против прежнего порядка: row_sort_key по dict строки с разбором Name регулярками
+# на каждой строке. Прежний ключ ниже — замороженная копия эталона, не менять вместе с модулем.
+
+import random
+
+import pytest
+
+import add_category
+import bench_hot
+import bom_columnar
+import parse_specs_to_bom_many as parse_stage
+import sort_bom_after_category as sb
+import synth_specs
+
+
+# ---- эталон: ключ сортировки до колонок признаков крепежа ----
+
+def _baseline_fastener_key(name):
+    n = sb.norm_space(name)
+    din, iso, gost = sb.DIN_RE.search(n), sb.ISO_RE.search(n), sb.GOST_RE.search(n)
+    std_rank, std_num = 9, 10**9
+    if din:
+        std_rank, std_num = 1, int(din.group(1))
+    elif iso:
+        std_rank, std_num = 2, int(iso.group(1))
+    elif gost:
+        std_rank, std_num = 3, int(gost.group(1))
+    thread = length = 10**9
+    m = sb.M_SIZE_RE.search(n)
+    if m:
+        thread = sb.to_float(m.group(1))
+        if m.group(2):
+            length = sb.to_float(m.group(2))
+    return (std_rank, std_num, sb.lower_ru_lat(n), thread, length, sb.natural_key(n))
+
+
+def _baseline_row_key(row_dict):
+    cat, name, section = sb.s(row_dict.get("Category")), sb.s(row_dict.get("Name")), sb.s(row_dict.get("Section"))
+    cat_key = sb.lower_ru_lat(cat)
+    if cat == sb.CAT_FASTENERS or section == sb.SECTION_STANDARD:
+        return (cat_key, 0, _baseline_fastener_key(name))
+    return (cat_key, 9, sb.natural_key(name))
+
+
+def _baseline_sort(headers, rows):
+    return sorted(rows, key=lambda values: _baseline_row_key(dict(zip(headers, values))))
+
+
+# ---- строки BOM из корпусов bench_hot.py и synth_specs.py ----
+
+def _bom(names, seed=1):
+    r = random.Random(seed)
+    rows = []
+    for i, name in enumerate(names):
+        section = r.choice(["Стандартные", "Прочие", None])
+        module = f"КОР-{r.randint(10, 40)}.00.000"
+        rows.append([module, section, str(i % 50 + 1), name, "", "", r.randint(1, 20), ""])
+        if r.random() < 0.2:   # повтор той же позиции в другом модуле
+            rows.append([f"КОР-{r.randint(10, 40)}.10.000", section, "1", name, "", "", 1, ""])
+    r.shuffle(rows)
+    headers, cat_rows = add_category.categorize_rows(parse_stage.BOM_HEADERS, rows, use_cache=False, workers=1)
+    return headers, list(cat_rows)
+
+
+def _corpus_names():
+    corpora = bench_hot.corpora()
+    fast, other = synth_specs.name_pool(3000)
+    return [n for c in bench_hot.NAME_CORPORA for n in corpora[c]] + fast + other
+
+
+@pytest.fixture(scope="module")
+def bom():
+    return _bom(_corpus_names())
+
+
+def test_corpus_has_fasteners_with_attrs(bom):
+    headers, rows = bom
+    cat_i, std_i = headers.index("Category"), headers.index("Std")
+    fasteners = [r for r in rows if r[cat_i] == sb.CAT_FASTENERS]
+    assert fasteners and any(r[std_i] for r in fasteners)
+
+
+def test_sort_rows_matches_baseline(bom):
+    headers, rows = bom
+    assert sb.sort_rows(headers, rows) == _baseline_sort(headers, rows)
+
+
+def test_sort_without_fastener_columns_matches_baseline(bom):
+    headers, rows = bom
+    keep = [i for i, h in enumerate(headers) if h not in sb.FASTENER_COLUMNS]
+    headers = [headers[i] for i in keep]
+    rows = [[row[i] for i in keep] for row in rows]
+    assert sb.sort_rows(headers, rows) == _baseline_sort(headers, rows)
+
+
+def test_row_sort_key_matches_baseline(bom):
+    headers, rows = bom
+    order_new = sorted(rows, key=lambda v: sb.row_sort_key(dict(zip(headers, v))))
+    assert order_new == _baseline_sort(headers, rows)
+
+
+def test_sort_columnar_matches_baseline(bom, tmp_path):
+    headers, rows = bom
+    src, dst = tmp_path / "in.bomc", tmp_path / "out.bomc"
+    bom_columnar.write_columns(src, "BOM", headers, rows)
+    sb.sort_columnar(src, dst)
+    with bom_columnar.ColumnarFile(dst) as cf:
+        assert [list(r) for r in cf.iter_rows()] == _baseline_sort(headers, rows)
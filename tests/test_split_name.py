@@ -0,0 +1,35 @@
+# test_split_name.py
+# split_name (линейный разбор) против эталона split_name_regex — на корпусах bench_hot.py
+# и на наименованиях synth_specs.py. То же, что python split_name_to_supplydoc.py --verify.
+
+import pytest
+
+import bench_hot
+import split_name_to_supplydoc
+import synth_specs
+
+CORPORA = bench_hot.corpora()
+
+
+@pytest.mark.parametrize("corpus", bench_hot.NAME_CORPORA)
+def test_split_name_matches_regex_on_bench_corpus(corpus):
+    names = sorted(set(CORPORA[corpus]))
+    assert names
+    assert split_name_to_supplydoc.verify_split(names) == []
+
+
+def test_split_name_matches_regex_on_synth_names():
+    fast, other = synth_specs.name_pool(3000)
+    assert split_name_to_supplydoc.verify_split(fast + other) == []
+
+
+@pytest.mark.parametrize("name", [
+    "",
+    "Винт",
+    'Микросхема "TI"',
+    'Разъем DB-9M ГОСТ Р 51234-99 "Амфенол"',
+    "Резистор Р1-12-0,125-10 кОм ±5% ОЖ0.467.180 ТУ",
+    '"Vendor"',
+])
+def test_split_name_matches_regex_on_edge_cases(name):
+    assert split_name_to_supplydoc.split_name(name) == split_name_to_supplydoc.split_name_regex(name)
@@ -0,0 +1,199 @@
+# watch.py
+# Режим наблюдения: следит за ./specs и specs_list.py и после каждого сохранения спецификации
+# обновляет ВП (тот же run_pipeline, инкрементально).
+#
+# - Каталог опрашивается раз в POLL_SECONDS (mtime и размер файлов, без сторонних пакетов).
+# - Серия сохранений (Word пишет файл в несколько приёмов, несколько файлов сохраняют подряд)
+#   собирается в один прогон: прогон начинается, когда DEBOUNCE_SECONDS ничего не менялось.
+# - Состояние incremental.PipelineState держится в памяти процесса: разбираются и классифицируются
+#   только затронутые DOCX (sha256 пересчитывается только у них), справочники категорий, индекс
+#   правил, скомпилированные регулярные выражения и SupplyDoc по Name уже загружены.
+#   На диск состояние пишется при выходе (Ctrl+C) — следующий запуск watch или
+#   run_pipeline.py --incremental начнёт с него.
+# - Правка specs_list.py (SPECS, STRUCTURE) подхватывается без перезапуска.
+# - Ошибка прогона (например, файл ещё не дописан) печатается, наблюдение продолжается.
+#
+# Запуск:
+#   python watch.py
+#   python watch.py -o out/VP.xlsx --keep split --engine lxml
+
+import argparse
+import importlib
+import os
+import time
+import traceback
+from pathlib import Path
+
+import incremental
+import parse_cache
+import parse_specs_to_bom_many as parse_stage
+import run_pipeline
+import specs_list
+from docx_tables import ENGINES
+
+BASE_DIR = Path(__file__).resolve().parent
+
+# ===== НАСТРОЙКИ =====
+POLL_SECONDS = 0.3       # как часто смотреть на файлы
+DEBOUNCE_SECONDS = 0.5   # сколько должно пройти без изменений, чтобы начать прогон
+# =====================
+
+SPECS_LIST = BASE_DIR / "specs_list.py"
+
+
+def scan(specs_dir=parse_stage.SPECS_DIR) -> dict:
+    """{имя DOCX: (mtime_ns, размер)}; служебные файлы Word (~$...) пропускаются."""
+    files = {}
+    try:
+        entries = list(os.scandir(specs_dir))
+    except FileNotFoundError:
+        return files
+    for e in entries:
+        if e.name.startswith("~$") or not e.name.lower().endswith(".docx") or not e.is_file():
+            continue
+        st = e.stat()
+        files[e.name] = (st.st_mtime_ns, st.st_size)
+    return files
+
+
+def diff(old, new) -> set:
+    """Имена файлов, которые появились, исчезли или изменились."""
+    return {name for name in old.keys() | new.keys() if old.get(name) != new.get(name)}
+
+
+def _mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+class Watcher:
+    """ВП, которая обновляется по изменениям в specs/ (см. заголовок файла)."""
+
+    def __init__(self, output=run_pipeline.OUTPUT_XLSX, out_dir=run_pipeline.OUT_DIR, keep=(),
+                 engine=parse_stage.PARSER_ENGINE, workers=1, state_path=None):
+        self.output = output
+        self.out_dir = out_dir
+        self.keep = keep
+        self.engine = engine
+        self.workers = workers
+        self.state_path = incremental.state_path() if state_path is None else state_path
+        self.state = incremental.PipelineState.load(self.state_path)
+        self.files = {}
+        self.specs_mtime = None
+        self.dirty = False   # прошлый прогон не дошёл до записи ВП: состояние не сохранять, ВП пересобрать
+        self.pending = set()  # файлы прогонов, не дошедших до записи ВП (None — сверить все)
+
+    def unchanged(self, touched) -> bool:
+        """Все touched совпадают по sha256 с состоянием (файл пересохранили без правок)."""
+        by_docx = {v.get("docx"): v["file"] for v in self.state.modules.values()}
+        for name in touched:
+            p = parse_stage.SPECS_DIR / name
+            if name not in by_docx or not p.exists() or parse_cache.file_digest(p) != by_docx[name]:
+                return False
+        return True
+
+    def refresh(self, touched=None):
+        """
+        Один прогон; touched — изменившиеся DOCX (None — сверить все).
+        Возвращает счётчики run_pipeline или None, если по содержимому ничего не поменялось.
+        """
+        # touched копятся до успешного прогона: если сохранение A+B упало на B, а потом поправили
+        # только B, A всё равно надо разобрать заново
+        if touched is None or self.pending is None:
+            self.pending = None
+        else:
+            self.pending |= touched
+        mtime = _mtime(SPECS_LIST)
+        if mtime != self.specs_mtime:
+            first = self.specs_mtime is None
+            # запоминаем до reload: недописанный specs_list.py (SyntaxError) пробуем снова только
+            # после следующего сохранения, а не на каждом опросе
+            self.specs_mtime = mtime
+            if not first:
+                self.pending = None  # поменялся состав SPECS — сверяем все файлы
+                importlib.reload(specs_list)
+        touched = None if self.pending is None else set(self.pending)
+        digest = incremental.pipeline_digest()
+        if self.state.digest != digest:
+            # поменялся category_overrides.json — всё заново (правка RULES — перезапуском)
+            self.state = incremental.PipelineState(digest)
+        elif touched is not None and not self.dirty and self.unchanged(touched):
+            self.pending = set()
+            return None
+        self.dirty = True
+        counts = run_pipeline.run_pipeline(
+            specs_list.SPECS, self.output, keep=self.keep, out_dir=self.out_dir,
+            workers=self.workers, engine=self.engine, state=self.state, touched=touched,
+        )
+        self.dirty = False
+        self.pending = set()
+        return counts
+
+    def run(self, poll=POLL_SECONDS, debounce=DEBOUNCE_SECONDS):
+        self.files = scan()
+        self._refresh_logged(None)
+        print(f"Слежу за {parse_stage.SPECS_DIR} (Ctrl+C — выход)")
+        try:
+            while True:
+                time.sleep(poll)
+                touched = self._wait_quiet(poll, debounce)
+                if touched or _mtime(SPECS_LIST) != self.specs_mtime:
+                    self._refresh_logged(touched)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            if not self.dirty:
+                self.state.save(self.state_path)
+                print(f"Состояние сохранено: {self.state_path}")
+
+    def _wait_quiet(self, poll, debounce) -> set:
+        """Изменённые файлы; если что-то меняется — ждём, пока DEBOUNCE_SECONDS будет тихо."""
+        touched = set()
+        quiet_since = None
+        while True:
+            files = scan()
+            changed = diff(self.files, files)
+            self.files = files
+            if changed:
+                touched |= changed
+                quiet_since = time.monotonic()
+            elif not touched or time.monotonic() - quiet_since >= debounce:
+                return touched
+            time.sleep(poll)
+
+    def _refresh_logged(self, touched):
+        t0 = time.perf_counter()
+        try:
+            counts = self.refresh(touched)
+        except Exception:
+            traceback.print_exc()
+            print("Прогон не удался, жду следующего сохранения")
+            return
+        what = "все файлы" if touched is None else ", ".join(sorted(touched)) or SPECS_LIST.name
+        if counts is None:
+            print(f"[{time.strftime('%H:%M:%S')}] {what}: содержимое не изменилось")
+            return
+        print(f"[{time.strftime('%H:%M:%S')}] {what}: изменилось модулей {counts['changed']}, "
+              f"{counts['parsed']} строк BOM → {self.output} за {time.perf_counter() - t0:.2f} с")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Обновлять ВП при изменении спецификаций в ./specs")
+    ap.add_argument("-o", "--output", default=run_pipeline.OUTPUT_XLSX, help="финальная ВП (XLSX)")
+    ap.add_argument("--keep", default="", help="какие промежуточные результаты сохранять (как у run_pipeline.py)")
+    ap.add_argument("--out-dir", default=run_pipeline.OUT_DIR, help="каталог для промежуточных файлов и отчёта")
+    ap.add_argument("--engine", choices=ENGINES, default=parse_stage.PARSER_ENGINE, help="движок чтения DOCX")
+    ap.add_argument("-j", "--workers", type=int, default=1,
+                    help="процессов парсинга (по умолчанию 1: обычно меняется один файл)")
+    ap.add_argument("--poll", type=float, default=POLL_SECONDS, help="период опроса каталога, с")
+    ap.add_argument("--debounce", type=float, default=DEBOUNCE_SECONDS, help="пауза после последнего изменения, с")
+    args = ap.parse_args()
+
+    keep = list(run_pipeline.STAGE_FILES) if args.keep == "all" else [k.strip() for k in args.keep.split(",") if k.strip()]
+    Watcher(args.output, args.out_dir, keep, args.engine, args.workers).run(args.poll, args.debounce)
+
+
+if __name__ == "__main__":
+    main()
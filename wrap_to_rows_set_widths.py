@@ -1,6 +1,21 @@
-from openpyxl import load_workbook
+# wrap_to_rows_set_widths.py
+# Перенос по словам (Наименование, Документ на поставку, Примечание) и ширины колонок ВП.
+#
+# Раскладка считается по позициям (блок строк до пустой строки) в памяти: для каждой позиции
+# заранее известно, сколько строк займут перенесённые тексты, примечания по Module и итог,
+# и лист пишется один раз сверху вниз — без вставки строк в готовый лист.
+
+import argparse
+from copy import copy
+
+from openpyxl import Workbook, load_workbook
 from openpyxl.utils import get_column_letter
 
+import bom_io
+import memory_budget
+import profiling
+import run_metrics
+
 # ====== НАСТРОЙКИ ======
 INPUT_XLSX  = "Vedomost_pokupnyh.xlsx"
 SHEET_NAME  = "ВП"
@@ -55,18 +70,13 @@ def is_blank_cell(v) -> bool:
     return v is None or str(v).strip() == ""
 
 
-def is_blank_row(ws, r) -> bool:
-    for c in range(1, MAX_COL + 1):
-        if not is_blank_cell(ws.cell(r, c).value):
+def is_blank_row(values) -> bool:
+    for c in range(MAX_COL):
+        if c < len(values) and not is_blank_cell(values[c]):
             return False
     return True
 
 
-def set_col_widths(ws):
-    for col_idx, width in COLUMN_WIDTHS.items():
-        ws.column_dimensions[get_column_letter(col_idx)].width = width
-
-
 def words_wrap(text: str, max_len: int) -> list[str]:
     """
     Перенос по словам.
@@ -91,11 +101,11 @@ def words_wrap(text: str, max_len: int) -> list[str]:
     return lines
 
 
-def collect_col_text(ws, start, end, col) -> str:
+def collect_col_text(rows, col) -> str:
     """Собираем текст по всей позиции из колонки col (склейка через пробел)."""
     parts = []
-    for rr in range(start, end):
-        v = ws.cell(rr, col).value
+    for values, _ in rows:
+        v = values[col - 1]
         if v is None:
             continue
         s = str(v).strip()
@@ -111,17 +121,18 @@ def is_total_cell(v) -> bool:
     return ("_" * LINE_LEN) in s or "____" in s or "REPT(" in s or s.startswith("=")
 
 
-def find_total_row(ws, start, end):
-    for rr in range(start, end):
-        if is_total_cell(ws.cell(rr, TOTAL_COL).value):
-            return rr
+def find_total_row(rows):
+    for i, (values, _) in enumerate(rows):
+        if is_total_cell(values[TOTAL_COL - 1]):
+            return i
     return None
 
 
-def sum_qty_in_position(ws, start, end) -> int:
+def sum_total_in_position(rows) -> int:
+    """Сумма "Всего" по строкам позиции (итоговая ячейка — не число, пропускается)."""
     total = 0
-    for rr in range(start, end):
-        v = ws.cell(rr, QTY_COL).value
+    for values, _ in rows:
+        v = values[TOTAL_COL - 1]
         if v is None:
             continue
         try:
@@ -131,39 +142,39 @@ def sum_qty_in_position(ws, start, end) -> int:
     return total
 
 
-def collect_comments_by_module(ws, start, end, total_row):
+def collect_comments_by_module(rows, total_row):
     """
     Собираем примечания ПО КАЖДОМУ MODULE-блоку внутри позиции.
     Module-блок: от строки с непустым Module до строки перед следующим Module или total_row/конца позиции.
     Примечания внутри блока склеиваем через пробел.
-    Возвращает список блоков:
-      [{"start": row_idx, "end": row_idx_exclusive, "text": "..."}]
+    Возвращает список блоков (индексы строк внутри позиции):
+      [{"start": i, "end": i_exclusive, "text": "..."}]
     """
     blocks = []
     cur = None  # текущий блок
 
-    for rr in range(start, end):
-        if total_row is not None and rr == total_row:
+    for i, (values, _) in enumerate(rows):
+        if total_row is not None and i == total_row:
             # Итог — не часть module-блока
             break
 
-        mod = ws.cell(rr, MODULE_COL).value
+        mod = values[MODULE_COL - 1]
         mod_str = "" if mod is None else str(mod).strip()
 
         if mod_str != "":
             # старт нового блока
             if cur is not None:
                 blocks.append(cur)
-            cur = {"start": rr, "end": rr + 1, "parts": []}
+            cur = {"start": i, "end": i + 1, "parts": []}
 
         if cur is not None:
             # собираем comment с текущей строки (включая “продолжения” пока не встретили новый Module)
-            v = ws.cell(rr, COMMENT_COL).value
+            v = values[COMMENT_COL - 1]
             if v is not None:
                 s = str(v).strip()
                 if s:
                     cur["parts"].append(s)
-            cur["end"] = rr + 1
+            cur["end"] = i + 1
 
     if cur is not None:
         blocks.append(cur)
@@ -176,102 +187,169 @@ def collect_comments_by_module(ws, start, end, total_row):
     return out
 
 
-def main():
-    wb = load_workbook(INPUT_XLSX)
-    ws = wb[SHEET_NAME] if SHEET_NAME in wb.sheetnames else wb.active
+# ==========================
+# РАСКЛАДКА ПОЗИЦИИ
+# ==========================
+# Строка листа — пара (values, styles): values — список значений (не короче MAX_COL),
+# styles — {0-based колонка: стиль ячейки} только для ячеек со стилем.
 
-    set_col_widths(ws)
+def _empty_row(width):
+    return [None] * width, {}
 
-    r = 2  # пропускаем заголовок
 
-    while r <= ws.max_row:
-        if is_blank_row(ws, r):
-            r += 1
+def layout_position(rows):
+    """
+    Раскладка одной позиции (строки без пустых между ними) → новый список строк.
+    Добавленные строки пустые и без стилей; остальные строки идут в прежнем порядке,
+    каждая со своими ячейками (значения колонок 1, 3, 9, 10 переписываются).
+    """
+    width = len(rows[0][0])
+    rows = [(list(values), styles) for values, styles in rows]
+    total_row = find_total_row(rows)
+
+    # === 1) Перенос общих полей позиции: Наименование и SupplyDoc ===
+    name_lines = words_wrap(collect_col_text(rows, NAME_COL), MAX_CHARS[NAME_COL])
+    supply_lines = words_wrap(collect_col_text(rows, SUPPLYDOC_COL), MAX_CHARS[SUPPLYDOC_COL])
+
+    needed_lines_common = max(1, len(name_lines) if name_lines else 1, len(supply_lines) if supply_lines else 1)
+    if needed_lines_common > len(rows):
+        # недостающие строки — в конец позиции (итог, если есть, остаётся выше них)
+        rows.extend(_empty_row(width) for _ in range(needed_lines_common - len(rows)))
+
+    for values, _ in rows:
+        values[NAME_COL - 1] = None
+        values[SUPPLYDOC_COL - 1] = None
+    for i, line in enumerate(name_lines):
+        rows[i][0][NAME_COL - 1] = line
+    for i, line in enumerate(supply_lines):
+        rows[i][0][SUPPLYDOC_COL - 1] = line
+
+    # === 2) Примечание: перенос по каждому Module-блоку ===
+    comment_blocks = collect_comments_by_module(rows, total_row)
+
+    for values, _ in rows:
+        values[COMMENT_COL - 1] = None
+
+    # Недостающие строки блока добавляются в его конец (до следующего Module/итога) и сдвигают
+    # всё, что ниже, вместе с уже записанными строками Наименования. Снизу вверх — чтобы
+    # индексы ещё не обработанных блоков оставались верными.
+    for b in reversed(comment_blocks):
+        text = b["text"]
+        if not text:
             continue
 
-        # позиция = блок строк до пустой строки
-        start = r
-        end = r
-        while end <= ws.max_row and not is_blank_row(ws, end):
-            end += 1
-        # позиция: [start, end)
-
-        total_row = find_total_row(ws, start, end)
-
-        # === 1) Перенос общих полей позиции: Наименование и SupplyDoc ===
-        name_text = collect_col_text(ws, start, end, NAME_COL)
-        supply_text = collect_col_text(ws, start, end, SUPPLYDOC_COL)
+        lines = words_wrap(text, MAX_CHARS[COMMENT_COL])
+        need = max(1, len(lines))
+        have = b["end"] - b["start"]
 
-        name_lines = words_wrap(name_text, MAX_CHARS[NAME_COL])
-        supply_lines = words_wrap(supply_text, MAX_CHARS[SUPPLYDOC_COL])
+        if need > have:
+            rows[b["end"]:b["end"]] = [_empty_row(width) for _ in range(need - have)]
+            if total_row is not None and total_row >= b["end"]:
+                total_row += need - have
 
-        needed_lines_common = max(1, len(name_lines) if name_lines else 1, len(supply_lines) if supply_lines else 1)
-        existing_lines = end - start
+        for i, line in enumerate(lines):
+            rows[b["start"] + i][0][COMMENT_COL - 1] = line
 
-        if needed_lines_common > existing_lines:
-            insert_at = end
-            ws.insert_rows(insert_at, amount=(needed_lines_common - existing_lines))
-            end += (needed_lines_common - existing_lines)
+    # === 3) Итог "Всего": пересчёт числом (без формул) ===
+    if total_row is not None:
+        s = sum_total_in_position(rows)
+        rows[total_row][0][TOTAL_COL - 1] = ("_" * LINE_LEN) + "\n" + str(s)
 
-            # после вставки total_row смещается, если он был внутри позиции ниже insert_at
-            if total_row is not None and total_row >= insert_at:
-                total_row += (needed_lines_common - existing_lines)
+    return rows
 
-        # очищаем и записываем 1 и 3 по строкам позиции
-        for rr in range(start, end):
-            ws.cell(rr, NAME_COL).value = None
-            ws.cell(rr, SUPPLYDOC_COL).value = None
 
-        for i, line in enumerate(name_lines):
-            ws.cell(start + i, NAME_COL).value = line
-        for i, line in enumerate(supply_lines):
-            ws.cell(start + i, SUPPLYDOC_COL).value = line
-
-        # === 2) Примечание: перенос по каждому Module-блоку ===
-        # сначала соберём блоки (по текущим границам start/end/total_row)
-        comment_blocks = collect_comments_by_module(ws, start, end, total_row)
+def layout_vp(rows):
+    """
+    Раскладка всей ВП. rows — строки листа (первая — заголовок) в виде (values, styles).
+    Возвращает генератор строк результата в том же виде.
+    """
+    it = iter(rows)
+    header = next(it, None)
+    if header is None:
+        return
+    yield header
+
+    block = []
+    for row in it:
+        if is_blank_row(row[0]):
+            if block:
+                yield from layout_position(block)
+                block = []
+            yield row
+        else:
+            block.append(row)
+    if block:
+        yield from layout_position(block)
 
-        # очистим колонку Примечание во всей позиции (кроме пустой строки-разделителя)
-        for rr in range(start, end):
-            ws.cell(rr, COMMENT_COL).value = None
 
-        # Чтобы вставки строк не сдвигали ещё не обработанные блоки,
-        # обрабатываем блоки СНИЗУ ВВЕРХ.
-        for b in reversed(comment_blocks):
-            text = b["text"]
-            if not text:
-                continue
+# ==========================
+# ЧТЕНИЕ / ЗАПИСЬ
+# ==========================
 
-            lines = words_wrap(text, MAX_CHARS[COMMENT_COL])
-            need = max(1, len(lines))
-            have = b["end"] - b["start"]
+def _cell_style(cell):
+    # copy: у ячеек обычного листа стили — прокси, привязанные к своей книге
+    return {
+        "font": copy(cell.font), "fill": copy(cell.fill), "border": copy(cell.border),
+        "alignment": copy(cell.alignment), "number_format": cell.number_format,
+        "protection": copy(cell.protection),
+    }
 
-            if need > have:
-                insert_at = b["end"]  # вставляем в конец блока (до следующего Module/итога)
-                ws.insert_rows(insert_at, amount=(need - have))
 
-                # сдвигаем end позиции
-                end += (need - have)
+def read_rows(ws):
+    """
+    Строки листа ВП в виде (values, styles); значения дополнены None до MAX_COL.
+    Пустые строки в конце листа (без стилей, значения None или "") пропускаются: в сохранённый
+    XLSX они не попадают, и лист из памяти (run_pipeline.py) даёт то же, что прочитанный из файла.
+    """
+    empty = []   # пустые строки подряд — отдаём, только если за ними есть непустая
+    for row in ws.iter_rows():
+        values = [c.value for c in row]
+        if len(values) < MAX_COL:
+            values.extend([None] * (MAX_COL - len(values)))
+        styles = {i: _cell_style(c) for i, c in enumerate(row) if getattr(c, "has_style", False)}
+        if not styles and is_blank_row(values):
+            empty.append((values, styles))
+            continue
+        yield from empty
+        empty = []
+        yield values, styles
 
-                # если итог ниже — он тоже сдвигается
-                if total_row is not None and total_row >= insert_at:
-                    total_row += (need - have)
 
-                # также нужно скорректировать start/end всех блоков ВЫШЕ (но мы идём снизу вверх — не нужно)
+def write_rows(path, title, rows) -> int:
+    """Пишет строки (values, styles) в новый лист потоком, с ширинами COLUMN_WIDTHS. Возвращает число строк."""
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(title)
+    for col_idx, width in COLUMN_WIDTHS.items():
+        ws.column_dimensions[get_column_letter(col_idx)].width = width
 
-            # пишем строки примечания начиная с b["start"]
-            for i, line in enumerate(lines):
-                ws.cell(b["start"] + i, COMMENT_COL).value = line
+    n = 0
+    for values, styles in rows:
+        if styles:
+            values = list(values)
+            for i, style in styles.items():
+                values[i] = bom_io.styled(ws, values[i], **style)
+        ws.append(values)
+        n += 1
 
-        # === 3) Итог "Всего": пересчёт числом (без формул) ===
-        if total_row is not None:
-            s = sum_qty_in_position(ws, start, end)
-            ws.cell(total_row, TOTAL_COL).value = ("_" * LINE_LEN) + "\n" + str(s)
+    wb.save(path)
+    return n
 
-        # переход к следующей позиции
-        r = end + 1
 
-    wb.save(OUTPUT_XLSX)
+@memory_budget.exit_on_budget
+def main():
+    ap = argparse.ArgumentParser(description="Перенос строк и ширины колонок ВП")
+    profiling.add_argument(ap)
+    memory_budget.add_argument(ap)
+    args = ap.parse_args()
+
+    with run_metrics.stage("wrap", inputs=[INPUT_XLSX], outputs=[OUTPUT_XLSX], profile_dir=args.profile,
+                           memory=args.memory) as m:
+        wb = load_workbook(INPUT_XLSX, read_only=True)
+        try:
+            ws = wb[SHEET_NAME] if SHEET_NAME in wb.sheetnames else wb.active
+            m.rows_out = write_rows(OUTPUT_XLSX, ws.title, layout_vp(m.count_in(read_rows(ws))))
+        finally:
+            wb.close()
     print(f"OK: {OUTPUT_XLSX}")
 
 